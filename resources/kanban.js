@@ -9,6 +9,7 @@ var idxUUID = 'None'
 const canvas = document.getElementById('canvas')
 var mode = 'task'
 const config = {}
+const pageSize = 50
 
 function round (value, precision) {
   var multiplier = Math.pow(10, precision || 0)
@@ -31,22 +32,67 @@ function isElementInViewport (el) {
   )
 }
 
+function boardColumns () {
+  return [
+    { name: 'inbox', color: 'color4', title: 'Inbox', query: 'id=inbox', help: 'tasks in the inbox', shortcut: 'i', icon: 'inbox' },
+    { name: 'today', color: 'color6', title: 'Today', query: 'id=today', help: 'tasks for today', shortcut: 't', icon: 'star' },
+    { name: `tag/${config.tag_waiting}`, color: 'color1', title: 'Waiting', query: `query=${config.tag_waiting}`, help: `tasks with the tag "${config.tag_waiting}"`, shortcut: 'w', icon: 'clock' },
+    { name: `tag/${config.tag_mit}`, color: 'color2', title: 'MIT', query: `query=${config.tag_mit}`, help: `most important tasks with the tag "${config.tag_mit}"`, shortcut: 'm', icon: 'exclamation-triangle' },
+    { name: 'upcoming', color: 'color5', title: 'Upcoming', query: 'id=upcoming', help: 'scheduled tasks', shortcut: 'u', icon: 'calendar-alt' },
+    { name: 'cleanup', color: 'color8', title: 'Grooming', query: '', help: 'empty projects, tasks with no parent, items with tag "Cleanup"', shortcut: '', icon: 'broom' },
+    { name: 'next', color: 'color7', title: 'Next', query: 'id=anytime', help: 'anytime tasks that are not in today', shortcut: 'n', icon: 'forward' },
+    { name: 'backlog', color: 'color3', title: 'Backlog', query: 'id=someday', help: 'tasks in someday projects', shortcut: 'b', icon: 'paperclip' }
+  ]
+}
+
+function columnUpdate (column) {
+  const url = `api/html/${column.name}`
+  requestParallel(pageUrl(url), function (data) { rowsAdd(column.color, column.title, data, column.query, column.help, column.shortcut, column.icon, url) })
+}
+
+function filtersUpdate () {
+  requestParallel('api/areas', function (data) { optionsAdd(data, 'areas') })
+  requestParallel('api/projects', function (data) { optionsAdd(data, 'projects') })
+}
+
+function boardUpdate (columns) {
+  filtersUpdate()
+  columns.forEach(columnUpdate)
+}
+
+// only columns whose content hash changed are requested again
+function boardRefresh (columns) {
+  const hashes = {}
+  columns.forEach(function (column) {
+    const element = document.getElementById(column.title)
+    if (element !== null && element.dataset.url === `api/html/${column.name}`) {
+      hashes[column.name] = element.dataset.hash
+    }
+  })
+  if (Object.keys(hashes).length < columns.length) {
+    boardUpdate(columns)
+    return
+  }
+  requestSequencial('api/hashes', 'POST', JSON.stringify({ columns: hashes })).then(function (data) {
+    const deltas = JSON.parse(data.response)
+    var changed = false
+    columns.forEach(function (column) {
+      const delta = deltas[column.name]
+      if (delta.hash === hashes[column.name]) { return }
+      changed = true
+      if (!rowsRemove(column.title, delta)) { columnUpdate(column) }
+    })
+    if (changed) { filtersUpdate() }
+  }).catch(function () { boardUpdate(columns) })
+}
+
 function kanbanUpdate () {
   view = kanbanUpdate
   statsHide()
   preferencesHide()
   kanbanShow()
   if (canvas == null) {
-    requestParallel('api/areas', function (data) { optionsAdd(data, 'areas') })
-    requestParallel('api/projects', function (data) { optionsAdd(data, 'projects') })
-    requestParallel('api/inbox', function (data) { rowsAdd('color4', 'Inbox', data, 'id=inbox', 'tasks in the inbox', 'i', 'inbox') })
-    requestParallel('api/today', function (data) { rowsAdd('color6', 'Today', data, 'id=today', 'tasks for today', 't', 'star') })
-    requestParallel(`api/tag/${config.tag_waiting}`, function (data) { rowsAdd('color1', 'Waiting', data, `query=${config.tag_waiting}`, `tasks with the tag "${config.tag_waiting}"`, 'w', 'clock') })
-    requestParallel(`api/tag/${config.tag_mit}`, function (data) { rowsAdd('color2', 'MIT', data, `query=${config.tag_mit}`, `most important tasks with the tag "${config.tag_mit}"`, 'm', 'exclamation-triangle') })
-    requestParallel('api/upcoming', function (data) { rowsAdd('color5', 'Upcoming', data, 'id=upcoming', 'scheduled tasks', 'u', 'calendar-alt') })
-    requestParallel('api/cleanup', function (data) { rowsAdd('color8', 'Grooming', data, '', 'empty projects, tasks with no parent, items with tag "Cleanup"', '', 'broom') })
-    requestParallel('api/next', function (data) { rowsAdd('color7', 'Next', data, 'id=anytime', 'anytime tasks that are not in today', 'n', 'forward') })
-    requestParallel('api/backlog', function (data) { rowsAdd('color3', 'Backlog', data, 'id=someday', 'tasks in someday projects', 'b', 'paperclip') })
+    boardRefresh(boardColumns())
   }
 }
 
@@ -97,49 +143,6 @@ function rowAdd (uuid, task, started, due, cssClass, context) {
           </div>
           `
 }
-function rowsGet (rows) {
-  var fragment = ''
-  rows.forEach(function (row) {
-    var cssClass = 'hasNoProject'
-    var task = row.title
-    var context = row.context
-    var due = ''
-    var started = ''
-
-    if (row.type === 'project') {
-      task = `${task} (${row.size})`
-    }
-
-    if (row.uuid !== null) {
-      task = `<a draggable='false' href='things:///show?id=${row.uuid}'
-                       target='_blank'>${task}
-                    </a>`
-    }
-    if (row.context_uuid !== null) {
-      context = `<a draggable='false' 
-                          href='things:///show?id=${row.context_uuid}' 
-                          target='_blank'>
-                          ${row.context}
-                        </a>`
-    }
-    if (row.context !== null) {
-      cssClass = 'hasProject'
-    } else {
-      row.context = 'No Context'
-    }
-    if (row.due !== null) {
-      due = `Due: ${row.due}`
-      cssClass = 'hasDeadline'
-    }
-    if (row.started !== null) {
-      started = `Start: ${row.started}`
-    }
-
-    fragment += rowAdd(row.uuid, task, started, due, cssClass, context)
-  })
-  return fragment
-}
-
 function columnAddPreview (cssclass, header) {
   return `<div class='column' id='${header}'>
                 <div class='inner-column'>
@@ -150,7 +153,7 @@ function columnAddPreview (cssclass, header) {
             </div>`
 }
 
-function columnAdd (title, help, query, shortcut, color, size, rowHTML, icon) {
+function columnAdd (title, help, query, shortcut, color, size, rowHTML, icon, url, hash) {
   if (query !== '') {
     query = `href="things:///show?${query}"`
   }
@@ -159,6 +162,7 @@ function columnAdd (title, help, query, shortcut, color, size, rowHTML, icon) {
             ondrop='onDrop(event);'
             ondragleave='onDragLeave(event);'
             ondragover='onDragOver(event);'
+            data-url='${url}' data-hash='${hash}'
             id='${title}' title='${help}'>
             <div class='inner-column'>
                 <a draggable='false' 
@@ -176,10 +180,53 @@ function columnAdd (title, help, query, shortcut, color, size, rowHTML, icon) {
         `
 }
 
-function rowsAdd (color, title, data, query, help, shortcut, icon) {
-  const rows = JSON.parse(data.response)
-  const rowHTML = rowsGet(rows)
-  const fragment = columnAdd(title, help, query, shortcut, color, rows.length, rowHTML, icon)
+function pageUrl (url, cursor) {
+  return `${url}?limit=${pageSize}&cursor=${cursor || 0}`
+}
+
+function rowsMoreGet (url, cursor) {
+  if (cursor === null) { return '' }
+  return `<div class='more' data-url='${url}' data-cursor='${cursor}'>Loading...</div>`
+}
+
+function rowsMore (element) {
+  const cursor = element.dataset.cursor
+  if (element.dataset.loading) { return }
+  element.dataset.loading = 'true'
+  requestParallel(pageUrl(element.dataset.url, cursor), function (data) {
+    const page = JSON.parse(data.response)
+    element.insertAdjacentHTML('beforebegin', page.html)
+    if (page.next === null) {
+      element.remove()
+    } else {
+      element.dataset.cursor = page.next
+      delete element.dataset.loading
+    }
+  })
+}
+
+const moreObserver = 'IntersectionObserver' in window
+  ? new IntersectionObserver(function (entries) {
+    entries.forEach(function (entry) {
+      if (entry.isIntersecting) { rowsMore(entry.target) }
+    })
+  })
+  : null
+
+function rowsMoreObserve (title) {
+  document.getElementById(title).querySelectorAll('.more').forEach(function (element) {
+    if (moreObserver !== null) {
+      moreObserver.observe(element)
+    } else {
+      element.onclick = function () { rowsMore(element) }
+    }
+  })
+}
+
+function rowsAdd (color, title, data, query, help, shortcut, icon, url) {
+  const page = JSON.parse(data.response)
+  const rowHTML = page.html + rowsMoreGet(url, page.next)
+  const fragment = columnAdd(title, help, query, shortcut, color, page.total, rowHTML, icon, url, page.hash)
 
   if (document.getElementById(title) !== null) {
     contentReplace(title, fragment)
@@ -187,6 +234,24 @@ function rowsAdd (color, title, data, query, help, shortcut, icon) {
     document.getElementById('loading').style.display = 'none'
     contentAdd(fragment)
   }
+  rowsMoreObserve(title)
+}
+
+// a column that only lost cards does not need to be requested again
+function rowsRemove (title, delta) {
+  if (!delta.removed || delta.added.length || delta.moved.length || delta.changed.length) { return false }
+  const column = document.getElementById(title)
+  var removed = 0
+  delta.removed.forEach(function (uuid) {
+    const row = column.querySelector(`.box[id='${uuid}']`)
+    if (row !== null) { row.remove(); removed++ }
+  })
+  column.querySelectorAll('.more').forEach(function (element) {
+    element.dataset.cursor = element.dataset.cursor - removed
+  })
+  column.querySelector('.size').textContent = delta.total
+  column.dataset.hash = delta.hash
+  return true
 }
 
 const requestParallel = function (url, method) {
@@ -199,7 +264,7 @@ const requestParallel = function (url, method) {
       console.log('Error: ' + request.status)
     }
   }
-  request.open('GET', `${url}?mode=${mode}`, true)
+  request.open('GET', `${url}${url.includes('?') ? '&' : '?'}mode=${mode}`, true)
   request.send()
 }
 
@@ -214,7 +279,7 @@ const requestSequencial = function (url, method, data) {
         reject(new Error(request.statusText))
       }
     }
-    request.open(method || 'GET', `${url}?mode=${mode}`, true)
+    request.open(method || 'GET', `${url}${url.includes('?') ? '&' : '?'}mode=${mode}`, true)
     request.send(data || null)
   })
 }
@@ -349,24 +414,17 @@ async function statsShowDistribution () { // eslint-disable-line no-unused-vars
 
   const ctx = canv.getContext('2d')
   var backlog = 0
-  await requestSequencial('api/backlog').then(function (data) {
-    backlog = JSON.parse(data.response).length
-  })
   var upcoming = 0
-  await requestSequencial('api/upcoming').then(function (data) {
-    upcoming = JSON.parse(data.response).length
-  })
   var inbox = 0
-  await requestSequencial('api/inbox').then(function (data) {
-    inbox = JSON.parse(data.response).length
-  })
   var today = 0
-  await requestSequencial('api/today').then(function (data) {
-    today = JSON.parse(data.response).length
-  })
   var next = 0
-  await requestSequencial('api/next').then(function (data) {
-    next = JSON.parse(data.response).length
+  await requestSequencial('api/distribution').then(function (data) {
+    const counts = JSON.parse(data.response)
+    backlog = counts.backlog
+    upcoming = counts.upcoming
+    inbox = counts.inbox
+    today = counts.today
+    next = counts.next
   })
   new Chart(ctx, { // eslint-disable-line no-new
     type: 'doughnut',
@@ -430,8 +488,7 @@ function matrixAdd (cssClass, color, title, query, help, shortcut, icon) {
   return fragment
 }
 
-function matrixReplace (id, data) {
-  const html = rowsGet(JSON.parse(data.response))
+function matrixReplace (id, html) {
   document.getElementById(id + '-inner').innerHTML = html
 }
 
@@ -451,12 +508,14 @@ async function statsShowMinutes () { // eslint-disable-line no-unused-vars
   statsReplace(canv)
 
   requestParallel('api/filter/reset', null)
-  requestSequencial(`api/tag/${config.A}`).then(function (data) { matrixReplace('A', data) })
-  requestSequencial(`api/tag/${config.B}`).then(function (data) { matrixReplace('B', data) })
-  requestSequencial(`api/tag/${config.C}`).then(function (data) { matrixReplace('C', data) })
-  requestSequencial(`api/tag/${config.D}`).then(function (data) { matrixReplace('D', data) })
-  requestSequencial('api/stats-min-today').then(function (data) {
-    const jsonfile = JSON.parse(data.response)
+  const batch = { commands: ['stats-min-today'], tags: [config.A, config.B, config.C, config.D], html: true }
+  requestSequencial('api/batch', 'POST', JSON.stringify(batch)).then(function (data) {
+    const results = JSON.parse(data.response)
+    matrixReplace('A', results.tags[config.A])
+    matrixReplace('B', results.tags[config.B])
+    matrixReplace('C', results.tags[config.C])
+    matrixReplace('D', results.tags[config.D])
+    const jsonfile = results.commands['stats-min-today']
     var minutes = jsonfile[0].minutes
     if (minutes == null) {
       minutes = 'no time estimations'
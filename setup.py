@@ -68,8 +68,9 @@ setup(
     setup_requires=['py2app'],
     entry_points={
         'console_scripts': [
-            'things-cli = things3.things3_cli:main',
+            'things-cli = things3.things3_client:main',
             'things-api = things3.things3_api:main',
+            'things-daemon = things3.things3_daemon:main',
             'things-kanban = things3.things3_app:main'
         ]
     }
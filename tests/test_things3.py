@@ -4,7 +4,15 @@
 """Module documentation goes here."""
 
 import unittest
-from things3.things3 import Things3
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock
+from things3.things3 import Things3, Things3Error
+from things3.things3_tags import Things3Tags
 
 
 class Things3Case(unittest.TestCase):
@@ -114,6 +122,24 @@ class Things3Case(unittest.TestCase):
         areas = self.things3.get_areas()
         self.assertEqual(1, len(areas))
 
+    def test_get_tags(self):
+        """Test that tags count the tasks a click on them shows."""
+        tags = self.things3.get_tags()
+        self.assertEqual(6, tags[0]['size'])
+        for tag in tags:
+            self.assertEqual(len(self.things3.get_tag(tag['title'])),
+                             tag['size'])
+
+    def test_get_hierarchy(self):
+        """Test areas, projects and tasks read in one ordered query."""
+        rows = list(self.things3.get_hierarchy())
+        self.assertEqual([None, 'Todo in an area', None,
+                          'Recurring MIT task',
+                          'Todo in a project that is in an area'],
+                         [row[4] for row in rows])
+        self.assertEqual({'Test Area'}, {row[1] for row in rows})
+        self.assertEqual('Project in an area', rows[2][3])
+
     def test_get_minutes_today(self):
         """Test get minutes today."""
         minutes = self.things3.get_minutes_today()
@@ -127,6 +153,261 @@ class Things3Case(unittest.TestCase):
         tasks = self.things3.get_today()
         self.assertNotEqual(tasks.pop(), task)
 
+    def test_trace(self):
+        """Test query tracing with plans."""
+        with self.things3.trace_queries(explain=True) as trace:
+            self.things3.call(Things3.get_inbox)
+            thread = threading.Thread(target=self.things3.get_today)
+            thread.start()
+            thread.join()
+        record = trace.pop()
+        self.assertEqual([], trace)
+        self.assertEqual("inbox", record["query"])
+        self.assertEqual(3, record["rows"])
+        self.assertTrue(record["plan"])
+        self.assertIn('things3_query_rows_total{query="inbox"} 3',
+                      self.things3.metrics.render())
+
+    def test_slow_query(self):
+        """Test the slow query log."""
+        self.things3.slow_query = 0
+        with self.assertLogs('things3.things3', level='WARNING') as log:
+            self.things3.call(Things3.get_due)
+        self.things3.slow_query = None
+        self.assertIn("Slow query due", log.output[0])
+        self.assertIn("Plan:", log.output[0])
+
+    def test_snapshot(self):
+        """Test that a snapshot reuses one connection."""
+        with self.things3.snapshot():
+            connection = self.things3.get_connection()
+            self.assertEqual(4, len(self.things3.get_today()))
+            self.assertEqual(3, len(self.things3.get_inbox()))
+            self.assertIs(connection, self.things3.get_connection())
+        self.assertIsNone(self.things3.get_connection())
+
+    def test_export_tasks(self):
+        """Test the full export with resolved relations."""
+        tasks = {task['uuid']: task for task in self.things3.export_tasks()}
+        self.assertEqual(81, len(tasks))
+        task = tasks['1CDAE997-8550-49C0-B2E6-91F5F6EF2C8F']
+        self.assertEqual('Meet Things for Mac', task['project_title'])
+        self.assertEqual('Learn the basics', task['heading_title'])
+        self.assertEqual(['Cleanup'], task['tags'])
+
+    def test_counts(self):
+        """Test counting views without fetching their rows."""
+        for command, func in self.things3.functions.items():
+            self.assertEqual(len(func(self.things3)),
+                             self.things3.get_count(command), command)
+        self.assertEqual({"backlog": 5, "upcoming": 5, "inbox": 3,
+                          "today": 4, "next": 29},
+                         self.things3.get_distribution())
+
+    def test_counts_empty(self):
+        """Test counting views that need no query."""
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(Things3, 'FILE_CONFIG',
+                                  os.path.join(directory, 'kanbanviewrc')):
+            database = os.path.join(directory, 'empty.sqlite3')
+            shutil.copy('resources/demo.sqlite3', database)
+            connection = sqlite3.connect(database)
+            with connection:
+                connection.execute("DELETE FROM TMTag")
+            connection.close()
+            things3 = Things3(database=database)
+            self.assertEqual([], things3.get_tags())
+            self.assertEqual({"tags": 0, "inbox": 3},
+                             things3.get_counts(["tags", "inbox"]))
+
+    def test_page(self):
+        """Test the first rows of a view with the total."""
+        tasks = self.things3.get_anytime()
+        page = self.things3.get_page(Things3.get_anytime, limit=10)
+        self.assertEqual(29, page["total"])
+        self.assertEqual(10, page["next"])
+        self.assertEqual(tasks[:10], page["items"])
+        page = self.things3.get_page(Things3.get_anytime, limit=10, offset=20)
+        self.assertEqual(tasks[20:], page["items"])
+        self.assertIsNone(page["next"])
+        page = self.things3.get_page(Things3.get_tag, "Waiting", limit=2)
+        self.assertEqual(3, page["total"])
+        page = self.things3.get_page(Things3.get_cleanup, limit=2)
+        self.assertEqual(7, page["total"])
+        self.assertEqual(2, len(page["items"]))
+
+    def test_subtasks(self):
+        """Test that checklist items are loaded in one query."""
+        with self.things3.trace_queries() as trace:
+            tasks = self.things3.get_subtasks()
+        self.assertEqual(2, len(trace))
+        self.assertEqual(3, len(tasks))
+        self.assertEqual(9, sum(len(task['checklist']) for task in tasks))
+        tasks = {task['title']: task for task in tasks}
+        self.assertEqual("0/2", tasks['Convert a to-do into a project'][
+            'progress'])
+        self.assertEqual(['To-do #1', 'To-do #2'], [
+            item['title'] for item in
+            tasks['Convert a to-do into a project']['checklist']])
+        page = self.things3.get_page(Things3.get_anytime, limit=40,
+                                     checklist=True)
+        self.assertTrue(all('progress' in task for task in page["items"]))
+        self.assertEqual([], self.things3.attach_checklists([]))
+
+    def test_tag_hierarchy(self):
+        """Test that tags match their descendants."""
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(Things3, 'FILE_CONFIG',
+                                  os.path.join(directory, 'kanbanviewrc')):
+            database = os.path.join(directory, 'tags.sqlite3')
+            shutil.copy('resources/demo.sqlite3', database)
+            things3 = Things3(database=database)
+            self.assertEqual(3, len(things3.get_waiting()))
+            connection = sqlite3.connect(database)
+            with connection:
+                connection.executescript("""
+                    INSERT INTO TMTag (uuid, title, parent) VALUES
+                        ('T1', 'Waiting for reply',
+                         '75854BF6-E5A5-4450-B149-BF38A5B82CC4'),
+                        ('T2', 'Waiting for mail', 'T1');
+                    INSERT INTO TMTaskTag VALUES
+                        ('732814F2-227E-4133-A3B7-C7107BB2B408', 'T2');
+                    """)
+            connection.close()
+            self.assertEqual(4, len(things3.get_waiting()))
+            self.assertEqual(1, len(things3.get_tag('Waiting for reply')))
+            tags = {tag['title']: tag['size'] for tag in things3.get_tags()}
+            self.assertEqual(4, tags['Waiting'])
+            self.assertEqual(1, tags['Waiting for mail'])
+            things3.filters = {"tag": "Waiting"}
+            self.assertEqual(5, len(things3.get_all()))
+
+    def test_planned_minutes(self):
+        """Test planned minutes from duration tags."""
+        self.assertEqual(30, Things3Tags.parse_minutes('30'))
+        self.assertEqual(60, Things3Tags.parse_minutes('1h'))
+        self.assertEqual(90, Things3Tags.parse_minutes('90m'))
+        self.assertEqual(90, Things3Tags.parse_minutes('1h30m'))
+        self.assertIsNone(Things3Tags.parse_minutes('Waiting'))
+        self.assertIsNone(Things3Tags.parse_minutes('h'))
+        self.assertEqual({'BD2177D3-7B42-4239-9666-91DAF780A3D5': 5,
+                          'CAC55136-1707-442F-80AE-F5CB65077C6A': 30},
+                         self.things3.tags.get_minutes())
+        self.assertEqual(35, sum(
+            row['minutes'] for row in self.things3.get_planned_minutes()))
+        projects = {row['title']: row['minutes'] for row in
+                    self.things3.get_planned_minutes(7, "project")}
+        self.assertEqual({None: 5, 'Demo Project': 30}, projects)
+        self.assertRaises(ValueError, self.things3.get_planned_minutes,
+                          7, "tag")
+
+    def test_concurrency(self):
+        """Test readers under load while a writer changes a WAL database."""
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(Things3, 'FILE_CONFIG',
+                                  os.path.join(directory, 'kanbanviewrc')):
+            database = os.path.join(directory, 'wal.sqlite3')
+            shutil.copy('resources/demo.sqlite3', database)
+            writer = sqlite3.connect(database, isolation_level=None,
+                                     check_same_thread=False)
+            writer.execute('PRAGMA journal_mode=WAL')
+            things3 = Things3(database=database)
+            stop = threading.Event()
+            errors = []
+            reads = []
+
+            def write():
+                count = 0
+                while not stop.is_set():
+                    count += 1
+                    writer.execute('BEGIN IMMEDIATE')
+                    writer.execute(
+                        """UPDATE TMTask SET title = ?
+                           WHERE title = 'Today items are shown here' OR
+                                 title LIKE 'Renamed %'""",
+                        (f'Renamed {count}',))
+                    writer.execute('COMMIT')
+
+            def read():
+                try:
+                    while not stop.is_set():
+                        with things3.snapshot():
+                            first = things3.get_today()
+                            second = things3.get_today()
+                        self.assertEqual(4, len(first))
+                        self.assertEqual(first, second)
+                        reads.append(len(first))
+                except Exception as error:  # pylint: disable=W0703
+                    errors.append(error)
+
+            threads = [threading.Thread(target=write)] + [
+                threading.Thread(target=read) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            time.sleep(1)
+            stop.set()
+            for thread in threads:
+                thread.join()
+            writer.close()
+            self.assertEqual([], errors)
+            self.assertTrue(reads)
+
+    def test_busy(self):
+        """Test retries while a writer holds an exclusive lock."""
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(Things3, 'FILE_CONFIG',
+                                  os.path.join(directory, 'kanbanviewrc')):
+            database = os.path.join(directory, 'busy.sqlite3')
+            shutil.copy('resources/demo.sqlite3', database)
+            things3 = Things3(database=database)
+            things3.busy_timeout = 10
+            things3.busy_retries = 0
+            writer = sqlite3.connect(database, isolation_level=None,
+                                     check_same_thread=False)
+            writer.execute('BEGIN EXCLUSIVE')
+            self.assertRaises(Things3Error, things3.get_inbox)
+            things3.busy_retries = 8
+            timer = threading.Timer(0.2, writer.rollback)
+            timer.start()
+            self.assertEqual(3, len(things3.get_inbox()))
+            timer.join()
+            writer.close()
+            self.assertIn('things3_query_retries_total{',
+                          things3.metrics.render())
+
+    def test_filtered(self):
+        """Test that filters of one thread do not affect the others."""
+        results = []
+
+        def query():
+            results.append(len(self.things3.get_anytime()))
+
+        with self.things3.filtered({"tag": "Waiting"}):
+            filtered = len(self.things3.get_anytime())
+            thread = threading.Thread(target=query)
+            thread.start()
+            thread.join()
+        self.assertEqual([29], results)
+        self.assertLess(filtered, 29)
+        self.assertEqual({}, self.things3.filters)
+
+    def test_filters(self):
+        """Test that filters apply to every view."""
+        self.things3.filters = {"area": "2ED66B28-7BF1-45C7-92BD-564A28EF762F"}
+        self.assertEqual(1, len(self.things3.get_projects()))
+        self.assertEqual(2, len(self.things3.get_anytime()))
+        self.assertEqual(2, self.things3.get_count("next"))
+        self.assertEqual([{'minutes': None}],
+                         self.things3.get_minutes_today())
+        self.things3.filters = {"tag": "Waiting"}
+        self.assertEqual(4, len(self.things3.get_all()))
+        self.things3.filters = {"start": "2020-01-01", "end": "2020-01-31"}
+        self.assertEqual(0, len(self.things3.get_all()))
+        self.things3.filters = {"start": "2020-01-01", "end": "2020-12-31"}
+        self.assertEqual(56, len(self.things3.get_all()))
+        self.things3.filters = {"project": "x' OR 1=1 --"}
+        self.assertEqual(0, len(self.things3.get_all()))
+
 
 if __name__ == '__main__':
     unittest.main()
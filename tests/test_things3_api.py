@@ -5,8 +5,12 @@
 
 import unittest
 import json
+import os
 import configparser
+from unittest import mock
 from things3 import things3, things3_api
+from things3.things3_html import Things3HTML
+from things3.things3_metrics import Things3Metrics
 
 
 class Things3APICase(unittest.TestCase):
@@ -55,10 +59,185 @@ class Things3APICase(unittest.TestCase):
             'project', 'F736F7F8-C9D5-4F30-B158-3684669985BC')
         result = json.loads(self.things3_api.api("next").response[0])
         self.assertEqual(26, len(result))
+        self.things3_api.api_filter('tag', 'Waiting')
+        result = json.loads(self.things3_api.api("next").response[0])
+        self.assertEqual(0, len(result))
         self.things3_api.api_filter_reset()
         result = json.loads(self.things3_api.api("next").response[0])
         self.assertEqual(29, len(result))
 
+    def test_filter_date(self):
+        """Test that date filters must be dates."""
+        client = self.things3_api.flask.test_client()
+        self.assertEqual(400, client.get(
+            '/api/filter/start/notadate').status_code)
+        self.assertEqual(400, client.post('/api/batch', json={
+            "commands": ["next"], "filter": {"end": "31.12.2020"}
+        }).status_code)
+        self.assertEqual({}, self.things3.filters)
+        self.assertEqual(200, client.get(
+            '/api/filter/start/2020-01-01').status_code)
+        client.get('/api/filter/reset')
+
+    def test_batch(self):
+        """Test several views in one request."""
+        client = self.things3_api.flask.test_client()
+        result = client.post('/api/batch', json={
+            "commands": ["today", "inbox", "unknown"],
+            "tags": ["Waiting", "MIT"]}).get_json()
+        self.assertEqual(4, len(result["commands"]["today"]))
+        self.assertEqual(3, len(result["commands"]["inbox"]))
+        self.assertEqual("not implemented",
+                         result["commands"]["unknown"][0]["title"])
+        self.assertEqual(3, len(result["tags"]["Waiting"]))
+        result = client.post('/api/batch', json={
+            "commands": ["next"],
+            "filter": {"project": "F736F7F8-C9D5-4F30-B158-3684669985BC"}
+        }).get_json()
+        self.assertEqual(26, len(result["commands"]["next"]))
+        result = client.get('/api/batch?command=next').get_json()
+        self.assertEqual(29, len(result["commands"]["next"]))
+
+    def test_batch_invalid(self):
+        """Test that malformed batches are rejected."""
+        client = self.things3_api.flask.test_client()
+        for data in (["today"], {"commands": "today"}, {"commands": [1]},
+                     {"tags": "Waiting"}, {"filter": [1]},
+                     {"filter": {"area": 1}}):
+            self.assertEqual(400, client.post(
+                '/api/batch', json=data).status_code)
+
+    def test_count(self):
+        """Test counts and the distribution."""
+        client = self.things3_api.flask.test_client()
+        self.assertEqual(4, client.get('/api/today/count').get_json())
+        self.assertEqual(5, client.get(
+            '/api/next/count?mode=project').get_json())
+        self.assertEqual(404, client.get('/api/unknown/count').status_code)
+        result = client.get('/api/distribution').get_json()
+        self.assertEqual(3, result["inbox"])
+
+    def test_page(self):
+        """Test limited columns."""
+        client = self.things3_api.flask.test_client()
+        result = client.get('/api/next?limit=20&cursor=20').get_json()
+        self.assertEqual(29, result["total"])
+        self.assertEqual(9, len(result["items"]))
+        self.assertIsNone(result["next"])
+        result = client.get('/api/tag/Waiting?limit=1').get_json()
+        self.assertEqual(1, result["next"])
+
+    def test_checklist(self):
+        """Test checklist items on request."""
+        client = self.things3_api.flask.test_client()
+        result = client.get('/api/subtasks').get_json()
+        self.assertEqual("0/4", result[0]["progress"])
+        result = client.get('/api/next?checklist=1').get_json()
+        self.assertIn("checklist", result[0])
+        result = client.get('/api/next?limit=5&checklist=1').get_json()
+        self.assertIn("progress", result["items"][0])
+        result = client.get('/api/next').get_json()
+        self.assertNotIn("checklist", result[0])
+
+    def test_minutes(self):
+        """Test planned minutes."""
+        client = self.things3_api.flask.test_client()
+        result = client.get('/api/minutes?days=14&group=area').get_json()
+        self.assertEqual(35, sum(row["minutes"] for row in result))
+        self.assertEqual(400, client.get('/api/minutes?group=x').status_code)
+
+    def test_unavailable(self):
+        """Test that database errors do not stop the server."""
+        client = self.things3_api.flask.test_client()
+        with mock.patch.object(self.things3, 'database', '/nonexistent'):
+            result = client.get('/api/today?mode=project')
+        self.assertEqual(503, result.status_code)
+        self.assertIn("/nonexistent", result.get_json()["error"])
+        self.assertEqual(self.things3.MODE_TASK, self.things3.IS_TASK)
+        self.assertEqual(200, client.get('/api/today').status_code)
+
+    def test_ical(self):
+        """Test the calendar feed with conditional requests."""
+        client = self.things3_api.flask.test_client()
+        result = client.get('/api/ical')
+        self.assertEqual(200, result.status_code)
+        self.assertIn(b"BEGIN:VTODO", result.data)
+        etag = result.headers["ETag"]
+        modified = result.headers["Last-Modified"]
+        result = client.get('/api/ical', headers={"If-None-Match": etag})
+        self.assertEqual(304, result.status_code)
+        self.assertEqual(b"", result.data)
+        result = client.get('/api/ical',
+                            headers={"If-Modified-Since": modified})
+        self.assertEqual(304, result.status_code)
+        result = client.get('/api/ical', headers={"If-None-Match": '"x"'})
+        self.assertEqual(200, result.status_code)
+
+    def test_html(self):
+        """Test the server-side rendered columns."""
+        client = self.things3_api.flask.test_client()
+        result = client.get('/api/html/today').get_json()
+        self.assertEqual(4, result["total"])
+        self.assertIsNone(result["next"])
+        self.assertEqual(4, result["html"].count("class='box bigger'"))
+        result = client.get('/api/html/next?limit=5&cursor=25').get_json()
+        self.assertIsNone(result["next"])
+        result = client.get('/api/html/tag/Waiting').get_json()
+        self.assertEqual(3, result["total"])
+        result = client.get('/api/html/unknown')
+        self.assertEqual(404, result.status_code)
+        result = client.post('/api/batch', json={"tags": ["Waiting"],
+                                                 "html": True}).get_json()
+        self.assertIn("class='box bigger'", result["tags"]["Waiting"])
+
+    def test_hashes(self):
+        """Test that only changed columns report a delta."""
+        client = self.things3_api.flask.test_client()
+        today = client.get('/api/html/today').get_json()
+        result = client.get('/api/hashes?column=today&column=tag/Waiting' +
+                            '&column=unknown').get_json()
+        self.assertEqual(today["hash"], result["today"]["hash"])
+        self.assertEqual(3, result["tag/Waiting"]["total"])
+        self.assertEqual(things3.Things3.get_not_implemented(),
+                         result["unknown"])
+        waiting = result["tag/Waiting"]["hash"]
+        result = client.post('/api/hashes', json={"columns": {
+            "today": waiting, "tag/Waiting": waiting}}).get_json()
+        self.assertNotIn("added", result["tag/Waiting"])
+        self.assertEqual(4, len(result["today"]["added"]))
+        self.assertEqual(3, len(result["today"]["removed"]))
+
+    def test_hashes_invalid(self):
+        """Test that a list of columns has no known hashes."""
+        client = self.things3_api.flask.test_client()
+        result = client.post('/api/hashes', json={"columns": ["today"]})
+        self.assertEqual(200, result.status_code)
+        self.assertNotIn("added", result.get_json()["today"])
+        for data in ({"columns": "today"}, {"columns": {"today": []}},
+                     ["today"]):
+            self.assertEqual(400, client.post(
+                '/api/hashes', json=data).status_code)
+
+    def test_limit(self):
+        """Test that pages must have at least one row."""
+        client = self.things3_api.flask.test_client()
+        for limit in (0, -1):
+            self.assertEqual(400, client.get(
+                f'/api/next?limit={limit}').status_code)
+            self.assertEqual(400, client.get(
+                f'/api/html/next?limit={limit}').status_code)
+        with self.assertRaises(ValueError):
+            self.things3_api.things3.get_page(
+                things3.Things3.get_anytime, limit=0)
+
+    def test_query(self):
+        """Test combined views."""
+        client = self.things3_api.flask.test_client()
+        result = client.get('/api/query?view=today&tag=MIT').get_json()
+        self.assertEqual(2, len(result))
+        result = client.get('/api/query?view=next&limit=5').get_json()
+        self.assertEqual(29, result["total"])
+
     def test_get_file(self):
         """Test get file."""
         result = self.things3_api.on_get(
@@ -70,6 +249,68 @@ class Things3APICase(unittest.TestCase):
         result = self.things3_api.config_get('TAG_MIT').response[0]
         self.assertEqual(b"MIT", result)
 
+    def test_metrics(self):
+        """Test metrics export."""
+        client = self.things3_api.flask.test_client()
+        client.get('/api/inbox')
+        result = client.get('/api/metrics').data.decode('utf-8')
+        self.assertIn('things3_query_bytes_total{query="inbox"}', result)
+        self.assertIn('things3_http_requests_total' +
+                      '{route="/api/<command>",status="200"}', result)
+
+    def test_metrics_board(self):
+        """Test that board columns are recorded under their views."""
+        client = self.things3_api.flask.test_client()
+        metrics = Things3Metrics()
+        with mock.patch.object(self.things3, 'metrics', metrics), \
+                mock.patch.object(self.things3_api, 'html', Things3HTML()):
+            for _ in range(2):
+                client.get('/api/html/next?limit=5')
+        result = metrics.render()
+        self.assertIn('things3_query_rows_total{query="next"}', result)
+        for name in ("page", "content", "checklists", "query"):
+            self.assertNotIn(f'{{query="{name}"}}', result)
+        self.assertIn('{cache="column",result="hit"} 1', result)
+        self.assertIn('{cache="card",result="miss"} 5', result)
+        self.assertIn('{cache="query",result=', result)
+
+    def test_export(self):
+        """Test streamed export."""
+        client = self.things3_api.flask.test_client()
+        result = client.get('/api/export')
+        self.assertEqual('application/x-ndjson', result.content_type)
+        lines = result.data.decode('utf-8').splitlines()
+        self.assertEqual(81, len(lines))
+        self.assertIn("tags", json.loads(lines[0]))
+        result = client.get('/api/export?format=xml')
+        self.assertEqual(400, result.status_code)
+
+    def test_explain(self):
+        """Test query plans."""
+        result = json.loads(self.things3_api.api_explain("today").response[0])
+        self.assertEqual("today", result[0]["query"])
+        self.assertIn("plan", result[0])
+
+    def test_profile(self):
+        """Test on-demand profiling."""
+        api = things3_api.Things3API(database='resources/demo.sqlite3',
+                                     profile=False)
+        client = api.flask.test_client()
+        result = client.get('/api/today?profile=1').data.decode('utf-8')
+        self.assertTrue(result.startswith('['))
+
+        api = things3_api.Things3API(database='resources/demo.sqlite3',
+                                     profile=True)
+        client = api.flask.test_client()
+        result = client.get('/api/today?profile=1').data.decode('utf-8')
+        self.assertIn("function calls", result)
+        result = client.get('/api/today',
+                            headers={'X-Things3-Profile': 'save'})
+        filename = result.headers['X-Things3-Profile-File']
+        self.assertTrue(os.path.exists(filename))
+        os.remove(filename)
+        self.assertEqual(4, len(json.loads(result.data)))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Module documentation goes here."""
+
+import unittest
+import os
+import tempfile
+from unittest import mock
+from things3.things3 import Things3
+from things3.things3_benchmark import Things3Benchmark, main
+from things3.things3_generator import Things3Generator
+
+
+class Things3BenchmarkCase(unittest.TestCase):
+    """Class documentation goes here."""
+
+    def test_run(self):
+        """Test that every view is measured."""
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(Things3, 'FILE_CONFIG',
+                                  os.path.join(directory, 'kanbanviewrc')):
+            database = os.path.join(directory, 'test.sqlite3')
+            Things3Generator(tasks=500).create(database)
+            benchmark = Things3Benchmark(database, repeat=1)
+            results = benchmark.run()
+        for command in benchmark.things3.functions:
+            self.assertIn(f"query/{command}", results)
+        self.assertIn("export/opml", results)
+        self.assertIn("api/today", results)
+
+    def test_config(self):
+        """Test that the benchmark does not change the configuration."""
+        with tempfile.TemporaryDirectory() as directory:
+            config = os.path.join(directory, 'kanbanviewrc')
+            with open(config, 'w') as file:
+                file.write("[DATABASE]\nthingsdb = resources/demo.sqlite3\n")
+            with mock.patch.object(Things3, 'FILE_CONFIG', config):
+                main(["-t", "100", "-r", "1", "-o",
+                      os.path.join(directory, 'benchmark.json')])
+            with open(config) as file:
+                self.assertIn("resources/demo.sqlite3", file.read())
+        self.assertNotIn("benchmark.sqlite3",
+                         Things3.config.get('DATABASE', 'THINGSDB',
+                                            fallback=''))
+
+    def test_compare(self):
+        """Test regression detection."""
+        baseline = {"query/today": 0.010, "query/inbox": 0.010}
+        results = {"query/today": 0.100, "query/inbox": 0.011,
+                   "query/new": 1.0}
+        regressions = Things3Benchmark.compare(results, baseline)
+        self.assertEqual(["query/today"], list(regressions))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Module documentation goes here."""
+
+import unittest
+import os
+import tempfile
+import time
+from things3.things3_cache import Things3Cache
+
+
+class Things3CacheCase(unittest.TestCase):
+    """Class documentation goes here."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = Things3Cache(self.directory.name, max_size=350)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_set(self):
+        """Test storing and loading entries."""
+        key = Things3Cache.get_key('today', 'json', 'fingerprint')
+        self.assertIsNone(self.cache.get(key))
+        self.cache.set(key, b'[]')
+        self.assertEqual(b'[]', self.cache.get(key))
+        self.assertNotEqual(key, Things3Cache.get_key('today', 'json', 'x'))
+
+    def test_evict(self):
+        """Test that least recently used entries are removed first."""
+        for idx in range(3):
+            self.cache.set(str(idx), b'x' * 100)
+            past = time.time() - 100 + idx
+            os.utime(self.cache.get_file(str(idx)), (past, past))
+        self.cache.get('0')
+        self.cache.set('3', b'x' * 100)
+        self.assertIsNotNone(self.cache.get('0'))
+        self.assertIsNone(self.cache.get('1'))
+        self.assertIsNotNone(self.cache.get('2'))
+        self.assertIsNotNone(self.cache.get('3'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,8 +5,13 @@
 
 import unittest
 import io
+import json
 import sys
+import tempfile
+from unittest import mock
 import things3.things3_cli as things3_cli
+from things3.things3_cache import Things3Cache
+from things3.things3_mirror import Things3Mirror
 
 
 class Things3CLICase(unittest.TestCase):
@@ -14,6 +19,8 @@ class Things3CLICase(unittest.TestCase):
 
     things3_cli = things3_cli.Things3CLI(database='resources/demo.sqlite3')
 
+    @mock.patch.object(Things3Mirror, 'FILE_MIRROR',
+                       tempfile.mktemp(suffix='.sqlite3'))
     def test_methods(self):
         """Invoke all commands."""
         parser = self.things3_cli.get_parser()
@@ -65,6 +72,129 @@ class Things3CLICase(unittest.TestCase):
             sys.stdout = old_out
         self.assertIn("4F7006C4ADF7", new_out.getvalue())
 
+    def test_batch(self):
+        """Test several views in one invocation."""
+        args = self.things3_cli.get_parser().parse_args(
+            ['batch', 'today', 'inbox'])
+        new_out = io.StringIO()
+        old_out = sys.stdout
+        try:
+            sys.stdout = new_out
+            self.things3_cli.main(args)
+        finally:
+            sys.stdout = old_out
+        result = json.loads(new_out.getvalue())
+        self.assertEqual(4, len(result["today"]))
+        self.assertEqual(3, len(result["inbox"]))
+
+        args = self.things3_cli.get_parser().parse_args(
+            ['batch', '--ndjson', 'today', 'due'])
+        new_out = io.StringIO()
+        try:
+            sys.stdout = new_out
+            self.things3_cli.main(args)
+        finally:
+            sys.stdout = old_out
+        lines = new_out.getvalue().splitlines()
+        self.assertEqual(["today", "due"],
+                         [list(json.loads(line))[0] for line in lines])
+
+    def test_cache(self):
+        """Test that unchanged results are served from disk."""
+        args = self.things3_cli.get_parser().parse_args(
+            ['--cache', '-j', 'today'])
+        old_out = sys.stdout
+        old_cache = self.things3_cli.cache
+        outputs = []
+        with tempfile.TemporaryDirectory() as directory:
+            self.things3_cli.cache = Things3Cache(directory)
+            try:
+                for _ in range(2):
+                    sys.stdout = io.StringIO()
+                    self.things3_cli.main(args)
+                    outputs.append(sys.stdout.getvalue())
+                    self.things3_cli.things3.execute_query = mock.Mock(
+                        side_effect=AssertionError("database opened"))
+            finally:
+                sys.stdout = old_out
+                self.things3_cli.cache = old_cache
+                del self.things3_cli.things3.execute_query
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertIn("Today MIT", outputs[1])
+
+    def test_cache_tags(self):
+        """Test that cached results depend on the tag settings."""
+        args = self.things3_cli.get_parser().parse_args(
+            ['--cache', '-j', 'waiting'])
+        old_out = sys.stdout
+        old_cache = self.things3_cli.cache
+        old_tag = self.things3_cli.things3.tag_waiting
+        outputs = []
+        with tempfile.TemporaryDirectory() as directory:
+            self.things3_cli.cache = Things3Cache(directory)
+            try:
+                for tag in ("Waiting", "MIT"):
+                    self.things3_cli.things3.tag_waiting = tag
+                    sys.stdout = io.StringIO()
+                    self.things3_cli.main(args)
+                    outputs.append(sys.stdout.getvalue())
+            finally:
+                sys.stdout = old_out
+                self.things3_cli.cache = old_cache
+                self.things3_cli.things3.tag_waiting = old_tag
+        self.assertNotEqual(outputs[0], outputs[1])
+
+    def test_cache_settings(self):
+        """Test that cached results depend on the number of days."""
+        args = self.things3_cli.get_parser().parse_args(
+            ['--cache', 'batch', 'stats-day'])
+        old_out = sys.stdout
+        old_cache = self.things3_cli.cache
+        old_days = self.things3_cli.things3.stat_days
+        outputs = []
+        with tempfile.TemporaryDirectory() as directory:
+            self.things3_cli.cache = Things3Cache(directory)
+            try:
+                for days in ("3", "5"):
+                    self.things3_cli.things3.stat_days = days
+                    sys.stdout = io.StringIO()
+                    self.things3_cli.main(args)
+                    outputs.append(json.loads(sys.stdout.getvalue()))
+            finally:
+                sys.stdout = old_out
+                self.things3_cli.cache = old_cache
+                self.things3_cli.things3.stat_days = old_days
+        self.assertNotEqual(outputs[0], outputs[1])
+
+    def test_export(self):
+        """Test NDJSON export."""
+        args = self.things3_cli.get_parser().parse_args(['export'])
+        new_out = io.StringIO()
+        old_out = sys.stdout
+        try:
+            sys.stdout = new_out
+            self.things3_cli.main(args)
+        finally:
+            sys.stdout = old_out
+        lines = new_out.getvalue().splitlines()
+        self.assertEqual(81, len(lines))
+        self.assertEqual("00628292-02B5-4C56-822A-DECB18D7C7A5",
+                         json.loads(lines[0])["uuid"])
+
+    def test_opml(self):
+        """Test the streamed OPML export."""
+        args = self.things3_cli.get_parser().parse_args(['opml'])
+        new_out = io.StringIO()
+        old_out = sys.stdout
+        try:
+            sys.stdout = new_out
+            self.things3_cli.main(args)
+        finally:
+            sys.stdout = old_out
+        self.assertIn('<outline text="Project in an area">',
+                      new_out.getvalue())
+        self.assertTrue(new_out.getvalue().rstrip().endswith("</opml>"))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Module documentation goes here."""
+
+import unittest
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from unittest import mock
+from things3.things3_cli import Things3CLI
+from things3.things3_daemon import Things3Daemon
+
+
+class Things3DaemonCase(unittest.TestCase):
+    """Class documentation goes here."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.socket = os.path.join(self.directory.name, 'things.sock')
+        self.daemon = Things3Daemon(database='resources/demo.sqlite3',
+                                    socket_path=self.socket)
+        self.daemon.start()
+        self.thread = threading.Thread(target=self.daemon.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.daemon.server.shutdown()
+        self.thread.join()
+        self.daemon.stop()
+        self.directory.cleanup()
+
+    def test_forward(self):
+        """Test that the daemon answers CLI calls."""
+        output = Things3CLI.forward(['today'], self.socket)
+        self.assertIn("Today MIT", output)
+        self.assertEqual(output, Things3CLI.forward(['today'], self.socket))
+        self.assertIn("4F7006C4ADF7",
+                      Things3CLI.forward(['-j', 'upcoming'], self.socket))
+        self.assertIn('things3_cache_total{cache="daemon",result="hit"} 1',
+                      self.daemon.things3.metrics.render())
+
+    def test_fallback(self):
+        """Test that unsupported calls are left to the client."""
+        self.assertIsNone(Things3CLI.forward(['feedback'], self.socket))
+        self.assertIsNone(Things3CLI.forward(['--help'], self.socket))
+        self.assertIsNone(Things3CLI.forward(['today'], self.socket + 'x'))
+
+    def test_environment(self):
+        """Test that calls with other settings are left to the client."""
+        with mock.patch.dict(os.environ, {"THINGSDB": "other.sqlite3"}):
+            self.assertIsNone(Things3CLI.forward(['today'], self.socket))
+        with mock.patch.dict(os.environ, {"TAG_WAITING": "Other"}):
+            self.assertIsNone(Things3CLI.forward(['waiting'], self.socket))
+        self.assertIsNotNone(Things3CLI.forward(['waiting'], self.socket))
+
+    def test_client(self):
+        """Test that forwarded calls do not import the whole CLI."""
+        script = "import sys; from things3 import things3_client; " + \
+            "things3_client.main(); " + \
+            "sys.exit('things3.things3' in sys.modules)"
+        environment = dict(os.environ, DAEMON_SOCKET=self.socket)
+        result = subprocess.run([sys.executable, '-c', script, 'today'],
+                                env=environment, capture_output=True,
+                                check=False)
+        self.assertEqual(0, result.returncode)
+        self.assertIn(b"Today MIT", result.stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
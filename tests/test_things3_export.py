@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Module documentation goes here."""
+
+import unittest
+import io
+import json
+from things3.things3 import Things3
+from things3 import things3_export
+
+
+class Things3ExportCase(unittest.TestCase):
+    """Class documentation goes here."""
+
+    things3 = Things3(database='resources/demo.sqlite3')
+
+    def test_ndjson(self):
+        """Test NDJSON encoding."""
+        output = io.BytesIO()
+        things3_export.Things3Export(self.things3).write(output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(81, len(lines))
+        self.assertEqual("task", json.loads(lines[0])["type"])
+
+    def test_unknown(self):
+        """Test unknown formats."""
+        with self.assertRaises(ValueError):
+            things3_export.Things3Export(self.things3, 'xml')
+
+    @unittest.skipIf(things3_export.msgpack is None, "msgpack not installed")
+    def test_msgpack(self):
+        """Test msgpack encoding."""
+        output = io.BytesIO()
+        things3_export.Things3Export(self.things3, 'msgpack').write(output)
+        unpacker = things3_export.msgpack.Unpacker(
+            io.BytesIO(output.getvalue()))
+        self.assertEqual(81, len(list(unpacker)))
+
+
+if __name__ == '__main__':
+    unittest.main()
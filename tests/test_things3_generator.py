@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Module documentation goes here."""
+
+import unittest
+import os
+import tempfile
+from unittest import mock
+from things3.things3 import Things3
+from things3.things3_generator import Things3Generator
+
+
+class Things3GeneratorCase(unittest.TestCase):
+    """Class documentation goes here."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.directory.name, 'test.sqlite3')
+        self.config = mock.patch.object(
+            Things3, 'FILE_CONFIG',
+            os.path.join(self.directory.name, 'kanbanviewrc'))
+        self.config.start()
+        Things3Generator(tasks=1000).create(self.database)
+        self.things3 = Things3(database=self.database)
+
+    def tearDown(self):
+        self.config.stop()
+        self.directory.cleanup()
+
+    def test_views(self):
+        """Test that the generated database populates the views."""
+        self.assertGreater(len(self.things3.get_anytime()), 0)
+        self.assertGreater(len(self.things3.get_waiting()), 0)
+        self.assertGreater(len(self.things3.get_projects()), 0)
+        self.assertEqual(1000, len(self.things3.execute_query(
+            "SELECT uuid FROM TMTask WHERE type = 0")))
+
+    def test_reproducible(self):
+        """Test that the same seed creates the same database."""
+        other = os.path.join(self.directory.name, 'other.sqlite3')
+        Things3Generator(tasks=1000).create(other)
+        self.assertEqual(self.things3.get_today(),
+                         Things3(database=other).get_today())
+
+    def test_floating(self):
+        """Test that tasks can be created without a parent."""
+        other = os.path.join(self.directory.name, 'other.sqlite3')
+        Things3Generator(tasks=500, floating=1).create(other)
+        things3 = Things3(database=other)
+        self.assertEqual([], things3.execute_query(
+            """SELECT uuid FROM TMTask WHERE type = 0 AND
+               (area IS NOT NULL OR project IS NOT NULL OR
+                actionGroup IS NOT NULL)"""))
+        self.assertGreater(len(things3.get_lint()), 100)
+        self.assertGreaterEqual(things3.get_count("cleanup"),
+                                len(things3.get_lint()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Module documentation goes here."""
+
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from things3.things3 import Things3
+from things3.things3_html import Things3HTML
+
+
+class Things3HTMLCase(unittest.TestCase):
+    """Class documentation goes here."""
+
+    def setUp(self):
+        self.things3 = Things3(database='resources/demo.sqlite3')
+        self.html = Things3HTML()
+
+    def test_render(self):
+        """Test that titles and contexts are escaped."""
+        card = self.html.render({"uuid": "A", "title": "<b>&</b>",
+                                 "context": "x'y", "context_uuid": None,
+                                 "due": "01.01.21", "started": None,
+                                 "progress": "1/2", "type": "task"})
+        self.assertIn("&lt;b&gt;&amp;&lt;/b&gt;", card)
+        self.assertIn("x&#x27;y", card)
+        self.assertIn("Due: 01.01.21", card)
+        self.assertIn("Checklist: 1/2", card)
+        self.assertIn("hasDeadline", card)
+        self.assertNotIn("<b>", card)
+
+    def test_column(self):
+        """Test pages of a column and the card cache."""
+        column = self.html.get_column(self.things3, Things3.get_anytime,
+                                      limit=5)
+        self.assertEqual(29, column["total"])
+        self.assertEqual(5, column["next"])
+        self.assertEqual(5, column["html"].count("class='box bigger'"))
+        self.assertEqual(5, len(self.html.cards))
+        self.assertIs(column, self.html.get_column(
+            self.things3, Things3.get_anytime, limit=5))
+        key = next(iter(self.html.cards))
+        self.html.cards[key] = "cached"
+        self.html.columns.clear()
+        column = self.html.get_column(self.things3, Things3.get_anytime,
+                                      limit=5)
+        self.assertTrue(column["html"].startswith("cached"))
+
+    def test_unversioned(self):
+        """Test that rows without a modification date are not cached."""
+        row = {"uuid": "A", "title": "Area", "context": None}
+        self.assertIn("Area", self.html.render_card(self.things3, row))
+        row["title"] = "Renamed"
+        self.assertIn("Renamed", self.html.render_card(self.things3, row))
+        self.assertEqual({}, self.html.cards)
+
+    def test_eviction(self):
+        """Test that full caches drop their oldest entries from threads."""
+        def store(number):
+            for key in range(1000):
+                self.html.store(self.html.cards, (number, key), key, 8)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(store, range(8)))
+        self.assertEqual(8, len(self.html.cards))
+
+    def test_delta(self):
+        """Test column hashes and the delta to a known hash."""
+        old = (("A", 1, None), ("B", 1, None), ("C", 1, None))
+        new = (("C", 1, None), ("B", 2, None), ("D", 1, None))
+        self.assertEqual({"added": ["D"], "removed": ["A"],
+                          "moved": ["C", "B"], "changed": ["B"]},
+                         Things3HTML.get_diff(old, new))
+        delta = self.html.get_delta(self.things3, Things3.get_today)
+        self.assertEqual(4, delta["total"])
+        self.assertNotIn("added", delta)
+        column = self.html.get_column(self.things3, Things3.get_today)
+        self.assertEqual(delta["hash"], column["hash"])
+        known = delta["hash"]
+        self.html.contents[known] = (("X", 1, None),)
+        self.html.columns.clear()
+        delta = self.html.get_delta(self.things3, Things3.get_today,
+                                    known=known)
+        self.assertEqual(known, delta["hash"])
+        self.assertNotIn("removed", delta)
+        delta = self.html.get_delta(self.things3, Things3.get_today,
+                                    known="other")
+        self.assertNotIn("removed", delta)
+
+    def test_static(self):
+        """Test a column with its header."""
+        rows = self.things3.get_today()
+        column = self.html.render_column(self.things3, "color6", "Today",
+                                         rows)
+        self.assertIn("<span class='size'>4</span>", column)
+        self.assertEqual(4, column.count("class='box bigger'"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Module documentation goes here."""
+
+import unittest
+import io
+from things3.things3 import Things3
+from things3.things3_ical import Things3ICal
+
+
+class Things3ICalCase(unittest.TestCase):
+    """Class documentation goes here."""
+
+    def setUp(self):
+        self.things3 = Things3(database='resources/demo.sqlite3')
+        self.ical = Things3ICal()
+
+    def test_encode(self):
+        """Test due tasks as todos and scheduled tasks as events."""
+        output = io.BytesIO()
+        self.ical.write(self.things3, output)
+        calendar = output.getvalue().decode('utf-8')
+        self.assertTrue(calendar.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertTrue(calendar.endswith("END:VCALENDAR\r\n"))
+        self.assertEqual(1, calendar.count("BEGIN:VTODO"))
+        self.assertEqual(5, calendar.count("BEGIN:VEVENT"))
+        self.assertIn("DUE;VALUE=DATE:20210722", calendar)
+        self.assertIn("DTSTART;VALUE=DATE:20991231", calendar)
+
+    def test_cache(self):
+        """Test that unchanged entries are not rendered again."""
+        list(self.ical.encode(self.things3))
+        self.assertEqual(6, len(self.ical.cache))
+        key = next(iter(self.ical.cache))
+        self.ical.cache[key] = b'cached'
+        self.assertIn(b'cached', b''.join(self.ical.encode(self.things3)))
+
+    def test_format(self):
+        """Test escaping and folding of long lines."""
+        self.assertEqual('a\\, b\\; c\\nd', Things3ICal.escape('a, b; c\nd'))
+        lines = Things3ICal.fold('SUMMARY:' + 'ä' * 100).split('\r\n')
+        self.assertEqual(4, len(lines))
+        self.assertTrue(all(len(line.encode('utf-8')) <= 75
+                            for line in lines))
+        self.assertTrue(lines[1].startswith(' '))
+
+
+if __name__ == '__main__':
+    unittest.main()
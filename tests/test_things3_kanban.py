@@ -5,6 +5,11 @@
 
 import unittest
 import io
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock
 import things3.things3_kanban as things3_kanban
 from things3.things3 import Things3
 
@@ -27,6 +32,57 @@ class Things3KanbanCase(unittest.TestCase):
         things3_kanban.main(output)
         self.assertIn("Today MIT", output.getvalue())
 
+    def test_generate(self):
+        """Test that unchanged databases are not rendered again."""
+        things3_kanban.THINGS3 = self.things3
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'kanban-static.html')
+            self.assertTrue(things3_kanban.generate(filename))
+            self.assertFalse(things3_kanban.generate(filename))
+            self.assertTrue(things3_kanban.generate(filename, force=True))
+            with open(filename) as file:
+                self.assertIn("Today MIT", file.read())
+
+    def test_atomic(self):
+        """Test that a failed run keeps the previous file."""
+        things3_kanban.THINGS3 = self.things3
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'kanban-static.html')
+            with open(filename, 'w') as file:
+                file.write("previous")
+            with mock.patch.object(things3_kanban, 'write_html_footer',
+                                   side_effect=OSError("disk full")):
+                with self.assertRaises(OSError):
+                    things3_kanban.generate(filename)
+            self.assertEqual(['kanban-static.html'], os.listdir(directory))
+            with open(filename) as file:
+                self.assertEqual("previous", file.read())
+
+    def test_snapshot(self):
+        """Test that all columns are read from one state of the database."""
+        with tempfile.TemporaryDirectory() as directory:
+            database = os.path.join(directory, 'Things.sqlite3')
+            shutil.copy('resources/demo.sqlite3', database)
+            with sqlite3.connect(database) as connection:
+                connection.execute("PRAGMA journal_mode=WAL")
+            with Things3.keep_config():
+                things3_kanban.THINGS3 = Things3(database=database)
+            get_today = things3_kanban.THINGS3.get_today
+
+            def change_and_read():
+                with sqlite3.connect(database) as connection:
+                    connection.execute("UPDATE TMTask SET trashed = 1")
+                return get_today()
+
+            output = self.CustomStringIO()
+            try:
+                with mock.patch.object(things3_kanban.THINGS3, 'get_today',
+                                       side_effect=change_and_read):
+                    things3_kanban.main(output)
+            finally:
+                things3_kanban.THINGS3 = self.things3
+        self.assertIn("Today<span class='size'>4</span>", output.getvalue())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Module documentation goes here."""
+
+import unittest
+import json
+import os
+import tempfile
+from unittest import mock
+from things3.things3 import Things3
+from things3.things3_generator import Things3Generator
+from things3.things3_load import Things3Load, main
+
+
+class Things3LoadCase(unittest.TestCase):
+    """Class documentation goes here."""
+
+    def test_run(self):
+        """Test that every route of the request mix is measured."""
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(Things3, 'FILE_CONFIG',
+                                  os.path.join(directory, 'kanbanviewrc')):
+            database = os.path.join(directory, 'test.sqlite3')
+            Things3Generator(tasks=300).create(database)
+            load = Things3Load(database, concurrency=2, rounds=1)
+            session = load.get_session()
+            report = load.run()
+        self.assertEqual(2 * len(session), report["requests"])
+        self.assertEqual(0, report["errors"])
+        for route in ("api/html/today", "api/html/tag/Waiting", "api/batch",
+                      "api/batch?filter", "api/stats-day"):
+            self.assertIn(route, report["routes"])
+        route = report["routes"]["api/html/today"]
+        self.assertEqual(2, route["requests"])
+        self.assertLessEqual(route["p50"], route["p99"])
+
+    def test_filtered(self):
+        """Test that filtered boards do not change the server's filter."""
+        load = Things3Load('resources/demo.sqlite3')
+        route, url, data = load.get_filtered("AREA")
+        self.assertEqual(("api/batch?filter", "api/batch"), (route, url))
+        batch = json.loads(data)
+        self.assertEqual({"area": "AREA"}, batch["filter"])
+        self.assertIn("today", batch["commands"])
+        self.assertIn("Waiting", batch["tags"])
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles."""
+        values = list(range(1, 101))
+        self.assertEqual(50, Things3Load.get_percentile(values, 50))
+        self.assertEqual(99, Things3Load.get_percentile(values, 99))
+        self.assertEqual(7, Things3Load.get_percentile([7], 95))
+
+    def test_config(self):
+        """Test that the load test does not change the configuration."""
+        with tempfile.TemporaryDirectory() as directory:
+            config = os.path.join(directory, 'kanbanviewrc')
+            with open(config, 'w') as file:
+                file.write("[DATABASE]\nthingsdb = resources/demo.sqlite3\n")
+            with mock.patch.object(Things3, 'FILE_CONFIG', config):
+                main(["-t", "100", "-c", "1", "-s", "0.1", "-o",
+                      os.path.join(directory, 'load.json')])
+            with open(config) as file:
+                self.assertIn("resources/demo.sqlite3", file.read())
+
+    def test_database(self):
+        """Test that no number of tasks is reported for a given database."""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'load.json')
+            with mock.patch.object(Things3, 'FILE_CONFIG',
+                                   os.path.join(directory, 'kanbanviewrc')):
+                main(["-d", "resources/demo.sqlite3", "-c", "1", "-s", "0.1",
+                      "-o", output])
+            with open(output) as file:
+                report = json.load(file)
+        self.assertNotIn("tasks", report)
+        self.assertGreater(report["requests"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Module documentation goes here."""
+
+import unittest
+from things3.things3_metrics import Things3Metrics
+
+
+class Things3MetricsCase(unittest.TestCase):
+    """Class documentation goes here."""
+
+    def test_histogram(self):
+        """Test histogram buckets."""
+        metrics = Things3Metrics()
+        metrics.observe("things3_query_duration_seconds",
+                        {"query": "today"}, 0.003)
+        metrics.observe("things3_query_duration_seconds",
+                        {"query": "today"}, 0.3)
+        result = metrics.render()
+        self.assertIn('things3_query_duration_seconds_bucket' +
+                      '{query="today",le="0.005"} 1', result)
+        self.assertIn('things3_query_duration_seconds_bucket' +
+                      '{query="today",le="+Inf"} 2', result)
+        self.assertIn('things3_query_duration_seconds_count' +
+                      '{query="today"} 2', result)
+
+    def test_counter(self):
+        """Test counters and label escaping."""
+        metrics = Things3Metrics()
+        metrics.cache("cli", True)
+        metrics.cache("cli", True)
+        metrics.increment("things3_query_rows_total", {"query": 'a"b'}, 5)
+        result = metrics.render()
+        self.assertIn('things3_cache_total{cache="cli",result="hit"} 2',
+                      result)
+        self.assertIn('things3_query_rows_total{query="a\\"b"} 5', result)
+
+
+if __name__ == '__main__':
+    unittest.main()
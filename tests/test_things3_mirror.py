@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Module documentation goes here."""
+
+import unittest
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock
+from things3.things3 import Things3
+from things3.things3_mirror import Things3Mirror
+
+
+class Things3MirrorCase(unittest.TestCase):
+    """Class documentation goes here."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.directory.name, 'source.sqlite3')
+        shutil.copy('resources/demo.sqlite3', self.database)
+        self.config = mock.patch.object(
+            Things3, 'FILE_CONFIG',
+            os.path.join(self.directory.name, 'kanbanviewrc'))
+        self.config.start()
+        self.mirror = Things3Mirror(
+            self.database, os.path.join(self.directory.name, 'mirror.db'))
+
+    def tearDown(self):
+        self.config.stop()
+        self.directory.cleanup()
+
+    def modify(self, sql, params=()):
+        """Change the source database."""
+        connection = sqlite3.connect(self.database)
+        with connection:
+            connection.execute(sql, params)
+        connection.close()
+
+    def test_sync(self):
+        """Test that only changed rows are copied again."""
+        changed, deleted = self.mirror.sync()
+        self.assertEqual(81, changed)
+        self.assertEqual(0, deleted)
+        self.assertEqual((0, 0), self.mirror.sync())
+        self.modify("""UPDATE TMTask SET title = 'Renamed',
+                       userModificationDate = 4102444800
+                       WHERE uuid = (SELECT MIN(uuid) FROM TMTask
+                                     WHERE type = 0)""")
+        self.assertEqual((1, 0), self.mirror.sync())
+        connection = self.mirror.connect()
+        self.assertEqual(1, connection.execute(
+            "SELECT COUNT(*) FROM task WHERE title = 'Renamed'").fetchone()[0])
+        connection.close()
+        self.modify("""INSERT INTO TMTombstone
+                       SELECT 'T1', 4102444800, uuid FROM TMTask
+                       WHERE title = 'Renamed' LIMIT 1""")
+        self.assertEqual((0, 1), self.mirror.sync())
+        connection = self.mirror.connect()
+        self.assertEqual(0, connection.execute(
+            "SELECT COUNT(*) FROM task WHERE title = 'Renamed'").fetchone()[0])
+        connection.close()
+
+    def test_schema(self):
+        """Test that the mirror is rebuilt if the source has new columns."""
+        self.mirror.sync()
+        self.modify("ALTER TABLE TMTask ADD COLUMN newColumn INTEGER")
+        self.assertEqual((81, 0), self.mirror.sync())
+        connection = self.mirror.connect()
+        self.assertIn("newColumn", [column[1] for column in connection.execute(
+            "PRAGMA table_info(TMTask)")])
+        connection.close()
+        self.assertEqual((0, 0), self.mirror.sync())
+
+    def test_views(self):
+        """Test that views read from the mirror match the source."""
+        source = Things3(database=self.database)
+        mirrored = Things3(database=self.database,
+                           mirror=self.mirror.mirror)
+        self.assertIsNotNone(mirrored.mirror)
+        for command, func in source.functions.items():
+            self.assertCountEqual(func(source), func(mirrored), command)
+
+    def test_reports(self):
+        """Test the analytics reports."""
+        self.mirror.sync()
+        tags = self.mirror.get_tag_usage()
+        self.assertIn('Waiting', [row[0] for row in tags])
+        self.assertIsInstance(self.mirror.get_project_throughput(), list)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Module documentation goes here."""
+
+import unittest
+from things3.things3 import Things3
+
+
+class Things3QueryCase(unittest.TestCase):
+    """Class documentation goes here."""
+
+    def setUp(self):
+        self.things3 = Things3(database='resources/demo.sqlite3')
+        self.query = self.things3.query
+
+    def test_cache(self):
+        """Test that compiled statements are reused."""
+        sql = self.query.compile("today")
+        self.assertIs(sql, self.query.compile("today"))
+        self.things3.mode_project()
+        self.assertNotEqual(sql, self.query.compile("today"))
+        self.things3.mode_task()
+        self.things3.filters = {"tag": "MIT"}
+        self.assertNotEqual(sql, self.query.compile("today"))
+
+    def test_joins(self):
+        """Test that only needed joins are emitted."""
+        sql = self.query.compile("inbox")
+        self.assertIn("PROJECT ON", sql)
+        self.assertNotIn("HEADPROJ ON", sql)
+        sql = self.query.compile("today", columns="COUNT(*)")
+        self.assertIn("HEADPROJ ON", sql)
+        self.assertIn("HEADING ON", sql)
+        self.assertNotIn("AREA ON", sql)
+        sql = self.query.compile("completed", columns="TASK.uuid")
+        self.assertNotIn("JOIN", sql)
+
+    def test_compose(self):
+        """Test combinations of views and predicates."""
+        today = {task['uuid'] for task in self.things3.get_today()}
+        mit = {task['uuid'] for task in self.things3.get_mit()}
+        tasks = self.things3.get_view("today", ("tag", "MIT"))
+        self.assertEqual(today & mit, {task['uuid'] for task in tasks})
+        self.assertEqual(tasks, self.things3.get_tag_today("MIT"))
+        self.assertEqual([], self.things3.get_view("inbox", "due", "done"))
+        with self.assertRaises(ValueError):
+            self.query.compile(("unknown", "value"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Module documentation goes here."""
+
+import unittest
+import csv
+import io
+import json
+import sqlite3
+from things3.things3 import Things3
+from things3.things3_row import Things3Row
+
+
+class Things3RowCase(unittest.TestCase):
+    """Class documentation goes here."""
+
+    def setUp(self):
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.row_factory = Things3Row.factory
+        self.rows = self.connection.execute(
+            "SELECT 'A' AS uuid, 'Task' AS title UNION ALL " +
+            "SELECT 'B', 'Other'").fetchall()
+
+    def tearDown(self):
+        self.connection.close()
+
+    def test_mapping(self):
+        """Test that rows behave like dictionaries."""
+        row = self.rows[0]
+        self.assertEqual({'uuid': 'A', 'title': 'Task'}, row)
+        self.assertEqual('Task', row['title'])
+        self.assertIn('uuid', row)
+        self.assertNotIn('Task', row)
+        self.assertEqual(['uuid', 'title'], list(row))
+        self.assertIs(row.index, self.rows[1].index)
+        self.assertFalse(hasattr(row, '__dict__'))
+
+    def test_setitem(self):
+        """Test changing and adding values."""
+        row = self.rows[0]
+        row['title'] = 'Changed'
+        row['context'] = ''
+        self.assertEqual({'uuid': 'A', 'title': 'Changed', 'context': ''},
+                         row.asdict())
+        self.assertNotIn('context', self.rows[1])
+
+    def test_shared(self):
+        """Test that added columns keep the index shared."""
+        for row in self.rows:
+            row['context'] = None
+            row['size'] = 0
+        self.assertIs(self.rows[0].index, self.rows[1].index)
+        self.assertEqual(['uuid', 'title', 'context', 'size'],
+                         list(self.rows[1]))
+        things3 = Things3(database='resources/demo.sqlite3')
+        tasks = things3.attach_checklists(things3.get_today())
+        self.assertEqual(1, len({id(task.index) for task in tasks}))
+        self.assertIn('progress', tasks[0])
+
+    def test_serialize(self):
+        """Test conversion at the serialization boundary."""
+        self.assertEqual('[{"uuid": "A", "title": "Task"}]',
+                         json.dumps(self.rows[:1], default=Things3Row.asdict))
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=['uuid', 'title'])
+        writer.writerows(self.rows)
+        self.assertEqual('A,Task\r\nB,Other\r\n', output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,13 +14,25 @@ __maintainer__ = "Alexander Willner"
 __email__ = "alex@willner.ws"
 __status__ = "Development"
 
+import logging
 import sqlite3
-import sys
-from random import shuffle
-from os import environ, path
+import threading
+import time
+from random import shuffle, uniform
+from os import environ, path, stat
 import getpass
 import configparser
+from contextlib import contextmanager
 from pathlib import Path
+from things3.things3_metrics import Things3Metrics
+from things3.things3_mirror import Things3Mirror
+from things3.things3_query import Things3Query
+from things3.things3_row import Things3Row
+from things3.things3_tags import Things3Tags
+
+
+class Things3Error(Exception):
+    """The Things 3 database could not be queried."""
 
 
 # pylint: disable=R0904,R0902
@@ -36,6 +48,7 @@ class Things3():
     TABLE_AREA = "TMArea"
     TABLE_TAG = "TMTag"
     TABLE_TASKTAG = "TMTaskTag"
+    TABLE_CHECKLIST = "TMChecklistItem"
     DATE_CREATE = "creationDate"
     DATE_MOD = "userModificationDate"
     DATE_DUE = "dueDate"
@@ -61,12 +74,13 @@ class Things3():
     RECURRING_HAS_NEXT_STARTDATE = "nextInstanceStartDate IS NOT NULL"
     MODE_TASK = "type = 0"
     MODE_PROJECT = "type = 1"
+    DISTRIBUTION = ["backlog", "upcoming", "inbox", "today", "next"]
+    FILTERS = ["area", "project", "tag", "start", "end"]
 
     # Variables
     debug = False
     user = getpass.getuser()
     database = f"/Users/{user}/{FILE_DB}"
-    filter = ""
     tag_waiting = "Waiting"
     tag_mit = "MIT"
     tag_cleanup = "Cleanup"
@@ -76,6 +90,14 @@ class Things3():
     tag_d = "D"
     stat_days = 365
     anonymize = False
+    slow_query = None
+    busy_timeout = 5000
+    busy_retries = 3
+    busy_backoff = 0.05
+    persistent = False
+    save_config = True
+    mirror = None
+    logger = logging.getLogger(__name__)
     config = configparser.ConfigParser()
     config.read(FILE_CONFIG)
 
@@ -90,7 +112,17 @@ class Things3():
                  tag_c=None,
                  tag_d=None,
                  stat_days=None,
-                 anonymize=None):
+                 anonymize=None,
+                 slow_query=None,
+                 mirror=None,
+                 busy_timeout=None,
+                 busy_retries=None):
+
+        self.metrics = Things3Metrics()
+        self.local = threading.local()
+        self.filters = {}
+        self.query = Things3Query(self)
+        self.tags = Things3Tags(self)
 
         cfg = self.get_from_config(tag_waiting, 'TAG_WAITING')
         self.tag_waiting = cfg if cfg else self.tag_waiting
@@ -128,6 +160,18 @@ class Things3():
         self.stat_days = cfg if cfg else self.stat_days
         self.set_config('STAT_DAYS', self.stat_days)
 
+        cfg = self.get_from_config(slow_query, 'SLOW_QUERY_MS')
+        self.slow_query = float(cfg) if cfg else self.slow_query
+        self.set_config('SLOW_QUERY_MS', self.slow_query)
+
+        cfg = self.get_from_config(busy_timeout, 'BUSY_TIMEOUT_MS')
+        self.busy_timeout = int(cfg) if cfg else self.busy_timeout
+        self.set_config('BUSY_TIMEOUT_MS', self.busy_timeout)
+
+        cfg = self.get_from_config(busy_retries, 'BUSY_RETRIES')
+        self.busy_retries = int(cfg) if cfg else self.busy_retries
+        self.set_config('BUSY_RETRIES', self.busy_retries)
+
         cfg = self.get_from_config(database, 'THINGSDB')
         self.database = cfg if cfg else self.database
         # Automated migration to new database location in Things 3.12.6/3.13.1
@@ -141,15 +185,35 @@ class Things3():
         # --------------------------------
         self.set_config('THINGSDB', self.database)
 
+        cfg = self.get_from_config(mirror, 'MIRROR_DB')
+        self.mirror = Things3Mirror(self.database, cfg) if cfg else None
+
     def set_config(self, key, value, domain='DATABASE'):
         """Write variable to config."""
         if domain not in self.config:
             self.config.add_section(domain)
         if value is not None and key is not None:
+            if self.config.get(domain, str(key), fallback=None) == str(value):
+                return
             self.config.set(domain, str(key), str(value))
+            if not self.save_config:
+                return
             with open(self.FILE_CONFIG, "w+") as configfile:
                 self.config.write(configfile)
 
+    @classmethod
+    @contextmanager
+    def keep_config(cls):
+        """Neither save nor keep config changes made within the block."""
+        config, save_config = cls.config, cls.save_config
+        cls.config = configparser.ConfigParser()
+        cls.config.read_dict(config)
+        cls.save_config = False
+        try:
+            yield
+        finally:
+            cls.config, cls.save_config = config, save_config
+
     def get_config(self, key, domain='DATABASE'):
         """Get variable from config."""
         result = None
@@ -168,6 +232,60 @@ class Things3():
             result = path.expanduser(self.config[domain][key])
         return result
 
+    def get_fingerprint(self):
+        """Identify the database state via size and mtime of its files."""
+        fingerprint = []
+        for suffix in ('', '-wal'):
+            try:
+                info = stat(self.database + suffix)
+                fingerprint.append(f"{info.st_mtime_ns}:{info.st_size}")
+            except OSError:
+                fingerprint.append("-")
+        return '/'.join(fingerprint)
+
+    @staticmethod
+    def quote(value):
+        """Quote a value as SQL string literal."""
+        return "'" + str(value).replace("'", "''") + "'"
+
+    def get_filter(self, task="TASK"):
+        """Conditions of the active filter on a task table, joined by AND."""
+        conditions = []
+        area = self.filters.get("area")
+        project = self.filters.get("project")
+        tag = self.filters.get("tag")
+        start = self.filters.get("start")
+        end = self.filters.get("end")
+        if area:
+            conditions.append(f"""
+                COALESCE({task}.area, (
+                    SELECT PARENT.area FROM {self.TABLE_TASK} AS PARENT
+                    WHERE PARENT.uuid = COALESCE({task}.project, (
+                        SELECT HEAD.project FROM {self.TABLE_TASK} AS HEAD
+                        WHERE HEAD.uuid = {task}.actionGroup))
+                )) = {self.quote(area)}""")
+        if project:
+            conditions.append(f"""
+                ({task}.uuid = {self.quote(project)} OR
+                 {task}.project = {self.quote(project)} OR
+                 {task}.actionGroup IN (
+                    SELECT HEAD.uuid FROM {self.TABLE_TASK} AS HEAD
+                    WHERE HEAD.project = {self.quote(project)}))""")
+        if tag:
+            conditions.append(f"""
+                {task}.uuid IN (
+                    SELECT TASKTAG.tasks FROM {self.TABLE_TASKTAG} AS TASKTAG
+                    WHERE TASKTAG.tags IN ({self.tags.get_uuids(tag)}))""")
+        if start:
+            conditions.append(f"""
+                {task}.{self.DATE_CREATE} >=
+                    strftime('%s', {self.quote(start)})""")
+        if end:
+            conditions.append(f"""
+                {task}.{self.DATE_CREATE} <
+                    strftime('%s', {self.quote(end)}, '+1 day')""")
+        return ''.join(condition + " AND" for condition in conditions)
+
     @staticmethod
     def anonymize_string(string):
         """Scramble text."""
@@ -178,18 +296,12 @@ class Things3():
         string = ''.join(string)
         return string
 
-    @staticmethod
-    def dict_factory(cursor, row):
-        """Convert SQL result into a dictionary"""
-        dictionary = {}
-        for idx, col in enumerate(cursor.description):
-            dictionary[col[0]] = row[idx]
-        return dictionary
-
     def anonymize_tasks(self, tasks):
         """Scramble output for screenshots."""
         if self.anonymize:
             for task in tasks:
+                if 'title' not in task:
+                    continue
                 task['title'] = self.anonymize_string(task['title'])
                 task['context'] = self.anonymize_string(
                     task['context']) if 'context' in task else ''
@@ -197,114 +309,63 @@ class Things3():
 
     def get_inbox(self):
         """Get all tasks from the inbox."""
-        query = f"""
-                TASK.{self.IS_NOT_TRASHED} AND
-                TASK.{self.IS_TASK} AND
-                TASK.{self.IS_OPEN} AND
-                TASK.{self.IS_INBOX}
-                ORDER BY TASK.duedate DESC , TASK.todayIndex
-                """
-        return self.get_rows(query)
+        return self.get_view("inbox")
 
     def get_today(self):
         """Get all tasks from the todays list."""
-        query = f"""
-                TASK.{self.IS_NOT_TRASHED} AND
-                TASK.{self.IS_TASK} AND
-                TASK.{self.IS_OPEN} AND
-                (TASK.{self.IS_ANYTIME} OR (
-                     TASK.{self.IS_SOMEDAY} AND
-                     TASK.{self.DATE_START} <= strftime('%s', 'now')
-                     )
-                ) AND
-                TASK.{self.IS_SCHEDULED} AND (
-                    (
-                        PROJECT.title IS NULL OR (
-                            PROJECT.{self.IS_NOT_TRASHED}
-                        )
-                    ) AND (
-                        HEADPROJ.title IS NULL OR (
-                            HEADPROJ.{self.IS_NOT_TRASHED}
-                        )
-                    )
-                )
-                ORDER BY TASK.duedate DESC , TASK.todayIndex
-                """
-        return self.get_rows(query)
+        return self.get_view("today")
 
     def get_task(self, area=None, project=None):
         """Get tasks."""
-        afilter = f'AND TASK.area = "{area}"' \
-            if area is not None else ''
-        pfilter = f'AND TASK.project = "{project}"' \
-            if project is not None else ''
-        query = f"""
-                TASK.{self.IS_NOT_TRASHED} AND
-                TASK.{self.IS_TASK} AND
-                TASK.{self.IS_OPEN} AND
-                TASK.{self.IS_ANYTIME} AND
-                TASK.{self.IS_NOT_RECURRING} AND (
-                    (
-                        PROJECT.title IS NULL OR (
-                            PROJECT.{self.IS_NOT_TRASHED}
-                        )
-                    ) AND (
-                        HEADPROJ.title IS NULL OR (
-                            HEADPROJ.{self.IS_NOT_TRASHED}
-                        )
-                    )
-                )
-                {afilter}
-                {pfilter}
-                ORDER BY TASK.duedate DESC, TASK.{self.DATE_CREATE} DESC
-                """
-        return self.get_rows(query)
+        parts = ["tasks"]
+        if area is not None:
+            parts.append(("area", area))
+        if project is not None:
+            parts.append(("project", project))
+        return self.get_view(*parts)
+
+    def get_subtasks(self):
+        """Get open tasks with their checklist items."""
+        return self.attach_checklists(self.get_view("subtasks"))
+
+    def get_checklists(self, uuids):
+        """Get the checklist items of many tasks in one query."""
+        checklists = {}
+        if not uuids:
+            return checklists
+        items = self.execute_query(f"""
+            SELECT
+                task,
+                uuid,
+                title,
+                status,
+                date(stopDate,"unixepoch") as stopped
+            FROM {self.TABLE_CHECKLIST}
+            WHERE task IN ({', '.join(self.quote(uuid) for uuid in uuids)})
+            ORDER BY task, "index"
+            """)
+        for item in items:
+            checklists.setdefault(item['task'], []).append(item)
+        return checklists
+
+    def attach_checklists(self, tasks):
+        """Add checklist items and their progress, e.g. 3/7, to tasks."""
+        checklists = self.get_checklists(
+            [task['uuid'] for task in tasks if 'uuid' in task])
+        for task in tasks:
+            items = checklists.get(task.get('uuid'), [])
+            done = sum(1 for item in items if item['status'] != 0)
+            task['checklist'] = items
+            task['progress'] = f"{done}/{len(items)}" if items else None
+        return tasks
 
     def get_someday(self):
         """Get someday tasks."""
-        query = f"""
-                TASK.{self.IS_NOT_TRASHED} AND
-                TASK.{self.IS_TASK} AND
-                TASK.{self.IS_OPEN} AND
-                TASK.{self.IS_SOMEDAY} AND
-                TASK.{self.IS_NOT_SCHEDULED} AND
-                TASK.{self.IS_NOT_RECURRING} AND (
-                    (
-                        PROJECT.title IS NULL OR (
-                            PROJECT.{self.IS_NOT_TRASHED}
-                        )
-                    ) AND (
-                        HEADPROJ.title IS NULL OR (
-                            HEADPROJ.{self.IS_NOT_TRASHED}
-                        )
-                    )
-                )
-                ORDER BY TASK.duedate DESC, TASK.{self.DATE_CREATE} DESC
-                """
-        return self.get_rows(query)
+        return self.get_view("backlog")
 
     def get_upcoming(self):
         """Get upcoming tasks."""
-        query = f"""
-                TASK.{self.IS_NOT_TRASHED} AND
-                TASK.{self.IS_TASK} AND
-                TASK.{self.IS_OPEN} AND
-                TASK.{self.IS_SOMEDAY} AND
-                TASK.{self.IS_SCHEDULED} AND
-                TASK.{self.IS_NOT_RECURRING} AND (
-                    (
-                        PROJECT.title IS NULL OR (
-                            PROJECT.{self.IS_NOT_TRASHED}
-                        )
-                    ) AND (
-                        HEADPROJ.title IS NULL OR (
-                            HEADPROJ.{self.IS_NOT_TRASHED}
-                        )
-                    )
-                )
-                ORDER BY TASK.startdate, TASK.todayIndex
-                """
-        return self.get_rows(query)
+        return self.get_view("upcoming")
 
     def get_waiting(self):
         """Get waiting tasks."""
@@ -316,131 +377,27 @@ class Things3():
 
     def get_tag(self, tag):
         """Get task with specific tag"""
-        query = f"""
-                TASK.{self.IS_NOT_TRASHED} AND
-                TASK.{self.IS_TASK} AND
-                TASK.{self.IS_OPEN} AND
-                TASK.{self.IS_NOT_RECURRING} AND
-                TAGS.tags=(SELECT uuid FROM {self.TABLE_TAG}
-                             WHERE title='{tag}'
-                          )
-                AND (
-                    (
-                        PROJECT.title IS NULL OR (
-                            PROJECT.{self.IS_NOT_TRASHED}
-                        )
-                    ) AND (
-                        HEADPROJ.title IS NULL OR (
-                            HEADPROJ.{self.IS_NOT_TRASHED}
-                        )
-                    )
-                )
-                ORDER BY TASK.duedate DESC , TASK.todayIndex
-                """
-        return self.get_rows(query)
+        return self.get_view("tagged", ("tag", tag))
 
     def get_tag_today(self, tag):
         """Get today tasks with specific tag"""
-        query = f"""
-                TASK.{self.IS_NOT_TRASHED} AND
-                TASK.{self.IS_TASK} AND
-                TASK.{self.IS_OPEN} AND
-                (TASK.{self.IS_ANYTIME} OR (
-                     TASK.{self.IS_SOMEDAY} AND
-                     TASK.{self.DATE_START} <= strftime('%s', 'now')
-                     )
-                ) AND
-                TAGS.tags=(SELECT uuid FROM {self.TABLE_TAG}
-                             WHERE title='{tag}') AND
-                TASK.{self.IS_SCHEDULED} AND (
-                    (
-                        PROJECT.title IS NULL OR (
-                            PROJECT.{self.IS_NOT_TRASHED}
-                        )
-                    ) AND (
-                        HEADPROJ.title IS NULL OR (
-                            HEADPROJ.{self.IS_NOT_TRASHED}
-                        )
-                    )
-                )
-                ORDER BY TASK.duedate DESC , TASK.todayIndex
-            """
-        return self.get_rows(query)
+        return self.get_view("today", ("tag", tag))
 
     def get_anytime(self):
         """Get anytime tasks."""
-        query = f"""
-                TASK.{self.IS_NOT_TRASHED} AND
-                TASK.{self.IS_TASK} AND
-                TASK.{self.IS_OPEN} AND
-                TASK.{self.IS_ANYTIME} AND
-                TASK.{self.IS_NOT_SCHEDULED} AND (
-                    (
-                        PROJECT.title IS NULL OR (
-                            PROJECT.{self.IS_ANYTIME} AND
-                            PROJECT.{self.IS_NOT_SCHEDULED} AND
-                            PROJECT.{self.IS_NOT_TRASHED}
-                        )
-                    ) AND (
-                        HEADPROJ.title IS NULL OR (
-                            HEADPROJ.{self.IS_ANYTIME} AND
-                            HEADPROJ.{self.IS_NOT_SCHEDULED} AND
-                            HEADPROJ.{self.IS_NOT_TRASHED}
-                        )
-                    )
-                )
-                ORDER BY TASK.duedate DESC , TASK.todayIndex
-                """
-        if self.filter:
-            # ugly hack for Kanban task view on project
-            query = f"""
-                TASK.{self.IS_NOT_TRASHED} AND
-                TASK.{self.IS_TASK} AND
-                TASK.{self.IS_OPEN} AND
-                TASK.{self.IS_ANYTIME} AND
-                TASK.{self.IS_NOT_SCHEDULED} AND (
-                    (
-                        PROJECT.title IS NULL OR (
-                            PROJECT.{self.IS_NOT_TRASHED}
-                        )
-                    ) AND (
-                        HEADPROJ.title IS NULL OR (
-                            HEADPROJ.{self.IS_NOT_TRASHED}
-                        )
-                    )
-                )
-                ORDER BY TASK.duedate DESC , TASK.todayIndex
-                """
-        return self.get_rows(query)
+        return self.get_view("next")
 
     def get_completed(self):
         """Get completed tasks."""
-        query = f"""
-                TASK.{self.IS_NOT_TRASHED} AND
-                TASK.{self.IS_TASK} AND
-                TASK.{self.IS_DONE}
-                ORDER BY TASK.{self.DATE_STOP}
-                """
-        return self.get_rows(query)
+        return self.get_view("completed")
 
     def get_cancelled(self):
         """Get cancelled tasks."""
-        query = f"""
-                TASK.{self.IS_NOT_TRASHED} AND
-                TASK.{self.IS_TASK} AND
-                TASK.{self.IS_CANCELLED}
-                ORDER BY TASK.{self.DATE_STOP}
-                """
-        return self.get_rows(query)
+        return self.get_view("cancelled")
 
     def get_trashed(self):
         """Get trashed tasks."""
-        query = f"""
-                TASK.{self.IS_TRASHED} AND
-                TASK.{self.IS_TASK}
-                ORDER BY TASK.{self.DATE_STOP}
-                """
-        return self.get_rows(query)
+        return self.get_view("trashed")
 
     def get_projects(self, area=None):
         """Get projects."""
@@ -460,6 +417,7 @@ class Things3():
                 FROM
                     {self.TABLE_TASK} AS TASK
                 WHERE
+                    {self.get_filter()}
                     TASK.{self.IS_NOT_TRASHED} AND
                     TASK.{self.IS_PROJECT} AND
                     TASK.{self.IS_OPEN}
@@ -477,6 +435,7 @@ class Things3():
                     (SELECT COUNT(uuid)
                         FROM TMTask AS PROJECT
                         WHERE
+                        {self.get_filter("PROJECT")}
                         PROJECT.area = AREA.uuid AND
                         PROJECT.{self.IS_NOT_TRASHED} AND
                         PROJECT.{self.IS_OPEN}
@@ -487,83 +446,54 @@ class Things3():
                 """
         return self.execute_query(query)
 
-    def get_all(self):
-        """Get all tasks."""
+    def get_tags(self):
+        """Get tags ordered by the tasks a click on them would show.
+
+        Tasks are counted if they are in the tagged view, i.e. with the
+        same conditions and filter, and use the tag or a descendant.
+        """
+        pairs = self.tags.get_closure()[1]
+        if not pairs:
+            return []
+        closure = ',\n                    '.join(
+            f"({self.quote(uuid)}, {self.quote(title)}, {self.quote(tag)})"
+            for uuid, title, tag in pairs)
         query = f"""
-                TASK.{self.IS_NOT_TRASHED} AND
-                TASK.{self.IS_TASK} AND (
-                    (
-                        PROJECT.title IS NULL OR (
-                            PROJECT.{self.IS_NOT_TRASHED}
-                        )
-                    ) AND (
-                        HEADPROJ.title IS NULL OR (
-                            HEADPROJ.{self.IS_NOT_TRASHED}
-                        )
-                    )
+                WITH CLOSURE(uuid, title, tag) AS (
+                    VALUES {closure}
+                ), ITEM AS (
+                    {self.query.compile("tagged", columns="TASK.uuid")}
                 )
+                SELECT
+                    CLOSURE.uuid,
+                    CLOSURE.title,
+                    COUNT(DISTINCT ITEM.uuid) AS size
+                FROM
+                    CLOSURE
+                LEFT OUTER JOIN
+                    {self.TABLE_TASKTAG} TAGS ON TAGS.tags = CLOSURE.tag
+                LEFT OUTER JOIN
+                    ITEM ON ITEM.uuid = TAGS.tasks
+                GROUP BY CLOSURE.uuid
+                ORDER BY size DESC, CLOSURE.title COLLATE NOCASE
                 """
-        return self.get_rows(query)
+        return self.execute_query(query)
+
+    def get_all(self):
+        """Get all tasks."""
+        return self.get_view("all")
 
     def get_due(self):
         """Get due tasks."""
-        query = f"""
-                TASK.{self.IS_NOT_TRASHED} AND
-                TASK.{self.IS_TASK} AND
-                TASK.{self.IS_OPEN} AND
-                TASK.{self.IS_DUE} AND (
-                    (
-                        PROJECT.title IS NULL OR (
-                            PROJECT.{self.IS_NOT_TRASHED}
-                        )
-                    ) AND (
-                        HEADPROJ.title IS NULL OR (
-                            HEADPROJ.{self.IS_NOT_TRASHED}
-                        )
-                    )
-                )
-                ORDER BY TASK.{self.DATE_DUE}
-                """
-        return self.get_rows(query)
+        return self.get_view("due")
 
     def get_lint(self):
         """Get tasks that float around"""
-        query = f"""
-            TASK.{self.IS_NOT_TRASHED} AND
-            TASK.{self.IS_OPEN} AND
-            TASK.{self.IS_TASK} AND
-            (TASK.{self.IS_SOMEDAY} OR TASK.{self.IS_ANYTIME}) AND
-            TASK.project IS NULL AND
-            TASK.area IS NULL AND
-            TASK.actionGroup IS NULL
-            """
-        return self.get_rows(query)
+        return self.get_view("lint")
 
     def get_empty_projects(self):
         """Get projects that are empty"""
-        query = f"""
-            TASK.{self.IS_NOT_TRASHED} AND
-            TASK.{self.IS_OPEN} AND
-            TASK.{self.IS_PROJECT} AND
-            TASK.{self.IS_ANYTIME}
-            GROUP BY TASK.uuid
-            HAVING
-                (SELECT COUNT(uuid)
-                 FROM TMTask AS PROJECT_TASK
-                 WHERE
-                   PROJECT_TASK.project = TASK.uuid AND
-                   PROJECT_TASK.{self.IS_NOT_TRASHED} AND
-                   PROJECT_TASK.{self.IS_OPEN} AND
-                   (PROJECT_TASK.{self.IS_ANYTIME} OR
-                    PROJECT_TASK.{self.IS_SCHEDULED} OR
-                      (PROJECT_TASK.{self.IS_RECURRING} AND
-                       PROJECT_TASK.{self.RECURRING_IS_NOT_PAUSED} AND
-                       PROJECT_TASK.{self.RECURRING_HAS_NEXT_STARTDATE}
-                      )
-                   )
-                ) = 0
-            """
-        return self.get_rows(query)
+        return self.get_view("empty")
 
     def get_largest_projects(self):
         """Get projects that are empty"""
@@ -583,6 +513,7 @@ class Things3():
             FROM
                 {self.TABLE_TASK} AS TASK
             WHERE
+               {self.get_filter()}
                TASK.{self.IS_NOT_TRASHED} AND
                TASK.{self.IS_OPEN} AND
                TASK.{self.IS_PROJECT}
@@ -612,7 +543,7 @@ class Things3():
                     (SELECT COUNT(uuid) AS TasksCreated,
                         date({self.DATE_CREATE},"unixepoch") AS DAY
                         FROM {self.TABLE_TASK} AS TASK
-                        WHERE DAY NOT NULL
+                        WHERE {self.get_filter()} DAY NOT NULL
                           AND TASK.{self.IS_TASK}
                         GROUP BY DAY)
                     AS CREATED ON CREATED.DAY = date
@@ -620,7 +551,7 @@ class Things3():
                     (SELECT COUNT(uuid) AS TasksCancelled,
                         date(stopDate,"unixepoch") AS DAY
                         FROM {self.TABLE_TASK} AS TASK
-                        WHERE DAY NOT NULL
+                        WHERE {self.get_filter()} DAY NOT NULL
                           AND TASK.{self.IS_CANCELLED} AND TASK.{self.IS_TASK}
                         GROUP BY DAY)
                         AS CANCELLED ON CANCELLED.DAY = date
@@ -628,7 +559,7 @@ class Things3():
                     (SELECT COUNT(uuid) AS TasksTrashed,
                         date({self.DATE_MOD},"unixepoch") AS DAY
                         FROM {self.TABLE_TASK} AS TASK
-                        WHERE DAY NOT NULL
+                        WHERE {self.get_filter()} DAY NOT NULL
                           AND TASK.{self.IS_TRASHED} AND TASK.{self.IS_TASK}
                         GROUP BY DAY)
                         AS TRASHED ON TRASHED.DAY = date
@@ -636,7 +567,7 @@ class Things3():
                     (SELECT COUNT(uuid) AS TasksClosed,
                         date(stopDate,"unixepoch") AS DAY
                         FROM {self.TABLE_TASK} AS TASK
-                        WHERE DAY NOT NULL
+                        WHERE {self.get_filter()} DAY NOT NULL
                           AND TASK.{self.IS_DONE} AND TASK.{self.IS_TASK}
                         GROUP BY DAY)
                         AS CLOSED ON CLOSED.DAY = date
@@ -646,97 +577,203 @@ class Things3():
     def get_minutes_today(self):
         """Count the planned minutes for today."""
         query = f"""
-                SELECT
-                    SUM(TAG.title) AS minutes
-                FROM
-                    {self.TABLE_TASK} AS TASK
-                LEFT OUTER JOIN
-                TMTask PROJECT ON TASK.project = PROJECT.uuid
-                LEFT OUTER JOIN
-                    TMArea AREA ON TASK.area = AREA.uuid
-                LEFT OUTER JOIN
-                    TMTask HEADING ON TASK.actionGroup = HEADING.uuid
-                LEFT OUTER JOIN
-                    TMTask HEADPROJ ON HEADING.project = HEADPROJ.uuid
-                LEFT OUTER JOIN
-                    TMTaskTag TAGS ON TASK.uuid = TAGS.tasks
-                LEFT OUTER JOIN
-                    TMTag TAG ON TAGS.tags = TAG.uuid
-                WHERE
-                    printf("%d", TAG.title) = TAG.title AND
-                    TASK.{self.IS_NOT_TRASHED} AND
-                    TASK.{self.IS_TASK} AND
-                    TASK.{self.IS_OPEN} AND
-                    TASK.{self.IS_ANYTIME} AND
-                    TASK.{self.IS_SCHEDULED} AND (
-                        (
-                            PROJECT.title IS NULL OR (
-                                PROJECT.{self.IS_NOT_TRASHED}
-                            )
-                        ) AND (
-                            HEADPROJ.title IS NULL OR (
-                                HEADPROJ.{self.IS_NOT_TRASHED}
-                            )
-                        )
-                    )
+                SELECT SUM(minutes) AS minutes
+                FROM ({self.tags.get_planned_query(1)})
                 """
         return self.execute_query(query)
 
+    def get_planned_minutes(self, days=7, group=None):
+        """Get planned minutes per day and area or project."""
+        return self.execute_query(
+            self.tags.get_planned_query(days, group))
+
     def get_cleanup(self):
         """Tasks and projects that need work."""
-        result = []
-        result.extend(self.get_lint())
-        result.extend(self.get_empty_projects())
-        result.extend(self.get_tag(self.tag_cleanup))
-        result = [i for n, i in enumerate(result) if i not in result[n + 1:]]
-        return result
+        return self.get_view(("any", (("lint",), ("empty",), (
+            "tagged", ("tag", self.tag_cleanup)))))
+
+    def export_tasks(self):
+        """Yield every item with its area, project, heading and tags."""
+        types = {0: 'task', 1: 'project', 2: 'heading'}
+        states = {0: 'open', 2: 'cancelled', 3: 'completed'}
+        starts = {0: 'inbox', 1: 'anytime', 2: 'someday'}
+        with self.snapshot():
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            cursor.row_factory = None
+            areas = dict(cursor.execute(
+                f"SELECT uuid, title FROM {self.TABLE_AREA}"))
+            tags = dict(cursor.execute(
+                f"SELECT uuid, title FROM {self.TABLE_TAG}"))
+            parents = {row[0]: row[1:] for row in cursor.execute(
+                f"""SELECT uuid, title, project, area
+                    FROM {self.TABLE_TASK}
+                    WHERE {self.IS_PROJECT} OR {self.IS_HEADING}""")}
+            tagging = connection.cursor()
+            tagging.row_factory = None
+            tagging.execute(f"""SELECT tasks, tags FROM {self.TABLE_TASKTAG}
+                                ORDER BY tasks""")
+            tag_row = tagging.fetchone()
+            cursor.execute(f"""
+                SELECT uuid, type, title, notes, status, trashed, start,
+                       {self.DATE_CREATE}, {self.DATE_MOD}, {self.DATE_START},
+                       {self.DATE_DUE}, {self.DATE_STOP},
+                       area, project, actionGroup
+                FROM {self.TABLE_TASK}
+                ORDER BY uuid""")
+            for row in cursor:
+                task_tags = []
+                while tag_row is not None and tag_row[0] <= row[0]:
+                    if tag_row[0] == row[0] and tag_row[1] in tags:
+                        task_tags.append(tags[tag_row[1]])
+                    tag_row = tagging.fetchone()
+                heading = row[14]
+                project = row[13] or parents.get(heading, (None, None))[1]
+                area = row[12] or parents.get(project, (None, None, None))[2]
+                title = self.anonymize_string(row[2]) \
+                    if self.anonymize else row[2]
+                yield {
+                    "uuid": row[0],
+                    "type": types.get(row[1]),
+                    "title": title,
+                    "notes": row[3],
+                    "status": states.get(row[4]),
+                    "trashed": bool(row[5]),
+                    "start": starts.get(row[6]),
+                    "created": row[7],
+                    "modified": row[8],
+                    "start_date": row[9],
+                    "due_date": row[10],
+                    "stop_date": row[11],
+                    "area": area,
+                    "area_title": areas.get(area),
+                    "project": project,
+                    "project_title": parents.get(project, (None,))[0],
+                    "heading": heading,
+                    "heading_title": parents.get(heading, (None,))[0],
+                    "tags": task_tags
+                }
+
+    def get_hierarchy(self):
+        """Yield areas, their tasks, projects and project tasks in order.
+
+        Each row holds the uuid and title of an area and, if any, of a
+        project and the title of a task, so that the whole hierarchy is
+        read with a single query.
+        """
+        tasks = self.query.compile("tasks", columns=f"""
+                TASK.title, TASK.area, TASK.project,
+                TASK.{self.DATE_DUE} AS due,
+                TASK.{self.DATE_CREATE} AS created""")
+        query = f"""
+            WITH ITEM AS ({tasks}),
+            PROJECT AS (
+                SELECT TASK.uuid, TASK.title, TASK.area
+                FROM {self.TABLE_TASK} AS TASK
+                WHERE
+                    {self.get_filter()}
+                    TASK.{self.IS_NOT_TRASHED} AND
+                    TASK.{self.IS_PROJECT} AND
+                    TASK.{self.IS_OPEN}
+            )
+            SELECT area, area_title, project, project_title, title FROM (
+                SELECT AREA.uuid AS area, AREA.title AS area_title,
+                       0 AS kind, NULL AS project, NULL AS project_title,
+                       NULL AS title, NULL AS due, NULL AS created
+                FROM {self.TABLE_AREA} AS AREA
+                UNION ALL
+                SELECT AREA.uuid, AREA.title, 1, NULL, NULL,
+                       ITEM.title, ITEM.due, ITEM.created
+                FROM ITEM
+                JOIN {self.TABLE_AREA} AS AREA ON ITEM.area = AREA.uuid
+                UNION ALL
+                SELECT AREA.uuid, AREA.title, 2, PROJECT.uuid, PROJECT.title,
+                       NULL, NULL, NULL
+                FROM PROJECT
+                JOIN {self.TABLE_AREA} AS AREA ON PROJECT.area = AREA.uuid
+                UNION ALL
+                SELECT AREA.uuid, AREA.title, 3, PROJECT.uuid, PROJECT.title,
+                       ITEM.title, ITEM.due, ITEM.created
+                FROM ITEM
+                JOIN PROJECT ON ITEM.project = PROJECT.uuid
+                JOIN {self.TABLE_AREA} AS AREA ON PROJECT.area = AREA.uuid
+            )
+            ORDER BY area_title COLLATE NOCASE, area, kind > 1,
+                     project_title COLLATE NOCASE, project, kind,
+                     due DESC, created DESC
+            """
+        with self.snapshot():
+            cursor = self.get_connection().cursor()
+            cursor.row_factory = None
+            for row in cursor.execute(query):
+                if self.anonymize:
+                    row = (row[0], self.anonymize_string(row[1]), row[2],
+                           self.anonymize_string(row[3]),
+                           self.anonymize_string(row[4]))
+                yield row
+
+    def get_counts(self, commands):
+        """Count the rows of several views in one statement."""
+        columns = []
+        for command in commands:
+            with self.collect_queries() as queries:
+                self.functions[command](self)
+            if not queries:
+                columns.append(f'0 AS "{command}"')
+                continue
+            source = queries[0] if len(queries) == 1 else ' UNION '.join(
+                f"SELECT uuid FROM ({sql})" for sql in queries)
+            columns.append(f'(SELECT COUNT(*) FROM ({source})) AS "{command}"')
+        with self.naming(Things3.get_counts):
+            return self.execute_query("SELECT " + ",\n".join(columns))[0]
+
+    def get_page(self, func, *args, limit, offset=0, checklist=False):
+        """Get the first rows of a view after offset plus the total."""
+        limit, offset = int(limit), max(int(offset), 0)
+        if limit < 1:
+            raise ValueError(f"Limit must be positive: {limit}")
+        with self.collect_queries() as queries:
+            func(self, *args)
+        with self.naming(func), self.snapshot():
+            if len(queries) == 1:
+                total = self.execute_query(
+                    f"SELECT COUNT(*) AS total FROM ({queries[0]})"
+                )[0]['total']
+                items = self.execute_query(
+                    f"SELECT * FROM ({queries[0]}) " +
+                    f"LIMIT {limit} OFFSET {offset}")
+            else:
+                items = func(self, *args)
+                total = len(items)
+                items = items[offset:offset + limit]
+            if checklist:
+                self.attach_checklists(items)
+        return {"items": items, "total": total,
+                "next": offset + limit if offset + limit < total else None}
+
+    def get_count(self, command):
+        """Count the rows of a view without fetching them."""
+        return self.get_counts([command])[command]
+
+    def get_distribution(self):
+        """Count the tasks in the main lists."""
+        return self.get_counts(self.DISTRIBUTION)
 
     @staticmethod
     def get_not_implemented():
         """Not implemented warning."""
         return [{"title": "not implemented"}]
 
+    def get_view(self, *parts, order=None, columns=None):
+        """Get tasks matching all given views and predicates."""
+        return self.execute_query(
+            self.query.compile(*parts, order=order, columns=columns))
+
     def get_rows(self, sql):
         """Query Things database."""
 
         sql = f"""
-            SELECT DISTINCT
-                TASK.uuid,
-                TASK.title,
-                CASE
-                    WHEN AREA.title IS NOT NULL THEN AREA.title
-                    WHEN PROJECT.title IS NOT NULL THEN PROJECT.title
-                    WHEN HEADING.title IS NOT NULL THEN HEADING.title
-                END AS context,
-                CASE
-                    WHEN AREA.uuid IS NOT NULL THEN AREA.uuid
-                    WHEN PROJECT.uuid IS NOT NULL THEN PROJECT.uuid
-                END AS context_uuid,
-                CASE
-                    WHEN TASK.recurrenceRule IS NULL
-                    THEN strftime('%d.%m.', TASK.dueDate,"unixepoch") ||
-                         substr(strftime('%Y', TASK.dueDate,"unixepoch"),3, 2)
-                ELSE NULL
-                END AS due,
-                date(TASK.{self.DATE_CREATE},"unixepoch") as created,
-                date(TASK.{self.DATE_MOD},"unixepoch") as modified,
-                strftime('%d.%m.', TASK.startDate,"unixepoch") ||
-                  substr(strftime('%Y', TASK.startDate,"unixepoch"),3, 2)
-                  as started,
-                date(TASK.stopDate,"unixepoch") as stopped,
-                (SELECT COUNT(uuid)
-                 FROM TMTask AS PROJECT_TASK
-                 WHERE
-                   PROJECT_TASK.project = TASK.uuid AND
-                   PROJECT_TASK.{self.IS_NOT_TRASHED} AND
-                   PROJECT_TASK.{self.IS_OPEN}
-                ) AS size,
-                CASE
-                    WHEN TASK.{self.IS_TASK} THEN 'task'
-                    WHEN TASK.{self.IS_PROJECT} THEN 'project'
-                    WHEN TASK.{self.IS_HEADING} THEN 'heading'
-                END AS type,
-                TASK.notes
+            SELECT DISTINCT {self.query.get_columns()}
             FROM
                 {self.TABLE_TASK} AS TASK
             LEFT OUTER JOIN
@@ -752,33 +789,214 @@ class Things3():
             LEFT OUTER JOIN
                 {self.TABLE_TAG} TAG ON TAGS.tags = TAG.uuid
             WHERE
-                {self.filter}
+                {self.get_filter()}
                 {sql}
                 """
 
         return self.execute_query(sql)
 
+    def connect(self):
+        """Open a read-only connection to the database or its mirror."""
+        if self.mirror is not None:
+            self.mirror.sync_if_changed(self.get_fingerprint())
+            connection = self.mirror.connect()
+        else:
+            connection = sqlite3.connect(
+                'file:' + self.database + '?mode=ro', uri=True)
+        connection.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout)}')
+        connection.row_factory = Things3Row.factory
+        return connection
+
+    @staticmethod
+    def is_busy(error):
+        """Whether a query failed only because a writer held a lock."""
+        message = str(error)
+        return 'locked' in message or 'busy' in message
+
+    def get_error(self, error):
+        """Exception to raise for a failed query."""
+        return Things3Error(
+            f"Could not query the database at: {self.database}. " +
+            f"Details: {error}.")
+
+    @contextmanager
+    def snapshot(self):
+        """Run all queries of this thread within one read transaction."""
+        connection = self.get_connection()
+        if connection is not None and connection.in_transaction:
+            yield self
+            return
+        if connection is None:
+            try:
+                connection = self.local.connection = self.connect()
+            except sqlite3.OperationalError as error:
+                raise self.get_error(error) from error
+        try:
+            connection.execute('BEGIN')
+            yield self
+        finally:
+            if self.persistent:
+                connection.execute('COMMIT')
+            else:
+                connection.close()
+                self.local.connection = None
+
+    @property
+    def filters(self):
+        """Filters of the current thread if set, else the shared ones."""
+        filters = getattr(self.local, 'filters', None)
+        return self.shared_filters if filters is None else filters
+
+    @filters.setter
+    def filters(self, filters):
+        self.shared_filters = filters
+
+    @contextmanager
+    def filtered(self, filters):
+        """Apply other filters to the queries of this thread only."""
+        previous = getattr(self.local, 'filters', None)
+        self.local.filters = filters
+        try:
+            yield self
+        finally:
+            self.local.filters = previous
+
+    @contextmanager
+    def collect_queries(self):
+        """Collect the SQL of the views called inside instead of running it."""
+        queries = self.local.queries = []
+        try:
+            yield queries
+        finally:
+            self.local.queries = None
+
+    @classmethod
+    def get_view_name(cls, func):
+        """Name of a view function, e.g. next for get_anytime."""
+        func = getattr(func, '__func__', func)
+        name = cls.views.get(func, func.__name__)
+        return name[4:] if name.startswith('get_') else name
+
+    @contextmanager
+    def naming(self, func):
+        """Record the queries of this thread under the name of a view.
+
+        The outermost name wins, so that the counts and checklists of a
+        page of a view are recorded under the view.
+        """
+        previous = getattr(self.local, 'name', None)
+        self.local.name = previous or self.get_view_name(func)
+        try:
+            yield self
+        finally:
+            self.local.name = previous
+
+    def call(self, func, *args):
+        """Call a view, recording its queries under its name."""
+        with self.naming(func):
+            return func(self, *args)
+
+    @contextmanager
+    def trace_queries(self, explain=False):
+        """Record the queries of this thread, with their plans if wanted."""
+        trace = self.local.trace = []
+        self.local.explain = explain
+        try:
+            yield trace
+        finally:
+            self.local.trace = None
+            self.local.explain = False
+
+    def get_connection(self):
+        """Connection of the current snapshot or thread, if any."""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None and self.persistent:
+            connection = self.local.connection = self.connect()
+        return connection
+
     def execute_query(self, sql):
         """Run the actual query"""
         if self.debug is True:
             print(self.database)
             print(sql)
-        try:
-            connection = sqlite3.connect(
-                'file:' + self.database + '?mode=ro', uri=True)
-            connection.row_factory = Things3.dict_factory
-            cursor = connection.cursor()
-            cursor.execute(sql)
-            tasks = cursor.fetchall()
-            tasks = self.anonymize_tasks(tasks)
-            if self.debug:
-                for task in tasks:
-                    print(task)
-            return tasks
-        except sqlite3.OperationalError as error:
-            print(f"Could not query the database at: {self.database}.")
-            print(f"Details: {error}.")
-            sys.exit(2)
+        queries = getattr(self.local, 'queries', None)
+        if queries is not None:
+            queries.append(sql)
+            return []
+        tasks = self.fetch_all(sql)
+        tasks = self.anonymize_tasks(tasks)
+        if self.debug:
+            for task in tasks:
+                print(task)
+        return tasks
+
+    def fetch_all(self, sql, raw=False):
+        """Fetch all rows, retrying while the database is locked.
+
+        Raw rows are plain tuples and not recorded in the metrics.
+        """
+        shared = self.get_connection()
+        attempt = 0
+        while True:
+            connection = None
+            try:
+                connection = shared or self.connect()
+                cursor = connection.cursor()
+                if raw:
+                    cursor.row_factory = None
+                start = time.perf_counter()
+                cursor.execute(sql)
+                tasks = cursor.fetchall()
+                if not raw:
+                    self.record_query(connection, sql, len(tasks),
+                                      time.perf_counter() - start)
+                break
+            except sqlite3.OperationalError as error:
+                if attempt >= self.busy_retries or not self.is_busy(error):
+                    raise self.get_error(error) from error
+                attempt += 1
+                self.metrics.increment("things3_query_retries_total",
+                                       {"query": self.get_query_name()})
+                # jitter keeps concurrent readers from retrying in lockstep
+                time.sleep(self.busy_backoff * 2 ** attempt * uniform(0.5, 1))
+            finally:
+                if connection is not None and connection is not shared:
+                    connection.close()
+        return tasks
+
+    def get_query_name(self):
+        """Name of the view that issued the current query."""
+        return getattr(self.local, 'name', None) or 'query'
+
+    @staticmethod
+    def get_query_plan(connection, sql):
+        """Get the steps of the EXPLAIN QUERY PLAN output."""
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return [step['detail'] for step in cursor.fetchall()]
+
+    def record_query(self, connection, sql, rows, duration):
+        """Collect metrics and, on demand, the plan of a query."""
+        name = self.get_query_name()
+        self.metrics.observe("things3_query_duration_seconds",
+                             {"query": name}, duration)
+        self.metrics.increment("things3_query_rows_total",
+                               {"query": name}, rows)
+        slow = self.slow_query is not None and \
+            duration * 1000 >= self.slow_query
+        trace = getattr(self.local, 'trace', None)
+        if trace is not None or slow:
+            record = {"query": name, "duration": duration,
+                      "rows": rows, "sql": sql}
+            if getattr(self.local, 'explain', False) or slow:
+                record["plan"] = self.get_query_plan(connection, sql)
+            if trace is not None:
+                trace.append(record)
+            if slow:
+                self.logger.warning(
+                    "Slow query %s: %.1f ms, %d rows\n%s\nPlan:\n  %s",
+                    name, duration * 1000, rows, sql.strip(),
+                    '\n  '.join(record["plan"]))
 
     # pylint: disable=C0103
     def mode_project(self):
@@ -803,12 +1021,16 @@ class Things3():
         "trashed": get_trashed,
         "projects": get_projects,
         "areas": get_areas,
+        "tags": get_tags,
         "all": get_all,
         "due": get_due,
         "lint": get_lint,
         "empty": get_empty_projects,
         "cleanup": get_cleanup,
+        "subtasks": get_subtasks,
         "top-proj": get_largest_projects,
         "stats-day": get_daystats,
-        "stats-min-today": get_minutes_today
+        "stats-min-today": get_minutes_today,
+        "stats-min": get_planned_minutes
     }
+    views = {func: command for command, func in functions.items()}
@@ -15,14 +15,26 @@ __email__ = "alex@willner.ws"
 __status__ = "Development"
 
 import sys
-from os import getcwd
+from os import getcwd, path
+import cProfile
+import io
 import json
+import pstats
 import socket
+import tempfile
+import time
+from datetime import date
 from flask import Flask
+from flask import abort
 from flask import Response
 from flask import request
+from flask import g
 from werkzeug.serving import make_server
-from things3.things3 import Things3
+from things3.things3 import Things3, Things3Error
+from things3.things3_export import Things3Export
+from things3.things3_html import Things3HTML
+from things3.things3_ical import Things3ICal
+from things3.things3_row import Things3Row
 
 
 class Things3API():
@@ -33,6 +45,8 @@ class Things3API():
     test_mode = "task"
     host = 'localhost'
     port = 15000
+    profile = False
+    profile_dir = tempfile.gettempdir()
 
     def on_get(self, url=DEFAULT):
         """Handles other GET requests"""
@@ -62,6 +76,13 @@ class Things3API():
                         content_type=content_type,
                         status=status)
 
+    def on_error(self, error):
+        """Answer with 503 while the database can not be read."""
+        self.things3.mode_task()
+        data = json.dumps({"error": str(error)})
+        return Response(response=data, content_type='application/json',
+                        status=503, headers={"Retry-After": "1"})
+
     def mode_selector(self):
         """Switch between project and task mode"""
         try:
@@ -83,15 +104,48 @@ class Things3API():
             self.things3.set_config(key, value)
         return Response()
 
+    @staticmethod
+    def get_limit():
+        """Page size and cursor requested, if any."""
+        try:
+            limit = request.args.get('limit', type=int)
+            cursor = request.args.get('cursor', 0, type=int)
+        except RuntimeError:
+            return None, 0
+        if limit is not None and limit < 1:
+            abort(400, "limit must be positive")
+        return limit, cursor
+
+    @staticmethod
+    def get_checklist():
+        """Whether checklist items were requested."""
+        try:
+            return request.args.get('checklist', 0, type=int) == 1
+        except RuntimeError:
+            return False
+
+    def get_data(self, func, *args):
+        """Call a view, one page of it if a limit was requested."""
+        limit, cursor = self.get_limit()
+        checklist = self.get_checklist() and func is not Things3.get_subtasks
+        if limit is None:
+            data = self.things3.call(func, *args)
+            return self.things3.attach_checklists(data) if checklist else data
+        return self.things3.get_page(
+            func, *args, limit=limit, offset=cursor,
+            checklist=checklist or func is Things3.get_subtasks)
+
     def tag(self, tag, area=None):
         """Get specific tag."""
         self.mode_selector()
         if area is not None:
-            data = self.things3.get_tag_today(tag)
+            data = self.get_data(Things3.get_tag_today, tag)
         else:
-            data = self.things3.get_tag(tag)
+            data = self.get_data(Things3.get_tag, tag)
         self.things3.mode_task()
-        data = json.dumps(data)
+        data = json.dumps(data, default=Things3Row.asdict)
+        self.things3.metrics.increment(
+            "things3_query_bytes_total", {"query": "tag"}, len(data))
         return Response(response=data, content_type='application/json')
 
     def api(self, command):
@@ -99,9 +153,11 @@ class Things3API():
         if command in self.things3.functions:
             func = self.things3.functions[command]
             self.mode_selector()
-            data = func(self.things3)
+            data = self.get_data(func)
             self.things3.mode_task()
-            data = json.dumps(data)
+            data = json.dumps(data, default=Things3Row.asdict)
+            self.things3.metrics.increment(
+                "things3_query_bytes_total", {"query": command}, len(data))
             return Response(response=data, content_type='application/json')
 
         data = json.dumps(self.things3.get_not_implemented())
@@ -109,27 +165,310 @@ class Things3API():
                         content_type='application/json',
                         status=404)
 
+    def api_html(self, command):
+        """Return the escaped cards of a column, one page if requested."""
+        if command not in self.things3.functions:
+            return self.api(command)
+        return self.html_column(self.things3.functions[command])
+
+    def api_html_tag(self, tag):
+        """Return the escaped cards of a tag column."""
+        return self.html_column(Things3.get_tag, tag)
+
+    def get_column(self, column):
+        """View and arguments of a column such as "today" or "tag/MIT"."""
+        if column.startswith('tag/'):
+            return Things3.get_tag, (column[len('tag/'):],)
+        if column in self.things3.functions:
+            return self.things3.functions[column], ()
+        return None, ()
+
+    @staticmethod
+    def get_known(data):
+        """Known hash per column of a request, or None if it is invalid."""
+        if not isinstance(data, dict):
+            return None
+        columns = data.get('columns') or dict.fromkeys(
+            request.args.getlist('column'))
+        if isinstance(columns, list):
+            columns = dict.fromkeys(columns)
+        if not isinstance(columns, dict):
+            return None
+        for column, known in columns.items():
+            if not isinstance(column, str) or \
+                    not isinstance(known, (str, type(None))):
+                return None
+        return columns
+
+    def api_hashes(self):
+        """Return the content hash of columns and deltas to known hashes."""
+        columns = self.get_known(
+            request.get_json(force=True, silent=True) or {})
+        if columns is None:
+            abort(400, "columns must map names to known hashes")
+        result = {}
+        self.mode_selector()
+        try:
+            with self.things3.snapshot():
+                for column, known in columns.items():
+                    func, args = self.get_column(column)
+                    if func is None:
+                        result[column] = self.things3.get_not_implemented()
+                        continue
+                    result[column] = self.html.get_delta(
+                        self.things3, func, *args, known=known)
+        finally:
+            self.things3.mode_task()
+        data = json.dumps(result)
+        self.things3.metrics.increment(
+            "things3_query_bytes_total", {"query": "hashes"}, len(data))
+        return Response(response=data, content_type='application/json')
+
+    def html_column(self, func, *args):
+        """Render a column as JSON with the cards as HTML fragment."""
+        limit, cursor = self.get_limit()
+        self.mode_selector()
+        try:
+            data = json.dumps(self.html.get_column(
+                self.things3, func, *args, limit=limit, cursor=cursor))
+        finally:
+            self.things3.mode_task()
+        self.things3.metrics.increment(
+            "things3_query_bytes_total", {"query": "html"}, len(data))
+        return Response(response=data, content_type='application/json')
+
+    def api_query(self):
+        """Return tasks matching a combination of views and predicates."""
+        parts = [view for view in request.args.getlist('view')
+                 if view in self.things3.query.VIEWS]
+        for name in ("tag", "area", "project"):
+            parts.extend((name, value)
+                         for value in request.args.getlist(name))
+        self.mode_selector()
+        try:
+            data = json.dumps(self.get_data(Things3.get_view, *parts),
+                              default=Things3Row.asdict)
+        finally:
+            self.things3.mode_task()
+        return Response(response=data, content_type='application/json')
+
+    def api_count(self, command):
+        """Return the number of rows of a view."""
+        if command not in self.things3.functions:
+            return self.api(command)
+        self.mode_selector()
+        try:
+            data = json.dumps(self.things3.get_count(command))
+        finally:
+            self.things3.mode_task()
+        return Response(response=data, content_type='application/json')
+
+    def api_distribution(self):
+        """Return the number of tasks in the main lists."""
+        self.mode_selector()
+        try:
+            data = json.dumps(self.things3.get_distribution(),
+                              default=Things3Row.asdict)
+        finally:
+            self.things3.mode_task()
+        return Response(response=data, content_type='application/json')
+
+    def api_minutes(self):
+        """Return the planned minutes per day over the next days."""
+        try:
+            data = self.things3.get_planned_minutes(
+                request.args.get('days', 7, type=int),
+                request.args.get('group'))
+        except ValueError as error:
+            return Response(response=str(error), status=400)
+        data = json.dumps(data, default=Things3Row.asdict)
+        return Response(response=data, content_type='application/json')
+
+    @staticmethod
+    def get_batch(data):
+        """Commands, tags and filter of a batch, or None if it is invalid."""
+        if not isinstance(data, dict):
+            return None
+        commands = data.get('commands', request.args.getlist('command'))
+        tags = data.get('tags', request.args.getlist('tag'))
+        modifiers = data.get('filter', {})
+        if not isinstance(modifiers, dict):
+            return None
+        for names in (commands, tags, list(modifiers.values())):
+            if not isinstance(names, list) or \
+                    not all(isinstance(name, str) for name in names):
+                return None
+        return commands, tags, modifiers
+
+    def api_batch(self):
+        """Return several views and tags in one read transaction."""
+        data = request.get_json(force=True, silent=True) or {}
+        batch = self.get_batch(data)
+        if batch is None:
+            abort(400, "commands and tags must be lists of names " +
+                  "and filter must map modifiers to names")
+        commands, tags, modifiers = batch
+        result = {"commands": {}, "tags": {}}
+        filters = dict(self.things3.filters)
+        try:
+            for mode, uuid in modifiers.items():
+                self.set_filter(filters, mode, uuid)
+        except ValueError:
+            abort(400, "start and end must be dates such as 2020-12-31")
+        self.mode_selector()
+        try:
+            with self.things3.filtered(filters), self.things3.snapshot():
+                for command in commands:
+                    if command in self.things3.functions:
+                        func = self.things3.functions[command]
+                        result["commands"][command] = self.things3.call(func)
+                    else:
+                        result["commands"][command] = \
+                            self.things3.get_not_implemented()
+                for tag in tags:
+                    result["tags"][tag] = self.things3.call(
+                        Things3.get_tag, tag)
+                    if data.get('html'):
+                        result["tags"][tag] = self.html.render_cards(
+                            self.things3, result["tags"][tag])
+        finally:
+            self.things3.mode_task()
+        data = json.dumps(result, default=Things3Row.asdict)
+        self.things3.metrics.increment(
+            "things3_query_bytes_total", {"query": "batch"}, len(data))
+        return Response(response=data, content_type='application/json')
+
+    def api_explain(self, command):
+        """Return queries, timings and plans behind a view."""
+        if command not in self.things3.functions:
+            return self.api(command)
+        func = self.things3.functions[command]
+        self.mode_selector()
+        try:
+            with self.things3.trace_queries(explain=True) as trace:
+                self.things3.call(func)
+            data = json.dumps(trace)
+        finally:
+            self.things3.mode_task()
+        return Response(response=data, content_type='application/json')
+
+    def api_export(self):
+        """Stream all tasks as NDJSON or msgpack."""
+        try:
+            export = Things3Export(self.things3,
+                                   request.args.get('format', 'ndjson'))
+        except ValueError as error:
+            return Response(response=str(error), status=400)
+        return Response(response=export.encode(),
+                        content_type=export.get_content_type())
+
+    def api_ical(self):
+        """Stream due and scheduled tasks as iCalendar, 304 if unchanged."""
+        etag = Things3ICal.get_etag(self.things3)
+        last_modified = Things3ICal.get_last_modified(self.things3)
+        if request.if_none_match:
+            unchanged = request.if_none_match.contains(etag)
+        else:
+            unchanged = request.if_modified_since is not None and \
+                request.if_modified_since >= last_modified
+        if unchanged:
+            response = Response(status=304)
+        else:
+            response = Response(response=self.ical.encode(self.things3),
+                                content_type=Things3ICal.CONTENT_TYPE)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        return response
+
+    def api_metrics(self):
+        """Export query and request metrics for Prometheus."""
+        return Response(response=self.things3.metrics.render(),
+                        content_type='text/plain; version=0.0.4')
+
+    @staticmethod
+    def request_start():
+        """Remember when a request started."""
+        g.start = time.perf_counter()
+
+    def request_stop(self, response):
+        """Record duration, status and size of a request."""
+        route = request.url_rule.rule if request.url_rule else 'unknown'
+        metrics = self.things3.metrics
+        metrics.observe("things3_http_request_duration_seconds",
+                        {"route": route}, time.perf_counter() - g.start)
+        metrics.increment("things3_http_requests_total",
+                          {"route": route, "status": response.status_code})
+        if response.content_length:
+            metrics.increment("things3_http_response_bytes_total",
+                              {"route": route}, response.content_length)
+        return response
+
+    @staticmethod
+    def get_profile_mode():
+        """Profiling requested via parameter or header, if any."""
+        return request.args.get('profile') or \
+            request.headers.get('X-Things3-Profile')
+
+    def profile_start(self):
+        """Run the request under the profiler if asked to."""
+        if self.get_profile_mode():
+            g.profile = cProfile.Profile()
+            g.profile.enable()
+
+    def profile_stop(self, response):
+        """Return the profile instead of the data or save it."""
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        profile.disable()
+        if self.get_profile_mode() == 'save':
+            filename = path.join(
+                self.profile_dir,
+                f"things3-{request.endpoint}-{time.time_ns()}.prof")
+            profile.dump_stats(filename)
+            response.headers['X-Things3-Profile-File'] = filename
+            return response
+        output = io.StringIO()
+        pstats.Stats(profile, stream=output).sort_stats(
+            'cumulative').print_stats(50)
+        return Response(response=output.getvalue(),
+                        content_type='text/plain')
+
     def get_url(self):
         """Get the public url for the endpoint"""
         fqdn = f'{socket.gethostname()}.local'
         return f"http://{fqdn}:{self.port}"
 
+    @staticmethod
+    def set_filter(filters, mode, uuid):
+        """Add a modifier to filters, raising ValueError for bad dates."""
+        if mode in ("start", "end") and uuid != "":
+            date.fromisoformat(uuid)
+        if mode in ("area", "project"):
+            # the sidebar selects either an area or a project
+            filters.pop("area", None)
+            filters.pop("project", None)
+        if mode in Things3.FILTERS and uuid != "":
+            filters[mode] = uuid
+
     def api_filter(self, mode, uuid):
         """Filter view by specific modifiers"""
-        if mode == "area" and uuid != "":
-            self.things3.filter = f"TASK.area = '{uuid}' AND"
-        if mode == "project" and uuid != "":
-            self.things3.filter = f"""
-                (TASK.project = '{uuid}' OR HEADING.project = '{uuid}') AND
-                """
+        filters = dict(self.things3.filters)
+        try:
+            self.set_filter(filters, mode, uuid)
+        except ValueError:
+            abort(400, f"{mode} must be a date such as 2020-12-31")
+        self.things3.filters = filters
         return Response(status=200)
 
     def api_filter_reset(self):
         """Reset filter modifiers"""
-        self.things3.filter = ""
+        self.things3.filters = {}
         return Response(status=200)
 
-    def __init__(self, database=None, host=None, port=None, expose=None):
+    # pylint: disable=R0913
+    def __init__(self, database=None, host=None, port=None, expose=None,
+                 profile=None):
         self.things3 = Things3(database=database)
 
         cfg = self.things3.get_from_config(host, 'KANBANVIEW_HOST')
@@ -145,12 +484,38 @@ class Things3API():
         self.things3.set_config('KANBANVIEW_HOST', self.host)
         self.things3.set_config('API_EXPOSE', str(cfg).lower() == 'true')
 
+        cfg = self.things3.get_from_config(profile, 'API_PROFILE')
+        self.profile = str(cfg).lower() == 'true'
+        cfg = self.things3.get_from_config(None, 'API_PROFILE_DIR')
+        self.profile_dir = cfg if cfg else self.profile_dir
+        self.ical = Things3ICal()
+        self.html = Things3HTML()
+
         self.flask = Flask(__name__)
         self.flask.add_url_rule('/config/<key>', view_func=self.config_get)
         self.flask.add_url_rule(
             '/config/<key>', view_func=self.config_set, methods=["PUT"])
         self.flask.add_url_rule('/api/<command>', view_func=self.api)
         self.flask.add_url_rule('/api/url', view_func=self.get_url)
+        self.flask.add_url_rule('/api/batch', view_func=self.api_batch,
+                                methods=["GET", "POST"])
+        self.flask.add_url_rule('/api/metrics', view_func=self.api_metrics)
+        self.flask.add_url_rule('/api/export', view_func=self.api_export)
+        self.flask.add_url_rule('/api/ical', view_func=self.api_ical)
+        self.flask.add_url_rule('/api/html/<command>',
+                                view_func=self.api_html)
+        self.flask.add_url_rule('/api/html/tag/<tag>',
+                                view_func=self.api_html_tag)
+        self.flask.add_url_rule('/api/hashes', view_func=self.api_hashes,
+                                methods=["GET", "POST"])
+        self.flask.add_url_rule('/api/query', view_func=self.api_query)
+        self.flask.add_url_rule('/api/minutes', view_func=self.api_minutes)
+        self.flask.add_url_rule('/api/distribution',
+                                view_func=self.api_distribution)
+        self.flask.add_url_rule('/api/<command>/count',
+                                view_func=self.api_count)
+        self.flask.add_url_rule('/api/explain/<command>',
+                                view_func=self.api_explain)
         self.flask.add_url_rule('/api/tag/<tag>', view_func=self.tag)
         self.flask.add_url_rule('/api/tag/<tag>/<area>', view_func=self.tag)
         self.flask.add_url_rule(
@@ -159,6 +524,12 @@ class Things3API():
                                 view_func=self.api_filter_reset)
         self.flask.add_url_rule('/<url>', view_func=self.on_get)
         self.flask.add_url_rule('/', view_func=self.on_get)
+        self.flask.register_error_handler(Things3Error, self.on_error)
+        self.flask.before_request(self.request_start)
+        self.flask.after_request(self.request_stop)
+        if self.profile:
+            self.flask.before_request(self.profile_start)
+            self.flask.after_request(self.profile_stop)
         self.flask.app_context().push()
         self.flask_context = None
 
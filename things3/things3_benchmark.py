@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Benchmark suite for the Things 3 queries, exports and API."""
+
+from __future__ import print_function
+
+__author__ = "Alexander Willner"
+__copyright__ = "2020 Alexander Willner"
+__credits__ = ["Alexander Willner"]
+__license__ = "Apache License 2.0"
+__version__ = "2.6.3"
+__maintainer__ = "Alexander Willner"
+__email__ = "alex@willner.ws"
+__status__ = "Development"
+
+import argparse
+import io
+import json
+import sys
+import tempfile
+import time
+from os import path
+from things3.things3 import Things3
+from things3.things3_api import Things3API
+from things3.things3_generator import Things3Generator
+from things3.things3_opml import Things3OPML
+
+
+class Things3Benchmark():
+    """Time every view, the OPML export and the main API routes."""
+
+    ROUTES = ["/api/today", "/api/next", "/api/backlog", "/api/upcoming",
+              "/api/inbox", "/api/cleanup", "/api/tag/Waiting",
+              "/api/tag/MIT", "/api/projects", "/api/stats-day"]
+    tolerance = 0.5
+    threshold = 0.005
+
+    def __init__(self, database, repeat=3):
+        self.database = database
+        self.repeat = repeat
+        self.things3 = Things3(database=database)
+
+    def measure(self, method):
+        """Best wall clock time of several runs in seconds."""
+        best = None
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            method()
+            duration = time.perf_counter() - start
+            best = duration if best is None else min(best, duration)
+        return best
+
+    def run(self):
+        """Run all benchmarks."""
+        results = {}
+        for command, func in self.things3.functions.items():
+            results[f"query/{command}"] = self.measure(
+                lambda func=func: self.things3.call(func))
+        results["export/opml"] = self.measure(
+            lambda: Things3OPML(io.StringIO()).print_all(self.things3))
+
+        api = Things3API(database=self.database)
+        client = api.flask.test_client()
+        for route in self.ROUTES:
+            results[route.lstrip("/")] = self.measure(
+                lambda route=route: client.get(route))
+        return results
+
+    @classmethod
+    def compare(cls, results, baseline):
+        """List benchmarks that got slower than the baseline allows."""
+        regressions = {}
+        for name, duration in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            if duration > before * (1 + cls.tolerance) and \
+                    duration - before > cls.threshold:
+                regressions[name] = {"baseline": before, "current": duration}
+        return regressions
+
+
+def main(args=None):
+    """Main entry point for CLI installation"""
+    parser = argparse.ArgumentParser(
+        description='Benchmark KanbanView against a synthetic database.')
+    parser.add_argument("-d", "--database",
+                        help="existing database (default: generate one)")
+    parser.add_argument("-t", "--tasks", type=int, default=10000,
+                        help="number of tasks to generate")
+    parser.add_argument("-f", "--floating", type=float, default=0.2,
+                        help="share of generated tasks without a parent")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="runs per benchmark")
+    parser.add_argument("-o", "--output", default="benchmark.json",
+                        help="file to write the results to")
+    parser.add_argument("-b", "--baseline",
+                        help="results to compare against")
+    args = parser.parse_args(args)
+
+    # the temporary database must not become the configured one
+    with Things3.keep_config():
+        database = args.database
+        if database is None:
+            database = path.join(tempfile.mkdtemp(), 'benchmark.sqlite3')
+            Things3Generator(args.tasks,
+                             floating=args.floating).create(database)
+        results = Things3Benchmark(database, args.repeat).run()
+
+    with open(args.output, 'w') as output:
+        json.dump({"tasks": args.tasks, "results": results},
+                  output, indent=2, sort_keys=True)
+    for name, duration in sorted(results.items()):
+        print(f"{name:30} {duration * 1000:10.2f} ms")
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = Things3Benchmark.compare(
+                results, json.load(baseline)["results"])
+        for name, values in regressions.items():
+            print(f"Regression: {name} " +
+                  f"{values['baseline'] * 1000:.2f} ms -> " +
+                  f"{values['current'] * 1000:.2f} ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""On-disk cache for serialized Things 3 results."""
+
+from __future__ import print_function
+
+__author__ = "Alexander Willner"
+__copyright__ = "2020 Alexander Willner"
+__credits__ = ["Alexander Willner"]
+__license__ = "Apache License 2.0"
+__version__ = "2.6.3"
+__maintainer__ = "Alexander Willner"
+__email__ = "alex@willner.ws"
+__status__ = "Development"
+
+import hashlib
+import os
+import tempfile
+from os import environ, path
+
+
+class Things3Cache():
+    """Size-bounded on-disk cache, evicting least recently used entries."""
+
+    SUFFIX = '.cache'
+    max_size = 32 * 1024 * 1024
+
+    def __init__(self, directory=None, max_size=None):
+        cache_home = environ.get('XDG_CACHE_HOME',
+                                 path.expanduser('~/.cache'))
+        self.directory = directory or path.join(cache_home, 'kanbanview')
+        self.max_size = max_size or self.max_size
+
+    @staticmethod
+    def get_key(*parts):
+        """Hash the parts that identify a result."""
+        return hashlib.sha256(
+            '\0'.join(str(part) for part in parts).encode('utf-8')
+        ).hexdigest()
+
+    def get_file(self, key):
+        """File that holds an entry."""
+        return path.join(self.directory, key + self.SUFFIX)
+
+    def get(self, key):
+        """Return the stored bytes or None."""
+        filename = self.get_file(key)
+        try:
+            with open(filename, 'rb') as source:
+                data = source.read()
+            os.utime(filename)
+        except OSError:
+            return None
+        return data
+
+    def set(self, key, data):
+        """Store bytes atomically and evict old entries."""
+        os.makedirs(self.directory, exist_ok=True)
+        handle, temp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(handle, 'wb') as target:
+            target.write(data)
+        os.replace(temp, self.get_file(key))
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries above the size limit."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.SUFFIX):
+                info = entry.stat()
+                entries.append((info.st_mtime, info.st_size, entry.path))
+        total = sum(entry[1] for entry in entries)
+        for _, size, filename in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+            total -= size
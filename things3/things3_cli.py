@@ -18,28 +18,41 @@ import sys
 import argparse
 import json
 import csv
+import io
 import webbrowser
+from contextlib import redirect_stdout
+from datetime import date
 import argcomplete  # type: ignore
-from things3.things3 import Things3
+from things3.things3 import Things3, Things3Error
+from things3.things3_cache import Things3Cache
+from things3.things3_client import Things3Client
+from things3.things3_export import Things3Export
+from things3.things3_ical import Things3ICal
+from things3.things3_mirror import Things3Mirror
 from things3.things3_opml import Things3OPML
+from things3.things3_row import Things3Row
 
 
-class Things3CLI():
+class Things3CLI(Things3Client):
     """Simple read-only Thing 3 CLI."""
 
     print_json = False
     print_csv = False
     print_opml = False
     anonymize = False
+    use_cache = False
     things3 = None
 
     def __init__(self, database=None):
         self.things3 = Things3(database)
+        cfg = self.things3.get_from_config(None, 'CLI_CACHE')
+        self.use_cache = str(cfg).lower() == 'true'
+        self.cache = Things3Cache(self.things3.get_config('CACHE_DIR'))
 
     def print_tasks(self, tasks):
         """Print a task."""
         if self.print_json:
-            print(json.dumps(tasks))
+            print(json.dumps(tasks, default=Things3Row.asdict))
         elif self.print_opml:
             Things3OPML().print_tasks(tasks)
         elif self.print_csv:
@@ -47,14 +60,70 @@ class Things3CLI():
                           'type', 'due', 'created', 'modified', 'started',
                           'stopped', 'notes']
             writer = csv.DictWriter(
-                sys.stdout, fieldnames=fieldnames, delimiter=';')
+                sys.stdout, fieldnames=fieldnames, delimiter=';',
+                extrasaction='ignore')
             writer.writeheader()
             writer.writerows(tasks)
         else:
             for task in tasks:
                 title = task['title']
-                context = task['context'] if 'context' in task else ''
+                context = task['context'] if 'context' in task \
+                    else task.get('size', '')
                 print(' - ', title, ' (', context, ')')
+                for item in task['checklist'] if 'checklist' in task else []:
+                    print('    ', '[x]' if item['status'] else '[ ]',
+                          item['title'])
+
+    def print_batch(self, commands, ndjson=False):
+        """Print several views read from one database snapshot."""
+        results = {}
+        with self.things3.snapshot():
+            for command in commands:
+                func = self.things3.functions.get(command)
+                tasks = self.things3.call(func) if func \
+                    else self.things3.get_not_implemented()
+                if ndjson:
+                    print(json.dumps({command: tasks},
+                                     default=Things3Row.asdict))
+                else:
+                    results[command] = tasks
+        if not ndjson:
+            print(json.dumps(results, default=Things3Row.asdict))
+
+    def print_export(self, fmt):
+        """Stream every task in the given encoding."""
+        try:
+            export = Things3Export(self.things3, fmt)
+        except ValueError as error:
+            print(error)
+            return
+        output = getattr(sys.stdout, 'buffer', None)
+        if output is None:
+            for chunk in export.encode():
+                sys.stdout.write(chunk.decode('utf-8'))
+        else:
+            sys.stdout.flush()
+            export.write(output)
+
+    def print_ical(self):
+        """Stream due and scheduled tasks as iCalendar."""
+        ical = Things3ICal()
+        output = getattr(sys.stdout, 'buffer', None)
+        if output is None:
+            for chunk in ical.encode(self.things3):
+                sys.stdout.write(chunk.decode('utf-8'))
+        else:
+            sys.stdout.flush()
+            ical.write(self.things3, output)
+
+    def get_settings(self):
+        """Values in use of the variables that change the output."""
+        settings = []
+        for name in self.ENVIRONMENT.values():
+            value = getattr(self.things3, name)
+            # a mirror is identified by the path of its database
+            settings.append(getattr(value, 'mirror', value))
+        return tuple(settings)
 
     @classmethod
     def print_unimplemented(cls):
@@ -89,8 +158,19 @@ class Things3CLI():
                               help='Shows trashed tasks')
         subparsers.add_parser('feedback',
                               help='Give feedback')
+        export = subparsers.add_parser(
+            'export', help='Exports all tasks with their relations')
+        export.add_argument("--format", choices=list(Things3Export.FORMATS),
+                            default='ndjson', help="output encoding")
         subparsers.add_parser('all',
                               help='Shows all tasks')
+        batch = subparsers.add_parser(
+            'batch', help='Shows several views as one JSON object')
+        batch.add_argument('commands', nargs='*', metavar='command',
+                           help='views to include (default: all), one of ' +
+                           ', '.join(Things3.functions))
+        batch.add_argument("--ndjson", action="store_true", default=False,
+                           help="output one JSON line per view")
         subparsers.add_parser('csv',
                               help='Exports tasks as CSV')
         subparsers.add_parser('areas',
@@ -111,6 +191,8 @@ class Things3CLI():
                               help='Shows tasks that float around')
         subparsers.add_parser('logbook',
                               help='Shows tasks completed today')
+        subparsers.add_parser('mirror',
+                              help='Updates the local analytics mirror')
         subparsers.add_parser('mostClosed',
                               help='Shows days when most tasks were closed')
         subparsers.add_parser('mostCancelled',
@@ -160,6 +242,11 @@ class Things3CLI():
                             action="store_true", default=False,
                             help="output as OPML", dest="opml")
 
+        parser.add_argument("--cache",
+                            action="store_true", default=False,
+                            help="reuse output while the database is " +
+                            "unchanged", dest="cache")
+
         parser.add_argument("-a", "--anonymize",
                             action="store_true", default=False,
                             help="anonymize output", dest="anonymize")
@@ -186,23 +273,70 @@ class Things3CLI():
             self.anonymize = args.anonymize
             self.things3.anonymize = self.anonymize
 
-            if command in self.things3.functions:
-                func = self.things3.functions[command]
-                self.print_tasks(func(self.things3))
-            elif command == "opml":
-                Things3OPML().print_all(self.things3)
-            elif command == "csv":
-                print("Deprecated: use --csv instead")
-            elif command == "feedback":
-                webbrowser.open(
-                    'https://github.com/AlexanderWillner/KanbanView/issues')
-            else:
-                Things3CLI.print_unimplemented()
+            try:
+                if (self.use_cache or args.cache) and not self.anonymize and \
+                        (command in self.things3.functions or
+                         command in ("batch", "opml", "ical")):
+                    self.print_cached(args)
+                else:
+                    self.run(args)
+            except Things3Error as error:
+                print(error)
+                sys.exit(2)
+
+    def print_cached(self, args):
+        """Print the output of a command, served from disk if unchanged."""
+        things3 = self.things3
+        key = Things3Cache.get_key(sorted(vars(args).items()),
+                                   things3.get_fingerprint(),
+                                   date.today(), *self.get_settings())
+        data = self.cache.get(key)
+        self.things3.metrics.cache("cli", data is not None)
+        if data is None:
+            output = io.StringIO()
+            with redirect_stdout(output):
+                self.run(args)
+            data = output.getvalue().encode('utf-8')
+            self.cache.set(key, data)
+        sys.stdout.write(data.decode('utf-8'))
+
+    def run(self, args):
+        """Execute a command."""
+        command = args.command
+        if command in self.things3.functions:
+            func = self.things3.functions[command]
+            self.print_tasks(self.things3.call(func))
+        elif command == "batch":
+            self.print_batch(args.commands or list(self.things3.functions),
+                             args.ndjson)
+        elif command == "opml":
+            Things3OPML().print_all(self.things3)
+        elif command == "export":
+            self.print_export(args.format)
+        elif command == "ical":
+            self.print_ical()
+        elif command == "mirror":
+            mirror = self.things3.mirror or Things3Mirror(
+                self.things3.database, self.things3.get_config('MIRROR_DB'))
+            changed, deleted = mirror.sync()
+            print(f"Mirrored {changed} changed and {deleted} deleted " +
+                  f"items to {mirror.mirror}")
+        elif command == "csv":
+            print("Deprecated: use --csv instead")
+        elif command == "feedback":
+            webbrowser.open(
+                'https://github.com/AlexanderWillner/KanbanView/issues')
+        else:
+            Things3CLI.print_unimplemented()
 
 
 def main():
     """Main entry point for CLI installation"""
-    Things3CLI().main()
+    output = Things3CLI.forward(sys.argv[1:])
+    if output is not None:
+        sys.stdout.write(output)
+    else:
+        Things3CLI().main()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Thin Things 3 CLI client forwarding calls to a running daemon."""
+
+from __future__ import print_function
+
+__author__ = "Alexander Willner"
+__copyright__ = "2020 Alexander Willner"
+__credits__ = ["Alexander Willner"]
+__license__ = "Apache License 2.0"
+__version__ = "2.6.3"
+__maintainer__ = "Alexander Willner"
+__email__ = "alex@willner.ws"
+__status__ = "Development"
+
+import sys
+import json
+import socket
+from importlib import import_module
+from os import environ, path
+
+
+class Things3Client():
+    """Forward a command line to the daemon, using the standard library only.
+
+    Everything else is imported only if no daemon answered, as importing
+    the whole CLI takes longer than the daemon needs to answer.
+    """
+
+    SOCKET = environ.get('DAEMON_SOCKET',
+                         path.expanduser('~/.kanbanview.sock'))
+    # variables that change the output and the attributes of Things3 they set
+    ENVIRONMENT = {'THINGSDB': 'database', 'MIRROR_DB': 'mirror',
+                   'TAG_WAITING': 'tag_waiting', 'TAG_MIT': 'tag_mit',
+                   'TAG_CLEANUP': 'tag_cleanup', 'TAG_A': 'tag_a',
+                   'TAG_B': 'tag_b', 'TAG_C': 'tag_c', 'TAG_D': 'tag_d',
+                   'ANONYMIZE': 'anonymize', 'STAT_DAYS': 'stat_days'}
+
+    @classmethod
+    def get_environment(cls):
+        """Values of the variables that change the output."""
+        return {key: environ.get(key) for key in cls.ENVIRONMENT}
+
+    @classmethod
+    def forward(cls, argv, socket_path=None):
+        """Let a running daemon answer, None if there is none."""
+        socket_path = socket_path or cls.SOCKET
+        if not path.exists(socket_path):
+            return None
+        request = {"argv": argv, "environ": cls.get_environment()}
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.settimeout(30)
+                client.connect(socket_path)
+                client.sendall(json.dumps(request).encode('utf-8') + b'\n')
+                client.shutdown(socket.SHUT_WR)
+                response = b''.join(iter(lambda: client.recv(65536), b''))
+        except OSError:
+            return None
+        status, _, output = response.partition(b'\n')
+        return output.decode('utf-8') if status == b'OK' else None
+
+
+def main():
+    """Main entry point for CLI installation"""
+    output = Things3Client.forward(sys.argv[1:])
+    if output is not None:
+        sys.stdout.write(output)
+    else:
+        import_module('things3.things3_cli').Things3CLI().main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Background daemon answering Things 3 CLI calls over a Unix socket."""
+
+from __future__ import print_function
+
+__author__ = "Alexander Willner"
+__copyright__ = "2020 Alexander Willner"
+__credits__ = ["Alexander Willner"]
+__license__ = "Apache License 2.0"
+__version__ = "2.6.3"
+__maintainer__ = "Alexander Willner"
+__email__ = "alex@willner.ws"
+__status__ = "Development"
+
+import io
+import json
+import socketserver
+import sys
+from collections import OrderedDict
+from contextlib import redirect_stdout, redirect_stderr
+from datetime import date
+from os import chmod, remove
+from things3.things3_cli import Things3CLI
+
+
+class Things3DaemonHandler(socketserver.StreamRequestHandler):
+    """Answer one forwarded command line."""
+
+    def handle(self):
+        daemon = self.server.daemon
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+            # the client's environment may point to other data
+            output = daemon.run(request['argv']) \
+                if request.get('environ') == daemon.environ else None
+        except (ValueError, TypeError, KeyError):
+            output = None
+        if output is None:
+            self.wfile.write(b'FALLBACK\n')
+        else:
+            self.wfile.write(b'OK\n' + output.encode('utf-8'))
+
+
+class Things3Daemon():
+    """Keep a warm Things3 instance for the CLI."""
+
+    COMMANDS = ['batch', 'opml', 'ical']
+    cache_size = 256
+
+    def __init__(self, database=None, socket_path=None):
+        self.cli = Things3CLI(database)
+        self.things3 = self.cli.things3
+        self.things3.persistent = True
+        cfg = self.things3.get_from_config(socket_path, 'DAEMON_SOCKET')
+        self.socket_path = cfg if cfg else Things3CLI.SOCKET
+        self.environ = Things3CLI.get_environment()
+        self.cache = OrderedDict()
+        self.fingerprint = None
+        self.server = None
+
+    def execute(self, argv):
+        """Run the CLI in-process and capture what it prints."""
+        output = io.StringIO()
+        try:
+            with redirect_stdout(output), redirect_stderr(io.StringIO()):
+                args = Things3CLI.get_parser().parse_args(argv)
+                if args.command not in self.things3.functions and \
+                        args.command not in self.COMMANDS:
+                    return None
+                with self.things3.snapshot():
+                    self.cli.main(args)
+        except SystemExit:
+            return None
+        return output.getvalue()
+
+    def run(self, argv):
+        """Answer from the cache while the database is unchanged."""
+        fingerprint = self.things3.get_fingerprint()
+        if fingerprint != self.fingerprint:
+            self.cache.clear()
+            self.fingerprint = fingerprint
+        key = (tuple(argv), date.today())
+        hit = key in self.cache
+        self.things3.metrics.cache("daemon", hit)
+        if not hit:
+            output = self.execute(argv)
+            if output is None:
+                return None
+            # the server answers one call at a time, so no lock is needed
+            if len(self.cache) >= self.cache_size:
+                self.cache.popitem(last=False)
+            self.cache[key] = output
+        return self.cache[key]
+
+    def start(self):
+        """Listen on the socket."""
+        try:
+            remove(self.socket_path)
+        except FileNotFoundError:
+            pass
+        self.server = socketserver.UnixStreamServer(
+            self.socket_path, Things3DaemonHandler)
+        self.server.daemon = self
+        chmod(self.socket_path, 0o600)
+
+    def stop(self):
+        """Stop listening and remove the socket."""
+        self.server.server_close()
+        try:
+            remove(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+    def main(self):
+        """Serve until interrupted."""
+        self.start()
+        print(f"Serving at {self.socket_path} ...")
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            print("Shutting down...")
+            self.stop()
+            sys.exit(0)
+
+
+def main():
+    """Main entry point for CLI installation"""
+    Things3Daemon().main()
+
+
+if __name__ == "__main__":
+    main()
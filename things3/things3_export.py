@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""NDJSON and msgpack export plugin for the Thing 3 CLI and API."""
+
+from __future__ import print_function
+
+__author__ = "Alexander Willner"
+__copyright__ = "2020 Alexander Willner"
+__credits__ = ["Alexander Willner"]
+__license__ = "Apache License 2.0"
+__version__ = "2.6.3"
+__maintainer__ = "Alexander Willner"
+__email__ = "alex@willner.ws"
+__status__ = "Development"
+
+import json
+
+try:
+    import msgpack  # type: ignore
+except ImportError:
+    msgpack = None  # pylint: disable=C0103
+
+
+class Things3Export():
+    """Encode the full database as a stream of records."""
+
+    FORMATS = {'ndjson': 'application/x-ndjson',
+               'msgpack': 'application/x-msgpack'}
+
+    def __init__(self, things3, fmt='ndjson'):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        if fmt == 'msgpack' and msgpack is None:
+            raise ValueError("Run 'pip3 install msgpack' first.")
+        self.things3 = things3
+        self.format = fmt
+
+    def get_content_type(self):
+        """MIME type of the encoded stream."""
+        return self.FORMATS[self.format]
+
+    def encode(self):
+        """Yield one encoded record at a time."""
+        if self.format == 'msgpack':
+            packer = msgpack.Packer()
+            for task in self.things3.export_tasks():
+                yield packer.pack(task)
+        else:
+            for task in self.things3.export_tasks():
+                yield json.dumps(task).encode('utf-8') + b'\n'
+
+    def write(self, output):
+        """Write the encoded stream to a binary file."""
+        for chunk in self.encode():
+            output.write(chunk)
+        output.flush()
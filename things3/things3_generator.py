@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Synthetic Things 3 databases for tests and benchmarks."""
+
+from __future__ import print_function
+
+__author__ = "Alexander Willner"
+__copyright__ = "2020 Alexander Willner"
+__credits__ = ["Alexander Willner"]
+__license__ = "Apache License 2.0"
+__version__ = "2.6.3"
+__maintainer__ = "Alexander Willner"
+__email__ = "alex@willner.ws"
+__status__ = "Development"
+
+import argparse
+import random
+import sqlite3
+import time
+import uuid
+from os import remove
+
+
+class Things3Generator():
+    """Create databases with the Things 3 schema at a given scale."""
+
+    SCHEMA = """
+        CREATE TABLE TMTask (
+            uuid TEXT PRIMARY KEY, userModificationDate REAL,
+            creationDate REAL, trashed INTEGER, type INTEGER, title TEXT,
+            notes TEXT, dueDate REAL, dueDateOffset INTEGER, status INTEGER,
+            stopDate REAL, start INTEGER, startDate REAL, 'index' INTEGER,
+            todayIndex INTEGER, area TEXT, project TEXT,
+            repeatingTemplate TEXT, delegate TEXT, recurrenceRule BLOB,
+            instanceCreationStartDate REAL, instanceCreationPaused INTEGER,
+            instanceCreationCount INTEGER,
+            afterCompletionReferenceDate REAL, actionGroup TEXT,
+            untrashedLeafActionsCount INTEGER,
+            openUntrashedLeafActionsCount INTEGER,
+            checklistItemsCount INTEGER, openChecklistItemsCount INTEGER,
+            startBucket INTEGER, alarmTimeOffset REAL,
+            lastAlarmInteractionDate REAL, todayIndexReferenceDate REAL,
+            nextInstanceStartDate REAL, dueDateSuppressionDate REAL,
+            leavesTombstone INTEGER);
+        CREATE TABLE TMArea (
+            uuid TEXT PRIMARY KEY, title TEXT, visible INTEGER,
+            'index' INTEGER);
+        CREATE TABLE TMTag (
+            uuid TEXT PRIMARY KEY, title TEXT, shortcut TEXT, usedDate REAL,
+            parent TEXT, 'index' INTEGER);
+        CREATE TABLE TMTaskTag (tasks TEXT NOT NULL, tags TEXT NOT NULL);
+        CREATE TABLE TMAreaTag (areas TEXT NOT NULL, tags TEXT NOT NULL);
+        CREATE TABLE TMChecklistItem (
+            uuid TEXT PRIMARY KEY, userModificationDate REAL,
+            creationDate REAL, title TEXT, status INTEGER, stopDate REAL,
+            'index' INTEGER, task TEXT, leavesTombstone INTEGER);
+        CREATE TABLE TMTombstone (
+            uuid TEXT PRIMARY KEY, deletionDate REAL,
+            deletedObjectUUID TEXT);
+        CREATE INDEX index_THMTask_project ON TMTask (project);
+        CREATE INDEX index_THMTask_area ON TMTask (area);
+        CREATE INDEX index_THMTask_start ON TMTask (start);
+        CREATE INDEX index_THMTask_start_type ON TMTask (start, type);
+        CREATE INDEX index_THMTask_repeatingTemplate
+            ON TMTask (repeatingTemplate);
+        CREATE INDEX index_THMTask_actionGroup ON TMTask (actionGroup);
+        CREATE INDEX index_THMTask_stopDate_alarmTimeOffset
+            ON TMTask (stopDate, alarmTimeOffset);
+        CREATE INDEX index_THMTask_type ON TMTask (type);
+        CREATE INDEX index_THMTaskTag_tasks ON TMTaskTag (tasks);
+        CREATE INDEX index_THMAreaTag_areas ON TMAreaTag (areas);
+        CREATE INDEX index_THMChecklistItem_task ON TMChecklistItem (task);
+        """
+    COLUMNS = ("uuid", "userModificationDate", "creationDate", "trashed",
+               "type", "title", "notes", "dueDate", "status", "stopDate",
+               "start", "startDate", "todayIndex", "area", "project",
+               "recurrenceRule", "instanceCreationPaused",
+               "nextInstanceStartDate", "actionGroup")
+    TAGS = ["Waiting", "MIT", "Cleanup", "A", "B", "C", "D",
+            "Home", "Office", "Errand", "5", "15", "30", "60"]
+    CHILD_TAGS = {"Waiting": ["Waiting for reply", "Waiting for delivery"],
+                  "A": ["A-urgent"], "Office": ["Meeting"]}
+    BATCH = 10000
+    DAY = 86400
+
+    def __init__(self, tasks=10000, seed=0, floating=0.2):
+        self.tasks = tasks
+        self.floating = floating
+        self.random = random.Random(seed)
+        # full hours, so that databases of the same seed are equal
+        self.now = float(int(time.time()) // 3600 * 3600)
+        self.areas = []
+        self.projects = []
+        self.headings = []
+        self.tags = []
+
+    def uuid(self):
+        """Create a reproducible identifier."""
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def date(self, past=365, future=0):
+        """Random timestamp around now."""
+        return self.now + self.random.uniform(-past, future) * self.DAY
+
+    def row(self, kind, title, area=None, project=None, heading=None):
+        """Create one TMTask row."""
+        rnd = self.random.random
+        created = self.date()
+        status = 0
+        stopped = None
+        trashed = 1 if rnd() < 0.05 else 0
+        if kind == 0 and rnd() < 0.3:
+            status = 3 if rnd() < 0.8 else 2
+            stopped = self.date(past=(self.now - created) / self.DAY)
+        start = self.random.choice([0, 1, 1, 1, 2, 2]) if kind != 2 else 1
+        started = None
+        if start == 1 and rnd() < 0.2:
+            started = self.date(past=7)
+        elif start == 2 and rnd() < 0.4:
+            started = self.date(past=0, future=60)
+        due = self.date(past=30, future=60) if rnd() < 0.1 else None
+        recurring = kind == 0 and rnd() < 0.02
+        return (self.uuid(), self.date(past=(self.now - created) / self.DAY),
+                created, trashed, kind, title,
+                f"Notes for {title}" if rnd() < 0.3 else "",
+                due, status, stopped, start, started,
+                self.random.randint(-1000, 1000), area, project,
+                b"recurrence" if recurring else None,
+                0 if recurring else None,
+                self.date(past=0, future=7) if recurring else None,
+                heading)
+
+    def create_tags(self, cursor):
+        """Create flat and nested tags."""
+        rows = []
+        for title in self.TAGS:
+            tag = self.uuid()
+            self.tags.append(tag)
+            rows.append((tag, title, None, len(rows)))
+            for child in self.CHILD_TAGS.get(title, []):
+                self.tags.append(self.uuid())
+                rows.append((self.tags[-1], child, tag, len(rows)))
+        cursor.executemany(
+            "INSERT INTO TMTag (uuid, title, parent, 'index') "
+            "VALUES (?, ?, ?, ?)", rows)
+
+    def create_containers(self, cursor):
+        """Create areas, projects and headings."""
+        insert = f"INSERT INTO TMTask ({', '.join(self.COLUMNS)}) " \
+            f"VALUES ({', '.join('?' * len(self.COLUMNS))})"
+        for idx in range(max(1, self.tasks // 2000)):
+            self.areas.append(self.uuid())
+            cursor.execute(
+                "INSERT INTO TMArea (uuid, title, visible, 'index') "
+                "VALUES (?, ?, 1, ?)", (self.areas[-1], f"Area {idx}", idx))
+        for idx in range(max(1, self.tasks // 50)):
+            area = self.random.choice(self.areas) \
+                if self.random.random() < 0.7 else None
+            row = self.row(1, f"Project {idx}", area=area)
+            self.projects.append(row[0])
+            cursor.execute(insert, row)
+        for idx in range(max(1, self.tasks // 200)):
+            project = self.random.choice(self.projects)
+            row = self.row(2, f"Heading {idx}", project=project)
+            self.headings.append(row[0])
+            cursor.execute(insert, row)
+        return insert
+
+    def task_rows(self):
+        """Yield the task rows, attached to random containers."""
+        for idx in range(self.tasks):
+            choice = self.random.random()
+            if choice < self.floating:
+                yield self.row(0, f"Task {idx}")
+                continue
+            choice = (choice - self.floating) / (1 - self.floating)
+            if choice < 0.25:
+                yield self.row(0, f"Task {idx}",
+                               area=self.random.choice(self.areas))
+            elif choice < 0.8125:
+                yield self.row(0, f"Task {idx}",
+                               project=self.random.choice(self.projects))
+            else:
+                yield self.row(0, f"Task {idx}",
+                               heading=self.random.choice(self.headings))
+
+    def create(self, database):
+        """Write a new database file."""
+        try:
+            remove(database)
+        except FileNotFoundError:
+            pass
+        connection = sqlite3.connect(database)
+        cursor = connection.cursor()
+        cursor.executescript(self.SCHEMA)
+        self.create_tags(cursor)
+        insert = self.create_containers(cursor)
+        batch, tags, items, tombstones = [], [], [], []
+        for row in self.task_rows():
+            batch.append(row)
+            for tag in self.random.sample(self.tags,
+                                          self.random.choice([0, 0, 1, 2])):
+                tags.append((row[0], tag))
+            if self.random.random() < 0.05:
+                for idx in range(self.random.randint(1, 5)):
+                    items.append((self.uuid(), row[1], row[2],
+                                  f"Item {idx}",
+                                  self.random.choice([0, 0, 3]), idx, row[0]))
+            if self.random.random() < 0.01:
+                tombstones.append((self.uuid(), row[1], self.uuid()))
+            if len(batch) >= self.BATCH:
+                self.flush(cursor, insert, batch, tags, items, tombstones)
+        self.flush(cursor, insert, batch, tags, items, tombstones)
+        connection.commit()
+        connection.close()
+        return database
+
+    @staticmethod
+    def flush(cursor, insert, batch, tags, items, tombstones):
+        """Write and clear buffered rows."""
+        cursor.executemany(insert, batch)
+        cursor.executemany("INSERT INTO TMTaskTag VALUES (?, ?)", tags)
+        cursor.executemany(
+            "INSERT INTO TMChecklistItem (uuid, userModificationDate, "
+            "creationDate, title, status, 'index', task) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", items)
+        cursor.executemany("INSERT INTO TMTombstone VALUES (?, ?, ?)",
+                           tombstones)
+        for buffer in (batch, tags, items, tombstones):
+            buffer.clear()
+
+
+def main():
+    """Main entry point for CLI installation"""
+    parser = argparse.ArgumentParser(
+        description='Create a synthetic Things 3 database.')
+    parser.add_argument("database", help="file to create")
+    parser.add_argument("-t", "--tasks", type=int, default=10000,
+                        help="number of tasks")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="random seed")
+    parser.add_argument("-f", "--floating", type=float, default=0.2,
+                        help="share of tasks without area or project")
+    args = parser.parse_args()
+    Things3Generator(args.tasks, args.seed,
+                     args.floating).create(args.database)
+    print(f"Created {args.database} with {args.tasks} tasks.")
+
+
+if __name__ == "__main__":
+    main()
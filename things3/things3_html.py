@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Server-side HTML of the Kanban cards and columns."""
+
+from __future__ import print_function
+
+__author__ = "Alexander Willner"
+__copyright__ = "2020 Alexander Willner"
+__credits__ = ["Alexander Willner"]
+__license__ = "Apache License 2.0"
+__version__ = "2.6.3"
+__maintainer__ = "Alexander Willner"
+__email__ = "alex@willner.ws"
+__status__ = "Development"
+
+import threading
+from collections import OrderedDict
+from datetime import date
+from html import escape
+from things3.things3_cache import Things3Cache
+
+
+class Things3HTML():
+    """Render escaped cards, reusing them while the tasks are unchanged."""
+
+    cache_size = 4096
+    columns_size = 256
+
+    def __init__(self):
+        self.cards = OrderedDict()
+        self.columns = OrderedDict()
+        self.contents = OrderedDict()
+        self.fingerprint = None
+        self.lock = threading.Lock()
+
+    def store(self, cache, key, value, size):
+        """Add to a cache, dropping its oldest entry if it is full."""
+        with self.lock:
+            if len(cache) >= size:
+                cache.popitem(last=False)
+            cache[key] = value
+
+    @staticmethod
+    def link(uuid, text):
+        """Link to an item in Things."""
+        return "<a draggable='false' href='things:///show?id=" + \
+            f"{escape(uuid)}' target='_blank'>{text}</a>"
+
+    def render(self, row):
+        """HTML of a single card."""
+        uuid = row.get('uuid')
+        title = escape(str(row.get('title') or ''))
+        context = row.get('context')
+        css_class = 'hasNoProject'
+        started = ''
+        due = ''
+        if row.get('type') == 'project':
+            title = f"{title} ({row.get('size')})"
+        if uuid is not None:
+            title = self.link(uuid, title)
+        if context is not None:
+            css_class = 'hasProject'
+            context = escape(str(context))
+            if row.get('context_uuid') is not None:
+                context = self.link(row['context_uuid'], context)
+        if row.get('due') is not None:
+            due = f"Due: {escape(row['due'])}"
+            css_class = 'hasDeadline'
+        if row.get('started') is not None:
+            started = f"Start: {escape(row['started'])}"
+        if row.get('progress'):
+            started = f"{started} Checklist: {escape(row['progress'])}" \
+                .strip()
+        return "<div class='box bigger' draggable='false' " + \
+            "ondragstart='onDragStart(event);' " + \
+            f"id='{escape(str(uuid or ''))}'>{title}" + \
+            f"<div class='deadline'>{started}</div>" + \
+            f"<div class='deadline'>{due}</div>" + \
+            f"<div class='area {css_class}'>{context or ''}</div></div>"
+
+    def render_card(self, things3, row):
+        """HTML of a card, cached per uuid and modification date.
+
+        Title and size of the context come from other rows and are part
+        of the key as well. Rows without a modification date, such as
+        areas and tags, are rendered every time.
+        """
+        if things3.anonymize or row.get('uuid') is None or \
+                row.get('version') is None:
+            return self.render(row)
+        key = (row['uuid'], row.get('version'), row.get('context'),
+               row.get('size'), row.get('progress'), row.get('type'))
+        card = self.cards.get(key)
+        things3.metrics.cache("card", card is not None)
+        if card is None:
+            card = self.render(row)
+            self.store(self.cards, key, card, self.cache_size)
+        return card
+
+    def render_cards(self, things3, rows):
+        """HTML of several cards."""
+        return ''.join(self.render_card(things3, row) for row in rows)
+
+    def render_column(self, things3, cssclass, header, rows):
+        """HTML of a column with its header, e.g. for the static view."""
+        return "<div class='column'><div class=''>" + \
+            f"<h2 class='h2 {cssclass}'>{escape(header)}" + \
+            f"<span class='size'>{len(rows)}</span></h2>" + \
+            self.render_cards(things3, rows) + "</div></div>"
+
+    def get_key(self, things3, *parts):
+        """Key of a column, dropping all columns when the database changed."""
+        fingerprint = things3.get_fingerprint()
+        if fingerprint != self.fingerprint:
+            with self.lock:
+                self.columns = OrderedDict()
+                self.fingerprint = fingerprint
+        return parts + (date.today(), things3.IS_TASK,
+                        tuple(sorted(things3.filters.items())))
+
+    def get_content(self, things3, func, *args):
+        """Hash of the uuids and modification dates of a whole column."""
+        key = self.get_key(things3, 'content', func.__name__, args)
+        content = self.columns.get(key)
+        things3.metrics.cache("content", content is not None)
+        if content is not None:
+            return content
+
+        with things3.collect_queries() as queries:
+            func(things3, *args)
+        with things3.naming(func):
+            if len(queries) == 1 and " AS version" in queries[0]:
+                rows = things3.execute_query(
+                    f"SELECT uuid, version, context FROM ({queries[0]})")
+            else:
+                rows = func(things3, *args)
+        rows = tuple((row['uuid'], row.get('version'), row.get('context'))
+                     for row in rows)
+        content = (Things3Cache.get_key(*rows), rows)
+        self.store(self.columns, key, content, self.columns_size)
+        self.store(self.contents, content[0], rows, self.columns_size)
+        return content
+
+    @staticmethod
+    def get_diff(old, new):
+        """Added, removed, moved and modified uuids between two columns."""
+        before = {row[0]: row[1:] for row in old}
+        after = {row[0]: row[1:] for row in new}
+        kept_before = [row[0] for row in old if row[0] in after]
+        kept_after = [row[0] for row in new if row[0] in before]
+        return {
+            "added": [row[0] for row in new if row[0] not in before],
+            "removed": [row[0] for row in old if row[0] not in after],
+            "moved": [uuid for uuid, previous
+                      in zip(kept_after, kept_before) if uuid != previous],
+            "changed": [row[0] for row in new
+                        if row[0] in before and before[row[0]] != row[1:]]}
+
+    def get_delta(self, things3, func, *args, known=None):
+        """Hash of a column and, if its known hash is recent, the delta."""
+        digest, rows = self.get_content(things3, func, *args)
+        delta = {"hash": digest, "total": len(rows)}
+        if known != digest and known in self.contents:
+            delta.update(self.get_diff(self.contents[known], rows))
+        return delta
+
+    def get_column(self, things3, func, *args, limit=None, cursor=0):
+        """Cards of a view, or a page of it, with total and next cursor."""
+        key = self.get_key(things3, func.__name__, args, limit, cursor,
+                           things3.anonymize)
+        column = self.columns.get(key)
+        things3.metrics.cache("column", column is not None)
+        if column is not None:
+            return column
+
+        with things3.naming(func), things3.snapshot():
+            if limit is None:
+                rows = func(things3, *args)
+                if rows and 'uuid' in rows[0] and \
+                        'checklist' not in rows[0]:
+                    things3.attach_checklists(rows)
+                page = {"items": rows, "total": len(rows), "next": None}
+            else:
+                page = things3.get_page(func, *args, limit=limit,
+                                        offset=cursor, checklist=True)
+            digest = self.get_content(things3, func, *args)[0]
+        column = {"html": self.render_cards(things3, page["items"]),
+                  "total": page["total"], "next": page["next"],
+                  "hash": digest}
+        if not things3.anonymize:
+            self.store(self.columns, key, column, self.columns_size)
+        return column
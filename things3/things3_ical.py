@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""iCalendar export of due and scheduled Things 3 tasks."""
+
+from __future__ import print_function
+
+__author__ = "Alexander Willner"
+__copyright__ = "2020 Alexander Willner"
+__credits__ = ["Alexander Willner"]
+__license__ = "Apache License 2.0"
+__version__ = "2.6.3"
+__maintainer__ = "Alexander Willner"
+__email__ = "alex@willner.ws"
+__status__ = "Development"
+
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from os import stat
+from things3.things3_cache import Things3Cache
+
+
+class Things3ICal():
+    """Encode due tasks as VTODO and scheduled tasks as VEVENT entries."""
+
+    CONTENT_TYPE = 'text/calendar; charset=utf-8'
+    HEADER = "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n" + \
+        "PRODID:-//KanbanView//Things 3//EN\r\n" + \
+        "X-WR-CALNAME:Things 3\r\n"
+    FOOTER = "END:VCALENDAR\r\n"
+    cache_size = 4096
+
+    def __init__(self):
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_columns(things3):
+        """Columns of a calendar entry."""
+        return f"""
+                TASK.uuid,
+                TASK.title,
+                TASK.notes,
+                strftime('%Y%m%d', TASK.{things3.DATE_DUE},"unixepoch")
+                    AS due,
+                strftime('%Y%m%d', TASK.{things3.DATE_START},"unixepoch")
+                    AS start,
+                strftime('%Y%m%d', TASK.{things3.DATE_START},"unixepoch",
+                         '+1 day') AS end,
+                strftime('%Y%m%dT%H%M%SZ', TASK.{things3.DATE_MOD},
+                         "unixepoch") AS stamp,
+                TASK.{things3.DATE_MOD} AS version"""
+
+    @staticmethod
+    def escape(text):
+        """Escape a TEXT value."""
+        return str(text or '').replace('\\', '\\\\').replace(
+            ';', '\\;').replace(',', '\\,').replace(
+                '\r\n', '\\n').replace('\n', '\\n')
+
+    @staticmethod
+    def fold(line):
+        """Fold a content line after 75 octets."""
+        lines = []
+        current = ''
+        size = 0
+        for char in line:
+            length = len(char.encode('utf-8'))
+            if size + length > 75:
+                lines.append(current)
+                current = ' '
+                size = 1
+            current += char
+            size += length
+        lines.append(current)
+        return '\r\n'.join(lines) + '\r\n'
+
+    def render(self, kind, task):
+        """Calendar entry of a task."""
+        lines = [f"BEGIN:{kind}",
+                 f"UID:{task['uuid']}-{kind.lower()}@kanbanview",
+                 f"DTSTAMP:{task['stamp']}",
+                 f"SUMMARY:{self.escape(task['title'])}"]
+        if task['notes']:
+            lines.append(f"DESCRIPTION:{self.escape(task['notes'])}")
+        lines.append(f"URL:things:///show?id={task['uuid']}")
+        if kind == 'VTODO':
+            lines.append(f"DUE;VALUE=DATE:{task['due']}")
+        else:
+            lines.append(f"DTSTART;VALUE=DATE:{task['start']}")
+            lines.append(f"DTEND;VALUE=DATE:{task['end']}")
+        lines.append(f"END:{kind}")
+        return ''.join(self.fold(line) for line in lines).encode('utf-8')
+
+    def get_entry(self, things3, kind, task):
+        """Rendered entry, reused while the task is not modified."""
+        if things3.anonymize:
+            return self.render(kind, task)
+        key = (kind, task['uuid'], task['version'])
+        entry = self.cache.get(key)
+        things3.metrics.cache("ical", entry is not None)
+        if entry is None:
+            entry = self.render(kind, task)
+            with self.lock:
+                if len(self.cache) >= self.cache_size:
+                    self.cache.popitem(last=False)
+                self.cache[key] = entry
+        return entry
+
+    def encode(self, things3):
+        """Yield the calendar one entry at a time."""
+        columns = self.get_columns(things3)
+        with things3.snapshot():
+            due = things3.get_view("due", columns=columns)
+            upcoming = things3.get_view("upcoming", columns=columns)
+        yield self.HEADER.encode('utf-8')
+        for task in due:
+            yield self.get_entry(things3, 'VTODO', task)
+        for task in upcoming:
+            yield self.get_entry(things3, 'VEVENT', task)
+        yield self.FOOTER.encode('utf-8')
+
+    def write(self, things3, output):
+        """Write the calendar to a binary file."""
+        for chunk in self.encode(things3):
+            output.write(chunk)
+        output.flush()
+
+    @staticmethod
+    def get_etag(things3):
+        """Validator that changes with the database and the filters."""
+        return Things3Cache.get_key(things3.get_fingerprint(),
+                                    sorted(things3.filters.items()),
+                                    things3.anonymize)
+
+    @staticmethod
+    def get_last_modified(things3):
+        """Time of the last change to the database files."""
+        mtime = 0
+        for suffix in ('', '-wal'):
+            try:
+                mtime = max(mtime, stat(things3.database + suffix).st_mtime)
+            except OSError:
+                pass
+        return datetime.fromtimestamp(int(mtime), timezone.utc)
@@ -15,53 +15,39 @@ __email__ = "alex@willner.ws"
 __status__ = "Development"
 
 import codecs
-from os import getcwd
+import re
+import tempfile
+from os import chmod, getcwd, path, remove, replace
 from things3.things3 import Things3
+from things3.things3_html import Things3HTML
 
 # Basic variables
 FILE_HTML = getcwd() + '/kanban-static.html'
 THINGS3 = Things3()
-TARGET = codecs.open(FILE_HTML, 'w', 'utf-8')
+HTML = Things3HTML()
+COLUMNS = [("color1", "Backlog", "get_someday"),
+           ("color8", "Grooming", "get_cleanup"),
+           ("color5", "Upcoming", "get_upcoming"),
+           ("color3", "Waiting", "get_waiting"),
+           ("color4", "Inbox", "get_inbox"),
+           ("color2", "MIT", "get_mit"),
+           ("color6", "Today", "get_today"),
+           ("color7", "Next", "get_anytime")]
+FINGERPRINT = re.compile(r"<!-- things3-fingerprint: (\S+) -->")
+RETRIES = 3
 
 
 def write_html_column(cssclass, file, header, rows):
     """Create a column in the output."""
 
-    file.write("<div class='column'><div class=''>" +
-               "<h2 class='h2 " + cssclass + "'>" + header +
-               "<span class='size'>" + str(len(rows)) +
-               "</span></h2>")
-
-    for row in rows:
-        task_uuid = str(row['uuid']) \
-            if row['uuid'] is not None else ''
-        task_title = str(row['title']) \
-            if row['title'] is not None else ''
-        context_title = str(row['context']) \
-            if row['context'] is not None else ''
-        context_uuid = str(row['context_uuid']) \
-            if row['context_uuid'] is not None else ''
-        deadline = str(row['due']) \
-            if row['due'] is not None else ''
-
-        task_link = '<a href="things:///show?id=' + task_uuid + '">' + \
-            task_title + '</a>' if task_uuid != '' else task_title
-        context_link = '<a href="things:///show?id=' + context_uuid + '">' + \
-            context_title + '</a>' if context_uuid != '' else context_title
-        css_class = 'hasProject' if context_title != '' else 'hasNoProject'
-        css_class = 'hasDeadline' if deadline != '' else css_class
-
-        file.write('<div class="box">' + task_link +
-                   '<div class="deadline">' + deadline + '</div>' +
-                   '<div class="area ' + css_class + '">' + context_link +
-                   '</div>' +
-                   '</div>')
-    file.write("</div></div>")
-
-
-def write_html_header(file):
+    file.write(HTML.render_column(THINGS3, cssclass, header, rows))
+
+
+def write_html_header(file, fingerprint=None):
     """Write HTML header."""
 
+    if fingerprint is not None:
+        file.write(f"<!-- things3-fingerprint: {fingerprint} -->")
     message = """
         <!DOCTYPE html>
         <html>
@@ -100,27 +86,79 @@ def write_html_footer(file):
     file.write(message)
 
 
-def write_html_columns(file):
+def query_columns():
+    """Run the column queries within one snapshot, yield their rows in order.
+
+    SQLite keeps a snapshot per connection, so the columns are read one
+    after the other on a single connection and each one is written
+    before the next one is queried.
+    """
+
+    with THINGS3.snapshot():
+        for _, _, method in COLUMNS:
+            yield THINGS3.call(getattr(Things3, method))
+
+
+def write_html_columns(file, columns=None):
     """Write HTML columns."""
 
-    write_html_column("color1", file, "Backlog", THINGS3.get_someday())
-    write_html_column("color8", file, "Grooming", THINGS3.get_cleanup())
-    write_html_column("color5", file, "Upcoming", THINGS3.get_upcoming())
-    write_html_column("color3", file, "Waiting", THINGS3.get_waiting())
-    write_html_column("color4", file, "Inbox", THINGS3.get_inbox())
-    write_html_column("color2", file, "MIT", THINGS3.get_mit())
-    write_html_column("color6", file, "Today", THINGS3.get_today())
-    write_html_column("color7", file, "Next", THINGS3.get_anytime())
+    if columns is None:
+        columns = query_columns()
+    for (cssclass, header, _), rows in zip(COLUMNS, columns):
+        write_html_column(cssclass, file, header, rows)
 
 
-def main(output):
+def read_fingerprint(filename):
+    """Get the database fingerprint a generated file was built from."""
+
+    try:
+        with codecs.open(filename, 'r', 'utf-8') as file:
+            match = FINGERPRINT.match(file.read(256))
+    except FileNotFoundError:
+        return None
+    return match.group(1) if match else None
+
+
+def main(output, fingerprint=None, columns=None):
     """Convert Things 3 database to Kanban HTML view."""
 
     with output as file:
-        write_html_header(file)
-        write_html_columns(file)
+        write_html_header(file, fingerprint)
+        write_html_columns(file, columns)
         write_html_footer(file)
 
 
+def generate(filename=FILE_HTML, force=False):
+    """Write the static view unless the database did not change.
+
+    The view is written to a temporary file next to the target and moved
+    into place once complete, so readers never see a partial file and a
+    failed run does not leave a current fingerprint behind. If the
+    database keeps changing, the last view is written with the fingerprint
+    it started from, so that the next run renders it again.
+    """
+
+    if not force and read_fingerprint(filename) == THINGS3.get_fingerprint():
+        return False
+    directory = path.dirname(path.abspath(filename))
+    for retry in range(RETRIES):
+        fingerprint = THINGS3.get_fingerprint()
+        output = tempfile.NamedTemporaryFile(
+            'w', encoding='utf-8', dir=directory, prefix='.kanban-',
+            suffix='.html', delete=False)
+        try:
+            main(output, fingerprint)
+        except BaseException:
+            remove(output.name)
+            raise
+        if fingerprint == THINGS3.get_fingerprint() or \
+                retry == RETRIES - 1:
+            break
+        remove(output.name)
+    chmod(output.name, 0o644)
+    replace(output.name, filename)
+    return True
+
+
 if __name__ == "__main__":
-    main(TARGET)
+    generate()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Load test replaying the Kanban board requests against the API."""
+
+from __future__ import print_function
+
+__author__ = "Alexander Willner"
+__copyright__ = "2020 Alexander Willner"
+__credits__ = ["Alexander Willner"]
+__license__ = "Apache License 2.0"
+__version__ = "2.6.3"
+__maintainer__ = "Alexander Willner"
+__email__ = "alex@willner.ws"
+__status__ = "Development"
+
+import argparse
+import json
+import math
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from os import path
+from werkzeug.serving import make_server, WSGIRequestHandler
+from things3.things3 import Things3
+from things3.things3_api import Things3API
+from things3.things3_generator import Things3Generator
+
+
+class Things3LoadHandler(WSGIRequestHandler):
+    """Request handler that does not log every request."""
+
+    def log_request(self, *args, **kwargs):
+        """Skip the access log."""
+
+
+class Things3Load():
+    """Concurrent dashboards requesting what kanban.js requests."""
+
+    COLUMNS = ["html/inbox", "html/today", "html/tag/{waiting}",
+               "html/tag/{mit}", "html/upcoming", "html/cleanup", "html/next",
+               "html/backlog"]
+    STATS = ["distribution", "top-proj", "stats-day"]
+    PERCENTILES = [50, 95, 99]
+
+    def __init__(self, database, concurrency=8, duration=10.0, rounds=None):
+        self.database = database
+        self.concurrency = concurrency
+        self.duration = duration
+        self.rounds = rounds
+        self.things3 = Things3(database=database)
+        self.url = None
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def get_board(self):
+        """Requests of a board refresh: filter lists and paged columns."""
+        things3 = self.things3
+        requests = [("api/areas", "api/areas", None),
+                    ("api/projects", "api/projects", None)]
+        for column in self.COLUMNS:
+            route = "api/" + column.format(waiting=things3.tag_waiting,
+                                           mit=things3.tag_mit)
+            requests.append(
+                (route, route + "?limit=50&cursor=0", None))
+        return requests
+
+    def get_filtered(self, area):
+        """Request of a board refresh filtered by an area.
+
+        kanban.js sets the filter of the server, which is shared by all
+        dashboards, and refreshes the board. Concurrent dashboards would
+        overwrite each other's filter, so all columns are requested as
+        one batch with a filter of its own instead.
+        """
+        things3 = self.things3
+        batch = {"commands": [], "tags": [], "filter": {"area": area}}
+        for column in self.COLUMNS:
+            name = column[len("html/"):].format(waiting=things3.tag_waiting,
+                                                mit=things3.tag_mit)
+            if name.startswith("tag/"):
+                batch["tags"].append(name[len("tag/"):])
+            else:
+                batch["commands"].append(name)
+        return ("api/batch?filter", "api/batch",
+                json.dumps(batch).encode('utf-8'))
+
+    def get_session(self):
+        """Requests of one dashboard visit, in the order kanban.js sends."""
+        things3 = self.things3
+        areas = things3.get_areas()
+        session = self.get_board()
+        hashes = {"columns": {column[len("html/"):].format(
+            waiting=things3.tag_waiting, mit=things3.tag_mit): None
+            for column in self.COLUMNS}}
+        session.append(("api/hashes", "api/hashes",
+                        json.dumps(hashes).encode('utf-8')))
+        if areas:
+            session.append(self.get_filtered(areas[0]['uuid']))
+        batch = {"commands": ["stats-min-today"],
+                 "tags": [things3.tag_a, things3.tag_b,
+                          things3.tag_c, things3.tag_d], "html": True}
+        session.append(("api/batch", "api/batch",
+                        json.dumps(batch).encode('utf-8')))
+        session.extend(("api/" + stat, "api/" + stat, None)
+                       for stat in self.STATS)
+        return session
+
+    def request(self, route, url, data):
+        """Send one request and record its latency."""
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(f"{self.url}/{url}", data,
+                                        timeout=60) as response:
+                response.read()
+            failed = False
+        except (urllib.error.URLError, OSError):
+            failed = True
+        duration = time.perf_counter() - start
+        with self.lock:
+            latencies, errors = self.samples.get(route, ([], 0))
+            latencies.append(duration)
+            self.samples[route] = (latencies, errors + failed)
+
+    def client(self, session, deadline):
+        """Repeat the session until the time or the rounds are over."""
+        rounds = 0
+        while (self.rounds is None or rounds < self.rounds) and \
+                time.perf_counter() < deadline:
+            for route, url, data in session:
+                self.request(route, url, data)
+            rounds += 1
+
+    @classmethod
+    def get_percentile(cls, values, percentile):
+        """Nearest-rank percentile of a list of values."""
+        ordered = sorted(values)
+        return ordered[max(math.ceil(percentile / 100 * len(ordered)) - 1,
+                           0)]
+
+    def run(self):
+        """Serve the API locally and load it, return the statistics."""
+        session = self.get_session()
+        api = Things3API(database=self.database)
+        server = make_server('localhost', 0, api.flask, threaded=True,
+                             request_handler=Things3LoadHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.url = f"http://localhost:{server.port}"
+        self.samples = {}
+        start = time.perf_counter()
+        deadline = start + self.duration if self.rounds is None \
+            else math.inf
+        clients = [threading.Thread(target=self.client,
+                                    args=(session, deadline))
+                   for _ in range(self.concurrency)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        thread.join()
+        return self.get_report(elapsed)
+
+    def get_report(self, elapsed):
+        """Throughput and latency percentiles in total and per route."""
+        routes = {}
+        for route, (latencies, errors) in sorted(self.samples.items()):
+            routes[route] = {"requests": len(latencies), "errors": errors,
+                             "throughput": len(latencies) / elapsed}
+            for percentile in self.PERCENTILES:
+                routes[route][f"p{percentile}"] = self.get_percentile(
+                    latencies, percentile)
+        latencies = [latency for values, _ in self.samples.values()
+                     for latency in values]
+        report = {"concurrency": self.concurrency, "duration": elapsed,
+                  "requests": len(latencies),
+                  "errors": sum(errors for _, errors
+                                in self.samples.values()),
+                  "throughput": len(latencies) / elapsed,
+                  "routes": routes}
+        for percentile in self.PERCENTILES:
+            report[f"p{percentile}"] = self.get_percentile(
+                latencies, percentile) if latencies else None
+        return report
+
+
+def main(args=None):
+    """Main entry point for CLI installation"""
+    parser = argparse.ArgumentParser(
+        description='Load the KanbanView API like concurrent dashboards.')
+    parser.add_argument("-d", "--database",
+                        help="existing database (default: generate one)")
+    parser.add_argument("-t", "--tasks", type=int, default=10000,
+                        help="number of tasks to generate")
+    parser.add_argument("-c", "--concurrency", type=int, default=8,
+                        help="number of dashboards requesting in parallel")
+    parser.add_argument("-s", "--seconds", type=float, default=10.0,
+                        help="duration of the test")
+    parser.add_argument("-o", "--output", default="load.json",
+                        help="file to write the results to")
+    args = parser.parse_args(args)
+
+    # the temporary database must not become the configured one
+    with Things3.keep_config():
+        if args.database is not None:
+            report = Things3Load(args.database, args.concurrency,
+                                 args.seconds).run()
+        else:
+            with tempfile.TemporaryDirectory() as directory:
+                database = path.join(directory, 'load.sqlite3')
+                Things3Generator(args.tasks).create(database)
+                report = Things3Load(database, args.concurrency,
+                                     args.seconds).run()
+                report["tasks"] = args.tasks
+
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2, sort_keys=True)
+    print(f"{'route':30} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for route, values in report["routes"].items():
+        print(f"{route:30} {values['throughput']:8.1f} " +
+              ' '.join(f"{values[f'p{percentile}'] * 1000:6.1f} ms"
+                       for percentile in Things3Load.PERCENTILES))
+    print(f"{report['requests']} requests, {report['errors']} errors, " +
+          f"{report['throughput']:.1f} requests/s")
+
+
+if __name__ == "__main__":
+    main()
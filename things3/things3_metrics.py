@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Counters and histograms for the Things 3 API."""
+
+from __future__ import print_function
+
+__author__ = "Alexander Willner"
+__copyright__ = "2020 Alexander Willner"
+__credits__ = ["Alexander Willner"]
+__license__ = "Apache License 2.0"
+__version__ = "2.6.3"
+__maintainer__ = "Alexander Willner"
+__email__ = "alex@willner.ws"
+__status__ = "Development"
+
+import threading
+
+
+class Things3Metrics():
+    """Prometheus style counters and histograms."""
+
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+               1.0, 2.5, 5.0, 10.0)
+    HELP = {
+        "things3_query_duration_seconds": "Duration of database queries.",
+        "things3_query_rows_total": "Rows returned by database queries.",
+        "things3_query_bytes_total": "Bytes serialized from query results.",
+        "things3_query_retries_total": "Queries retried on a locked database.",
+        "things3_cache_total": "Cache lookups by result.",
+        "things3_http_request_duration_seconds": "Duration of HTTP requests.",
+        "things3_http_response_bytes_total": "Bytes sent in HTTP responses.",
+        "things3_http_requests_total": "HTTP requests by status."
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    @staticmethod
+    def get_key(name, labels):
+        """Identify a time series."""
+        return (name, tuple(sorted(labels.items())))
+
+    def increment(self, name, labels, value=1):
+        """Add to a counter."""
+        key = self.get_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        """Record a value in a histogram."""
+        key = self.get_key(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = [[0] * len(self.BUCKETS), 0.0, 0]
+            histogram = self.histograms[key]
+            for idx, bound in enumerate(self.BUCKETS):
+                if value <= bound:
+                    histogram[0][idx] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def cache(self, name, hit):
+        """Count a cache hit or miss."""
+        self.increment("things3_cache_total",
+                       {"cache": name, "result": "hit" if hit else "miss"})
+
+    @staticmethod
+    def format_labels(labels, extra=None):
+        """Render labels in exposition format."""
+        labels = list(labels) + ([extra] if extra else [])
+        if not labels:
+            return ""
+        values = ','.join(
+            f'{key}="' + str(value).replace('\\', '\\\\').replace(
+                '"', '\\"').replace('\n', '\\n') + '"'
+            for key, value in labels)
+        return "{" + values + "}"
+
+    def render(self):
+        """Export all metrics in the Prometheus text format."""
+        lines = []
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: [list(value[0]), value[1], value[2]]
+                          for key, value in self.histograms.items()}
+        for name in sorted({key[0] for key in counters}):
+            lines.append(f"# HELP {name} {self.HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(
+                        f"{name}{self.format_labels(labels)} {value}")
+        for name in sorted({key[0] for key in histograms}):
+            lines.append(f"# HELP {name} {self.HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, labels), value in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                buckets, total, count = value
+                for bound, bucket in zip(self.BUCKETS, buckets):
+                    label = self.format_labels(labels, ("le", bound))
+                    lines.append(f"{name}_bucket{label} {bucket}")
+                label = self.format_labels(labels, ("le", "+Inf"))
+                lines.append(f"{name}_bucket{label} {count}")
+                label = self.format_labels(labels)
+                lines.append(f"{name}_sum{label} {total}")
+                lines.append(f"{name}_count{label} {count}")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Indexed local mirror of the Things 3 database for analytics."""
+
+from __future__ import print_function
+
+__author__ = "Alexander Willner"
+__copyright__ = "2020 Alexander Willner"
+__credits__ = ["Alexander Willner"]
+__license__ = "Apache License 2.0"
+__version__ = "2.6.3"
+__maintainer__ = "Alexander Willner"
+__email__ = "alex@willner.ws"
+__status__ = "Development"
+
+import sqlite3
+import threading
+from os import path
+
+
+class Things3Mirror():
+    """Incrementally synchronized, denormalized copy of Things 3."""
+
+    FILE_MIRROR = path.expanduser('~/.kanbanview-mirror.sqlite3')
+    TABLES = ["TMTask", "TMArea", "TMTag", "TMTaskTag", "TMChecklistItem"]
+    INDEXES = """
+        CREATE INDEX IF NOT EXISTS mirror_task_modified
+            ON TMTask (userModificationDate);
+        CREATE INDEX IF NOT EXISTS mirror_task_state
+            ON TMTask (type, status, trashed, start);
+        CREATE INDEX IF NOT EXISTS mirror_task_due ON TMTask (dueDate);
+        CREATE INDEX IF NOT EXISTS mirror_tasktag_tags ON TMTaskTag (tags);
+        CREATE INDEX IF NOT EXISTS mirror_tag_title ON TMTag (title);
+        CREATE TABLE IF NOT EXISTS task (
+            uuid TEXT PRIMARY KEY, type INTEGER, title TEXT, status INTEGER,
+            trashed INTEGER, start INTEGER, start_date REAL, due_date REAL,
+            stop_date REAL, created REAL, modified REAL,
+            project TEXT, project_title TEXT, heading TEXT,
+            heading_title TEXT, area TEXT, area_title TEXT, context TEXT,
+            tags TEXT);
+        CREATE INDEX IF NOT EXISTS mirror_denorm_project
+            ON task (project, status, stop_date);
+        CREATE INDEX IF NOT EXISTS mirror_denorm_area
+            ON task (area, status, stop_date);
+        CREATE INDEX IF NOT EXISTS mirror_denorm_stop
+            ON task (status, stop_date);
+        CREATE INDEX IF NOT EXISTS mirror_denorm_created ON task (created);
+        CREATE TABLE IF NOT EXISTS task_tag (task TEXT, tag TEXT);
+        CREATE INDEX IF NOT EXISTS mirror_denorm_tag ON task_tag (tag, task);
+        CREATE INDEX IF NOT EXISTS mirror_denorm_tag_task ON task_tag (task);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL);
+        """
+    DENORMALIZE = """
+        INSERT OR REPLACE INTO task
+        SELECT
+            TASK.uuid, TASK.type, TASK.title, TASK.status, TASK.trashed,
+            TASK.start, TASK.startDate, TASK.dueDate, TASK.stopDate,
+            TASK.creationDate, TASK.userModificationDate,
+            PROJECT.uuid, PROJECT.title, HEADING.uuid, HEADING.title,
+            AREA.uuid, AREA.title,
+            COALESCE(AREA.title, PROJECT.title, HEADING.title),
+            (SELECT group_concat(TAG.title, ',')
+             FROM TMTaskTag TAGS JOIN TMTag TAG ON TAGS.tags = TAG.uuid
+             WHERE TAGS.tasks = TASK.uuid)
+        FROM TMTask TASK
+        LEFT OUTER JOIN TMTask HEADING ON TASK.actionGroup = HEADING.uuid
+        LEFT OUTER JOIN TMTask PROJECT
+            ON PROJECT.uuid = COALESCE(TASK.project, HEADING.project)
+        LEFT OUTER JOIN TMArea AREA
+            ON AREA.uuid = COALESCE(TASK.area, PROJECT.area)
+        """
+
+    def __init__(self, database, mirror=None):
+        self.database = database
+        self.mirror = mirror or self.FILE_MIRROR
+        self.lock = threading.Lock()
+        self.fingerprint = None
+
+    def connect(self, readonly=True):
+        """Open the mirror."""
+        if readonly:
+            return sqlite3.connect(f'file:{self.mirror}?mode=ro', uri=True)
+        return sqlite3.connect(f'file:{self.mirror}', uri=True,
+                               isolation_level=None)
+
+    def create(self, connection):
+        """Create tables and indexes like in the source database."""
+        connection.execute('PRAGMA main.journal_mode=WAL')
+        exists = connection.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'TMTask'"
+        ).fetchone()
+        if exists is not None and not self.is_current(connection):
+            self.drop(connection)
+            exists = None
+        if exists is None:
+            for (sql,) in connection.execute(
+                    f"""SELECT sql FROM source.sqlite_master
+                        WHERE tbl_name IN ({self.get_names()}) AND
+                              sql IS NOT NULL"""):
+                connection.execute(sql)
+        connection.executescript(self.INDEXES)
+
+    def is_current(self, connection):
+        """Whether the mirrored tables still have the source's columns."""
+        for table in self.TABLES:
+            columns = [
+                [column[1:3] for column in connection.execute(
+                    f"PRAGMA {schema}.table_info({table})")]
+                for schema in ("main", "source")]
+            if columns[0] != columns[1]:
+                return False
+        return True
+
+    def drop(self, connection):
+        """Remove all tables, e.g. to copy everything again."""
+        for table in self.TABLES + ["task", "task_tag", "meta"]:
+            connection.execute(f"DROP TABLE IF EXISTS {table}")
+
+    def get_names(self):
+        """Mirrored table names as SQL list."""
+        return ', '.join(f"'{table}'" for table in self.TABLES)
+
+    @staticmethod
+    def get_meta(connection, key):
+        """Read a watermark."""
+        row = connection.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row and row[0] is not None else -1
+
+    def sync(self):
+        """Copy changes since the last run, return changed/deleted count."""
+        with self.lock:
+            connection = self.connect(readonly=False)
+            try:
+                connection.execute(
+                    "ATTACH DATABASE ? AS source",
+                    (f'file:{self.database}?mode=ro',))
+                self.create(connection)
+                connection.execute('BEGIN IMMEDIATE')
+                result = self.sync_changes(connection)
+                connection.execute('COMMIT')
+            except BaseException:
+                if connection.in_transaction:
+                    connection.execute('ROLLBACK')
+                raise
+            finally:
+                connection.close()
+        return result
+
+    def sync_if_changed(self, fingerprint):
+        """Sync unless the source did not change since the last sync."""
+        if fingerprint != self.fingerprint:
+            self.sync()
+            self.fingerprint = fingerprint
+
+    def sync_changes(self, connection):
+        """Apply modified rows and tombstones inside a transaction."""
+        execute = connection.execute
+        modified = self.get_meta(connection, 'modified')
+        deleted = self.get_meta(connection, 'deleted')
+        execute("CREATE TEMP TABLE IF NOT EXISTS dirty " +
+                "(uuid TEXT PRIMARY KEY)")
+        execute("DELETE FROM dirty")
+        execute("""INSERT INTO dirty
+                   SELECT uuid FROM source.TMTask
+                   WHERE userModificationDate > ? OR
+                         userModificationDate IS NULL""", (modified,))
+        changed = execute("SELECT COUNT(*) FROM dirty").fetchone()[0]
+        execute("""INSERT OR REPLACE INTO TMTask SELECT * FROM source.TMTask
+                   WHERE uuid IN (SELECT uuid FROM dirty)""")
+        execute("""DELETE FROM TMTaskTag
+                   WHERE tasks IN (SELECT uuid FROM dirty)""")
+        execute("""INSERT INTO TMTaskTag SELECT * FROM source.TMTaskTag
+                   WHERE tasks IN (SELECT uuid FROM dirty)""")
+        execute("""INSERT OR REPLACE INTO TMChecklistItem
+                   SELECT * FROM source.TMChecklistItem
+                   WHERE userModificationDate > ? OR
+                         userModificationDate IS NULL""", (modified,))
+
+        tombstones = execute(
+            """SELECT deletedObjectUUID FROM source.TMTombstone
+               WHERE deletionDate > ?""", (deleted,)).fetchall()
+        for (uuid,) in tombstones:
+            execute("DELETE FROM TMTask WHERE uuid = ?", (uuid,))
+            execute("DELETE FROM TMTaskTag WHERE tasks = ?", (uuid,))
+            execute("DELETE FROM TMChecklistItem WHERE uuid = ?", (uuid,))
+            execute("DELETE FROM task WHERE uuid = ?", (uuid,))
+            execute("DELETE FROM task_tag WHERE task = ?", (uuid,))
+
+        renamed = self.sync_small_tables(connection)
+        if renamed:
+            execute("INSERT OR IGNORE INTO dirty SELECT uuid FROM TMTask")
+        else:
+            execute("""INSERT OR IGNORE INTO dirty
+                       SELECT uuid FROM TMTask
+                       WHERE project IN (SELECT uuid FROM dirty) OR
+                             actionGroup IN (SELECT uuid FROM dirty)""")
+            execute("""INSERT OR IGNORE INTO dirty
+                       SELECT uuid FROM TMTask WHERE actionGroup IN (
+                         SELECT uuid FROM TMTask
+                         WHERE project IN (SELECT uuid FROM dirty))""")
+        execute(self.DENORMALIZE +
+                " WHERE TASK.uuid IN (SELECT uuid FROM dirty)")
+        execute("DELETE FROM task_tag WHERE task IN (SELECT uuid FROM dirty)")
+        execute("""INSERT INTO task_tag
+                   SELECT TAGS.tasks, TAG.title
+                   FROM TMTaskTag TAGS JOIN TMTag TAG ON TAGS.tags = TAG.uuid
+                   WHERE TAGS.tasks IN (SELECT uuid FROM dirty)""")
+
+        execute("""INSERT OR REPLACE INTO meta
+                   SELECT 'modified', MAX(userModificationDate) FROM TMTask
+                   WHERE userModificationDate IS NOT NULL""")
+        execute("""INSERT OR REPLACE INTO meta
+                   SELECT 'deleted', MAX(deletionDate)
+                   FROM source.TMTombstone
+                   WHERE deletionDate IS NOT NULL""")
+        return changed, len(tombstones)
+
+    @staticmethod
+    def sync_small_tables(connection):
+        """Replace areas and tags, report whether any title changed."""
+        execute = connection.execute
+        before = execute("""SELECT uuid, title FROM TMArea UNION ALL
+                            SELECT uuid, title FROM TMTag""").fetchall()
+        for table in ("TMArea", "TMTag"):
+            execute(f"DELETE FROM {table}")
+            execute(f"INSERT INTO {table} SELECT * FROM source.{table}")
+        after = execute("""SELECT uuid, title FROM TMArea UNION ALL
+                           SELECT uuid, title FROM TMTag""").fetchall()
+        return set(before) != set(after)
+
+    def get_project_throughput(self, days=365):
+        """Completed tasks per project and week."""
+        connection = self.connect()
+        try:
+            return connection.execute(
+                """SELECT project_title AS project,
+                          strftime('%Y-%W', stop_date, 'unixepoch') AS week,
+                          COUNT(*) AS completed
+                   FROM task
+                   WHERE status = 3 AND type = 0 AND trashed = 0 AND
+                         stop_date >= strftime('%s', 'now', ?)
+                   GROUP BY project, week
+                   ORDER BY week, project_title""",
+                (f'-{int(days)} days',)).fetchall()
+        finally:
+            connection.close()
+
+    def get_tag_usage(self):
+        """Tasks created per tag and month."""
+        connection = self.connect()
+        try:
+            return connection.execute(
+                """SELECT TAGS.tag,
+                          strftime('%Y-%m', TASK.created, 'unixepoch')
+                              AS month,
+                          COUNT(*) AS tasks
+                   FROM task_tag TAGS JOIN task TASK ON TAGS.task = TASK.uuid
+                   GROUP BY TAGS.tag, month
+                   ORDER BY month, TAGS.tag""").fetchall()
+        finally:
+            connection.close()
@@ -14,52 +14,95 @@ __maintainer__ = "Alexander Willner"
 __email__ = "alex@willner.ws"
 __status__ = "Development"
 
-import xml.etree.ElementTree as ET
-from xml.etree.ElementTree import Element, SubElement
-from xml.dom import minidom
+import sys
+from xml.sax.saxutils import XMLGenerator
 
 
 class Things3OPML():
     """OPML Plugin for Thing 3 CLI."""
 
-    @staticmethod
-    def get_top():
-        """Get first element."""
-        top = Element('opml')
-        head = SubElement(top, 'head')
-        title = SubElement(head, 'title')
-        title.text = 'Things 3 Database'
-        return top
+    INDENT = "   "
 
-    @staticmethod
-    def print(top):
-        """Print pretty XML."""
-        xmlstr = minidom.parseString(
-            ET.tostring(top)).toprettyxml(indent="   ")
-        print(xmlstr)
+    def __init__(self, output=None):
+        self.output = output
+        self.writer = None
+        self.stack = []
+
+    def start(self, name, attrs=None):
+        """Open an element on its own, indented line."""
+        if self.stack:
+            self.stack[-1] = True
+            self.writer.ignorableWhitespace(
+                '\n' + self.INDENT * len(self.stack))
+        self.writer.startElement(name, attrs or {})
+        self.stack.append(False)
+
+    def end(self, name):
+        """Close an element, on a new line if it had children."""
+        if self.stack.pop():
+            self.writer.ignorableWhitespace(
+                '\n' + self.INDENT * len(self.stack))
+        self.writer.endElement(name)
+
+    def outline(self, text):
+        """Write a leaf outline."""
+        self.start('outline', {'text': text or ''})
+        self.end('outline')
+
+    def print_top(self):
+        """Write the document head and open the body."""
+        self.writer = XMLGenerator(self.output or sys.stdout, 'utf-8',
+                                   short_empty_elements=True)
+        self.stack = []
+        self.writer.startDocument()
+        self.start('opml')
+        self.start('head')
+        self.start('title')
+        self.writer.characters('Things 3 Database')
+        self.end('title')
+        self.end('head')
+        self.start('body')
+
+    def print_bottom(self):
+        """Close the body and the document."""
+        self.end('body')
+        self.end('opml')
+        self.writer.ignorableWhitespace('\n')
+        self.writer.endDocument()
 
     def print_tasks(self, tasks):
         """Print pretty XML of selected tasks."""
-        top = self.get_top()
-        body = SubElement(top, 'body')
+        self.print_top()
         for task in tasks:
-            SubElement(body, 'outline').set('text', task['title'])
-        self.print(top)
+            if not task.get('checklist'):
+                self.outline(task['title'])
+                continue
+            self.start('outline', {'text': task['title'] or ''})
+            for item in task['checklist']:
+                self.outline(item['title'])
+            self.end('outline')
+        self.print_bottom()
 
     def print_all(self, things3):
-        """Print."""
-        top = self.get_top()
-        body = SubElement(top, 'body')
-
-        for area in things3.get_areas():
-            area_element = SubElement(body, 'outline')
-            area_element.set('text', area['title'])
-            for task in things3.get_task(area['uuid']):
-                SubElement(area_element, 'outline').set('text', task['title'])
-            for project in things3.get_projects(area['uuid']):
-                project_element = SubElement(area_element, 'outline')
-                project_element.set('text', project['title'])
-                for task in things3.get_task(None, project['uuid']):
-                    SubElement(project_element, 'outline').set(
-                        'text', task['title'])
-        self.print(top)
+        """Print the area/project/task hierarchy while it is queried."""
+        self.print_top()
+        area = project = None
+        for row in things3.get_hierarchy():
+            if project is not None and row[2] != project:
+                self.end('outline')
+                project = None
+            if row[0] != area:
+                if area is not None:
+                    self.end('outline')
+                area = row[0]
+                self.start('outline', {'text': row[1] or ''})
+            if row[2] is not None and row[2] != project:
+                project = row[2]
+                self.start('outline', {'text': row[3] or ''})
+            if row[4] is not None:
+                self.outline(row[4])
+        if project is not None:
+            self.end('outline')
+        if area is not None:
+            self.end('outline')
+        self.print_bottom()
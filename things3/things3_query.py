@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Compiler for composable Things 3 task queries."""
+
+from __future__ import print_function
+
+__author__ = "Alexander Willner"
+__copyright__ = "2020 Alexander Willner"
+__credits__ = ["Alexander Willner"]
+__license__ = "Apache License 2.0"
+__version__ = "2.6.3"
+__maintainer__ = "Alexander Willner"
+__email__ = "alex@willner.ws"
+__status__ = "Development"
+
+import re
+import threading
+from collections import OrderedDict
+
+
+class Things3Query():
+    """Compile views, predicates and filters into a single SELECT."""
+
+    ORDER_TODAY = "TASK.duedate DESC , TASK.todayIndex"
+    ORDER_CREATED = "TASK.duedate DESC, TASK.creationDate DESC"
+    ORDER_STOPPED = "TASK.stopDate"
+    VIEWS = {
+        "inbox": (["not_trashed", "task", "open", "inbox"], ORDER_TODAY),
+        "today": (["not_trashed", "task", "open", "active", "scheduled",
+                   "parent_not_trashed"], ORDER_TODAY),
+        "next": (["not_trashed", "task", "open", "anytime", "not_scheduled",
+                  "parent_anytime"], ORDER_TODAY),
+        "tasks": (["not_trashed", "task", "open", "anytime", "not_recurring",
+                   "parent_not_trashed"], ORDER_CREATED),
+        "backlog": (["not_trashed", "task", "open", "someday",
+                     "not_scheduled", "not_recurring", "parent_not_trashed"],
+                    ORDER_CREATED),
+        "upcoming": (["not_trashed", "task", "open", "someday", "scheduled",
+                      "not_recurring", "parent_not_trashed"],
+                     "TASK.startdate, TASK.todayIndex"),
+        "tagged": (["not_trashed", "task", "open", "not_recurring",
+                    "parent_not_trashed"], ORDER_TODAY),
+        "subtasks": (["not_trashed", "task", "open", "checklist",
+                      "parent_not_trashed"], ORDER_TODAY),
+        "completed": (["not_trashed", "task", "done"], ORDER_STOPPED),
+        "cancelled": (["not_trashed", "task", "cancelled"], ORDER_STOPPED),
+        "trashed": (["trashed", "task"], ORDER_STOPPED),
+        "all": (["not_trashed", "task", "parent_not_trashed"], None),
+        "due": (["not_trashed", "task", "open", "due", "parent_not_trashed"],
+                "TASK.dueDate"),
+        "lint": (["not_trashed", "open", "task", "anytime_or_someday",
+                  "no_parent"], None),
+        "empty": (["not_trashed", "open", "project", "anytime", "empty"],
+                  "TASK.uuid")
+    }
+    JOINS = [
+        ("PROJECT", "LEFT OUTER JOIN {task} PROJECT " +
+         "ON TASK.project = PROJECT.uuid"),
+        ("AREA", "LEFT OUTER JOIN {area} AREA ON TASK.area = AREA.uuid"),
+        ("HEADING", "LEFT OUTER JOIN {task} HEADING " +
+         "ON TASK.actionGroup = HEADING.uuid"),
+        ("HEADPROJ", "LEFT OUTER JOIN {task} HEADPROJ " +
+         "ON HEADING.project = HEADPROJ.uuid")
+    ]
+    cache_size = 256
+
+    def __init__(self, things3):
+        self.things3 = things3
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_columns(self):
+        """Columns of a Kanban card."""
+        things3 = self.things3
+        return f"""
+                TASK.uuid,
+                TASK.title,
+                CASE
+                    WHEN AREA.title IS NOT NULL THEN AREA.title
+                    WHEN PROJECT.title IS NOT NULL THEN PROJECT.title
+                    WHEN HEADING.title IS NOT NULL THEN HEADING.title
+                END AS context,
+                CASE
+                    WHEN AREA.uuid IS NOT NULL THEN AREA.uuid
+                    WHEN PROJECT.uuid IS NOT NULL THEN PROJECT.uuid
+                END AS context_uuid,
+                CASE
+                    WHEN TASK.recurrenceRule IS NULL
+                    THEN strftime('%d.%m.', TASK.dueDate,"unixepoch") ||
+                         substr(strftime('%Y', TASK.dueDate,"unixepoch"),3, 2)
+                ELSE NULL
+                END AS due,
+                date(TASK.{things3.DATE_CREATE},"unixepoch") as created,
+                date(TASK.{things3.DATE_MOD},"unixepoch") as modified,
+                strftime('%d.%m.', TASK.startDate,"unixepoch") ||
+                  substr(strftime('%Y', TASK.startDate,"unixepoch"),3, 2)
+                  as started,
+                date(TASK.stopDate,"unixepoch") as stopped,
+                (SELECT COUNT(uuid)
+                 FROM TMTask AS PROJECT_TASK
+                 WHERE
+                   PROJECT_TASK.project = TASK.uuid AND
+                   PROJECT_TASK.{things3.IS_NOT_TRASHED} AND
+                   PROJECT_TASK.{things3.IS_OPEN}
+                ) AS size,
+                CASE
+                    WHEN TASK.{things3.IS_TASK} THEN 'task'
+                    WHEN TASK.{things3.IS_PROJECT} THEN 'project'
+                    WHEN TASK.{things3.IS_HEADING} THEN 'heading'
+                END AS type,
+                TASK.notes,
+                TASK.{things3.DATE_MOD} AS version"""
+
+    def get_predicates(self):
+        """Named conditions on the TASK table and its parents."""
+        things3 = self.things3
+        project = things3.quote(things3.filters.get("project", ""))
+        return {
+            "task": f"TASK.{things3.IS_TASK}",
+            "project": f"TASK.{things3.IS_PROJECT}",
+            "open": f"TASK.{things3.IS_OPEN}",
+            "done": f"TASK.{things3.IS_DONE}",
+            "cancelled": f"TASK.{things3.IS_CANCELLED}",
+            "trashed": f"TASK.{things3.IS_TRASHED}",
+            "not_trashed": f"TASK.{things3.IS_NOT_TRASHED}",
+            "inbox": f"TASK.{things3.IS_INBOX}",
+            "anytime": f"TASK.{things3.IS_ANYTIME}",
+            "someday": f"TASK.{things3.IS_SOMEDAY}",
+            "anytime_or_someday":
+                f"(TASK.{things3.IS_SOMEDAY} OR TASK.{things3.IS_ANYTIME})",
+            "active": f"""(TASK.{things3.IS_ANYTIME} OR (
+                     TASK.{things3.IS_SOMEDAY} AND
+                     TASK.{things3.DATE_START} <= strftime('%s', 'now')
+                     )
+                )""",
+            "scheduled": f"TASK.{things3.IS_SCHEDULED}",
+            "not_scheduled": f"TASK.{things3.IS_NOT_SCHEDULED}",
+            "not_recurring": f"TASK.{things3.IS_NOT_RECURRING}",
+            "due": f"TASK.{things3.IS_DUE}",
+            "checklist": f"""TASK.uuid IN (
+                SELECT task FROM {things3.TABLE_CHECKLIST})""",
+            "no_parent": """TASK.project IS NULL AND
+                TASK.area IS NULL AND
+                TASK.actionGroup IS NULL""",
+            "parent_not_trashed": f"""(
+                    (
+                        PROJECT.title IS NULL OR (
+                            PROJECT.{things3.IS_NOT_TRASHED}
+                        )
+                    ) AND (
+                        HEADPROJ.title IS NULL OR (
+                            HEADPROJ.{things3.IS_NOT_TRASHED}
+                        )
+                    )
+                )""",
+            # tasks of a filtered project are shown even if it is not anytime
+            "parent_anytime": f"""(
+                    (
+                        PROJECT.title IS NULL OR (
+                            PROJECT.uuid = {project} AND
+                            PROJECT.{things3.IS_NOT_TRASHED}
+                        ) OR (
+                            PROJECT.{things3.IS_ANYTIME} AND
+                            PROJECT.{things3.IS_NOT_SCHEDULED} AND
+                            PROJECT.{things3.IS_NOT_TRASHED}
+                        )
+                    ) AND (
+                        HEADPROJ.title IS NULL OR (
+                            HEADPROJ.uuid = {project} AND
+                            HEADPROJ.{things3.IS_NOT_TRASHED}
+                        ) OR (
+                            HEADPROJ.{things3.IS_ANYTIME} AND
+                            HEADPROJ.{things3.IS_NOT_SCHEDULED} AND
+                            HEADPROJ.{things3.IS_NOT_TRASHED}
+                        )
+                    )
+                )""",
+            "empty": f"""(SELECT COUNT(uuid)
+                 FROM TMTask AS PROJECT_TASK
+                 WHERE
+                   PROJECT_TASK.project = TASK.uuid AND
+                   PROJECT_TASK.{things3.IS_NOT_TRASHED} AND
+                   PROJECT_TASK.{things3.IS_OPEN} AND
+                   (PROJECT_TASK.{things3.IS_ANYTIME} OR
+                    PROJECT_TASK.{things3.IS_SCHEDULED} OR
+                      (PROJECT_TASK.{things3.IS_RECURRING} AND
+                       PROJECT_TASK.{things3.RECURRING_IS_NOT_PAUSED} AND
+                       PROJECT_TASK.{things3.RECURRING_HAS_NEXT_STARTDATE}
+                      )
+                   )
+                ) = 0"""
+        }
+
+    def get_predicate(self, predicates, predicate):
+        """SQL of a named or parameterized predicate."""
+        if isinstance(predicate, str):
+            if predicate not in predicates:
+                raise ValueError(f"Unknown predicate: {predicate}")
+            return predicates[predicate]
+        name, value = predicate
+        quote = self.things3.quote
+        if name == "any":
+            return "(" + " OR\n                ".join(
+                "(" + " AND\n                ".join(
+                    self.get_conditions(predicates, parts)[0]) + ")"
+                for parts in value) + ")"
+        if name == "tag":
+            return f"""TASK.uuid IN (
+                SELECT TAGS.tasks FROM {self.things3.TABLE_TASKTAG} AS TAGS
+                WHERE TAGS.tags IN ({self.things3.tags.get_uuids(value)}))"""
+        if name == "area":
+            return f"TASK.area = {quote(value)}"
+        if name == "project":
+            return f"TASK.project = {quote(value)}"
+        raise ValueError(f"Unknown predicate: {name}")
+
+    def get_joins(self, sql):
+        """Joins for the parent aliases that the statement refers to."""
+        needed = set(re.findall(r'\b(PROJECT|AREA|HEADING|HEADPROJ)\.', sql))
+        if "HEADPROJ" in needed:
+            needed.add("HEADING")
+        return '\n'.join(
+            join.format(task=self.things3.TABLE_TASK,
+                        area=self.things3.TABLE_AREA)
+            for alias, join in self.JOINS if alias in needed)
+
+    def get_conditions(self, predicates, parts):
+        """Conditions of views and predicates plus the first view order."""
+        conditions = []
+        order = None
+        for part in parts:
+            if isinstance(part, str) and part in self.VIEWS:
+                names, view_order = self.VIEWS[part]
+                order = order or view_order
+            else:
+                names = [part]
+            for name in names:
+                condition = self.get_predicate(predicates, name)
+                if condition not in conditions:
+                    conditions.append(condition)
+        return conditions, order
+
+    def compile(self, *parts, order=None, columns=None):
+        """SQL for tasks matching all views and predicates and the filter."""
+        things3 = self.things3
+        key = (parts, order, columns, things3.IS_TASK,
+               tuple(sorted(things3.filters.items())),
+               things3.tags.get_closure()[0])
+        sql = self.cache.get(key)
+        things3.metrics.cache("query", sql is not None)
+        if sql is not None:
+            return sql
+
+        conditions, view_order = self.get_conditions(
+            self.get_predicates(), parts)
+        order = order or view_order
+        where = ' AND\n                '.join(conditions) or '1'
+        columns = columns or self.get_columns()
+        order = f"ORDER BY {order}" if order else ""
+        body = f"""
+            WHERE
+                {things3.get_filter()}
+                {where}
+            {order}"""
+        sql = f"""
+            SELECT {columns}
+            FROM
+                {things3.TABLE_TASK} AS TASK
+            {self.get_joins(columns + body)}
+            {body}
+            """
+
+        with self.lock:
+            if len(self.cache) >= self.cache_size:
+                self.cache.popitem(last=False)
+            self.cache[key] = sql
+        return sql
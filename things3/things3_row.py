@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Compact rows for Things 3 query results."""
+
+from __future__ import print_function
+
+__author__ = "Alexander Willner"
+__copyright__ = "2020 Alexander Willner"
+__credits__ = ["Alexander Willner"]
+__license__ = "Apache License 2.0"
+__version__ = "2.6.3"
+__maintainer__ = "Alexander Willner"
+__email__ = "alex@willner.ws"
+__status__ = "Development"
+
+from collections.abc import Mapping
+
+
+class Things3Row(Mapping):
+    """Row tuple with a column index shared by its result set."""
+
+    __slots__ = ("index", "row")
+    cache = (None, None)
+    extensions: dict = {}
+    extensions_size = 256
+
+    def __init__(self, index, row):
+        self.index = index
+        self.row = row
+
+    @classmethod
+    def factory(cls, cursor, row):
+        """Row factory for sqlite3 connections."""
+        cached = cls.cache
+        if cached[0] is not cursor.description:
+            description = cursor.description
+            cached = (description, {column[0]: idx for idx, column
+                                    in enumerate(description)})
+            cls.cache = cached
+        return cls(cached[1], row)
+
+    @classmethod
+    def extend(cls, index, key, position):
+        """Index with an added column, shared by all rows of a result."""
+        cached = cls.extensions.get((id(index), key))
+        # the index is kept in the entry so that its id is not reused
+        if cached is None or cached[0] is not index:
+            if len(cls.extensions) >= cls.extensions_size:
+                cls.extensions = {}
+            cached = (index, {**index, key: position})
+            cls.extensions[(id(index), key)] = cached
+        return cached[1]
+
+    def asdict(self):
+        """Plain dictionary, e.g. as default for json.dumps."""
+        if len(self.index) == len(self.row):
+            return dict(zip(self.index, self.row))
+        return {key: self.row[idx] for key, idx in self.index.items()}
+
+    def __getitem__(self, key):
+        return self.row[self.index[key]]
+
+    def __setitem__(self, key, value):
+        if key not in self.index:
+            self.index = self.extend(self.index, key, len(self.row))
+            self.row = self.row + (value,)
+            return
+        row = list(self.row)
+        row[self.index[key]] = value
+        self.row = tuple(row)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __repr__(self):
+        return repr(dict(self))
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Tag hierarchy and duration tags of Things 3."""
+
+from __future__ import print_function
+
+__author__ = "Alexander Willner"
+__copyright__ = "2020 Alexander Willner"
+__credits__ = ["Alexander Willner"]
+__license__ = "Apache License 2.0"
+__version__ = "2.6.3"
+__maintainer__ = "Alexander Willner"
+__email__ = "alex@willner.ws"
+__status__ = "Development"
+
+import re
+
+
+class Things3Tags():
+    """Nested tags and the minutes planned via duration tags."""
+
+    DURATION = re.compile(r'(?:(\d+(?:[.,]\d+)?)h)?(?:(\d+)m(?:in)?)?')
+
+    def __init__(self, things3):
+        self.things3 = things3
+        self.closure = (None, (), {})
+        self.minutes = (None, {})
+
+    def get_closure(self):
+        """Tags with their descendants, rebuilt when the database changed.
+
+        Returns the fingerprint, the (ancestor uuid, ancestor title,
+        descendant uuid) pairs and the descendant uuids per tag title.
+        """
+        things3 = self.things3
+        fingerprint = things3.get_fingerprint()
+        cached = self.closure
+        if cached[0] == fingerprint:
+            return cached
+        tags = things3.fetch_all(
+            f"SELECT uuid, title, parent FROM {things3.TABLE_TAG}", raw=True)
+        children = {}
+        for uuid, _, parent in tags:
+            children.setdefault(parent, []).append(uuid)
+        pairs = []
+        titles = {}
+        for uuid, title, _ in tags:
+            descendants = []
+            stack = [uuid]
+            while stack:
+                tag = stack.pop()
+                if tag not in descendants:
+                    descendants.append(tag)
+                    stack.extend(children.get(tag, []))
+            pairs.extend((uuid, title, tag) for tag in descendants)
+            titles.setdefault(title, []).extend(descendants)
+        cached = self.closure = (fingerprint, tuple(pairs), {
+            title: tuple(uuids) for title, uuids in titles.items()})
+        return cached
+
+    def get_uuids(self, title):
+        """Tag with the title and its descendants as SQL list."""
+        return ', '.join(self.things3.quote(uuid) for uuid
+                         in self.get_closure()[2].get(title, ()))
+
+    @classmethod
+    def parse_minutes(cls, title):
+        """Minutes of a duration tag such as 30, 90m, 1h or 1h30m."""
+        title = str(title or '').replace(' ', '').lower()
+        if title.isdigit():
+            return int(title)
+        match = cls.DURATION.fullmatch(title)
+        if not title or match is None:
+            return None
+        hours, minutes = match.groups()
+        return round(float((hours or '0').replace(',', '.')) * 60) + \
+            int(minutes or 0)
+
+    def get_minutes(self):
+        """Minutes per duration tag, rebuilt when the database changed."""
+        closure = self.get_closure()
+        cached = self.minutes
+        if cached[0] == closure[0]:
+            return cached[1]
+        minutes = {}
+        for uuid, title, tag in closure[1]:
+            if uuid == tag and self.parse_minutes(title) is not None:
+                minutes[uuid] = self.parse_minutes(title)
+        self.minutes = (closure[0], minutes)
+        return minutes
+
+    def get_planned_query(self, days, group=None):
+        """SQL summing duration tags of scheduled tasks over days."""
+        things3 = self.things3
+        groups = {
+            None: ("", ""),
+            "area": ("AREA.uuid AS uuid, AREA.title AS title,",
+                     ", AREA.uuid"),
+            "project": ("""COALESCE(PROJECT.uuid, HEADPROJ.uuid) AS uuid,
+                    COALESCE(PROJECT.title, HEADPROJ.title) AS title,""",
+                        ", COALESCE(PROJECT.uuid, HEADPROJ.uuid)")
+        }
+        if group not in groups:
+            raise ValueError(f"Unknown group: {group}")
+        columns, group_by = groups[group]
+        durations = ', '.join(
+            f"({things3.quote(tag)}, {minutes})"
+            for tag, minutes in self.get_minutes().items())
+        durations = f"VALUES {durations}" if durations \
+            else "SELECT NULL, NULL WHERE 0"
+        today = "CAST(strftime('%s', date('now')) AS INTEGER)"
+        return f"""
+                WITH DURATION(tag, minutes) AS ({durations})
+                SELECT
+                    date(MAX(TASK.{things3.DATE_START}, {today}),
+                         "unixepoch") AS day,
+                    {columns}
+                    SUM(DURATION.minutes) AS minutes
+                FROM
+                    {things3.TABLE_TASK} AS TASK
+                JOIN
+                    {things3.TABLE_TASKTAG} TAGS ON TASK.uuid = TAGS.tasks
+                JOIN
+                    DURATION ON TAGS.tags = DURATION.tag
+                LEFT OUTER JOIN
+                    {things3.TABLE_TASK} PROJECT
+                    ON TASK.project = PROJECT.uuid
+                LEFT OUTER JOIN
+                    {things3.TABLE_TASK} HEADING
+                    ON TASK.actionGroup = HEADING.uuid
+                LEFT OUTER JOIN
+                    {things3.TABLE_TASK} HEADPROJ
+                    ON HEADING.project = HEADPROJ.uuid
+                LEFT OUTER JOIN
+                    {things3.TABLE_AREA} AREA ON AREA.uuid =
+                        COALESCE(TASK.area, PROJECT.area, HEADPROJ.area)
+                WHERE
+                    {things3.get_filter()}
+                    TASK.{things3.IS_NOT_TRASHED} AND
+                    TASK.{things3.IS_TASK} AND
+                    TASK.{things3.IS_OPEN} AND
+                    TASK.{things3.IS_SCHEDULED} AND
+                    (TASK.{things3.IS_ANYTIME} OR
+                     TASK.{things3.IS_SOMEDAY}) AND
+                    TASK.{things3.DATE_START} <
+                        strftime('%s', date('now'), '+{int(days)} days') AND
+                    (PROJECT.title IS NULL OR
+                     PROJECT.{things3.IS_NOT_TRASHED}) AND
+                    (HEADPROJ.title IS NULL OR
+                     HEADPROJ.{things3.IS_NOT_TRASHED})
+                GROUP BY day{group_by}
+                ORDER BY day{group_by}
+                """